@@ -19,6 +19,8 @@ class NetworkScan(db.Model):
     concurrency = db.Column(db.Integer, default=150)
     status = db.Column(db.Integer, default=0, nullable=False)
     found_hosts_count = db.Column(db.Integer, default=0)
+    total_hosts = db.Column(db.Integer, default=0)
+    scanned_hosts = db.Column(db.Integer, default=0)
     result_json_path = db.Column(db.String(255), nullable=True) # Path to the result JSON file
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     completed_at = db.Column(db.DateTime, nullable=True)
@@ -37,6 +39,9 @@ class NetworkScan(db.Model):
             "status_code": self.status, 
             # --- FIX ENDS HERE ---
             "found_hosts_count": self.found_hosts_count,
+            "total_hosts": self.total_hosts or 0,
+            "scanned_hosts": self.scanned_hosts or 0,
+            "progress": round(100.0 * (self.scanned_hosts or 0) / self.total_hosts, 1) if self.total_hosts else 0,
             "result_json_path": self.result_json_path,
             "created_at": self.created_at.isoformat(),
             "completed_at": self.completed_at.isoformat() if self.completed_at else None,
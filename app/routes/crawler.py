@@ -1,14 +1,17 @@
 # app/routes/crawler.py
 import asyncio
-from urllib.parse import urlparse, urljoin, parse_qsl, urlencode, urlunparse
-from flask import Blueprint, request, jsonify
+import json
+from urllib.parse import urlparse, parse_qsl
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app
 from flask_jwt_extended import jwt_required
-import aiohttp
-from bs4 import BeautifulSoup
-from yarl import URL
 import os
 from dotenv import load_dotenv
-import re
+
+from app.utils import crawl_store
+from app.utils.crawl import (
+    DEFAULT_MAX_BODY_BYTES, DEFAULT_PATTERN_BUDGET, crawl_async, crawl_stream, dedupe_targets, normalize_url,
+    target_signature,
+)
 
 # สำหรับ dedupe / similarity
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -23,96 +26,26 @@ DEFAULT_CONCURRENCY = int(os.getenv("CRAWLER_CONCURRENCY", 20))
 
 bp = Blueprint("crawler", __name__, url_prefix="/api/crawler")
 
-# tracking params ที่ต้องละเว้นเวลาทำ normalization
-TRACKING_PARAMS_RE = re.compile(r'^(utm_|fbclid$|gclid$|sessionid$|phpsessid$)', re.IGNORECASE)
 
 # -------------------------
-# 1. Data Collection → เก็บข้อมูลเอกสาร/URL
+# 1. Data Collection → ดึงหน้าเว็บ / หา link และ target (แกนอยู่ที่ app/utils/crawl.py)
 # -------------------------
-async def _fetch(session, url, timeout=10):
+def _iter_async(agen):
+    """แปลง async generator เป็น generator ธรรมดา สำหรับ streaming response ของ Flask"""
+    loop = asyncio.new_event_loop()
     try:
-        async with session.get(url, timeout=timeout) as resp:
-            if resp.status == 200 and 'text/html' in (resp.headers.get('Content-Type','')):
-                return await resp.text()
-            return None
-    except Exception:
-        return None
-
-async def _crawl_async(start_url, max_pages=500, concurrency=20):
-    parsed = urlparse(start_url)
-    base_domain = parsed.netloc
-
-    to_visit = asyncio.Queue()
-    await to_visit.put(start_url)
-    seen = set([start_url])
-    results = []
-
-    sem = asyncio.Semaphore(concurrency)
-    timeout = aiohttp.ClientTimeout(total=15)
-    connector = aiohttp.TCPConnector(limit=concurrency, force_close=True)
-    headers = {"User-Agent": "simple-crawler/1.0"}
-
-    async with aiohttp.ClientSession(timeout=timeout, connector=connector, headers=headers) as session:
-
-        async def worker():
-            while not to_visit.empty() and len(results) < max_pages:
-                url = await to_visit.get()
-                async with sem:
-                    html = await _fetch(session, url)
-                if not html:
-                    to_visit.task_done()
-                    continue
-                results.append(url)
-                
-                # -------------------------
-                # 1a. เก็บลิงก์ภายในเพื่อติดตามต่อ
-                # -------------------------
-                soup = BeautifulSoup(html, "html.parser")
-                for a in soup.find_all("a", href=True):
-                    href = a.get("href").strip()
-                    if href.startswith("mailto:") or href.startswith("javascript:"):
-                        continue
-                    new = URL(urljoin(url, href)).with_fragment(None)
-                    new_str = str(new)
-                    p = urlparse(new_str)
-                    if p.netloc != base_domain:
-                        continue
-                    if new_str not in seen:
-                        seen.add(new_str)
-                        await to_visit.put(new_str)
-                to_visit.task_done()
-
-        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
-        await to_visit.join()
-        for w in workers:
-            w.cancel()
-        return list(dict.fromkeys(results))
+        while True:
+            try:
+                yield loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(agen.aclose())
+        loop.close()
 
 # -------------------------
-# 2. Normalization → ทำให้รูปแบบเหมือนกัน
+# 2. Normalization → ทำให้รูปแบบเหมือนกัน (normalize_url อยู่ที่ app/utils/crawl.py)
 # -------------------------
-def normalize_url(u: str) -> str:
-    try:
-        p = urlparse(u)
-    except Exception:
-        return u
-
-    scheme = p.scheme.lower()
-    netloc = p.netloc.lower()
-    if netloc.endswith(":80") and scheme == "http":
-        netloc = netloc[:-3]
-    if netloc.endswith(":443") and scheme == "https":
-        netloc = netloc[:-4]
-
-    path = p.path or "/"
-    q = parse_qsl(p.query, keep_blank_values=True)
-    # ลบ tracking params
-    q_filtered = [(k, v) for (k, v) in q if not TRACKING_PARAMS_RE.match(k)]
-    q_filtered.sort(key=lambda kv: (kv[0], kv[1]))
-    query = urlencode(q_filtered, doseq=True)
-
-    return urlunparse((scheme, netloc, path, "", query, ""))
-
 # -------------------------
 # 3. Feature Extraction / Signature → แปลงเป็นข้อความสำหรับเทียบ
 # -------------------------
@@ -168,6 +101,49 @@ def dedupe_urls_by_tfidf(urls, threshold=0.85):
 
     return representatives, groups
 
+def _dedupe_with_fallback(urls, threshold):
+    try:
+        return dedupe_urls_by_tfidf(urls, threshold=threshold)
+    except Exception:
+        representatives = []
+        groups = {}
+        seen = set()
+        for u in urls:
+            n = normalize_url(u)
+            if n not in seen:
+                seen.add(n)
+                representatives.append(n)
+                groups[n] = [u]
+        return representatives, groups
+
+# -------------------------
+# Incremental re-crawl → โหลด/บันทึกสถานะ crawl ของแต่ละเว็บ
+# -------------------------
+def _site_key(url: str) -> str:
+    p = urlparse(url)
+    return f"{p.scheme.lower()}://{p.netloc.lower()}"
+
+def _load_crawl_store(url: str, incremental: bool):
+    """คืนค่า (store_dir, pages) หรือ (None, None) ถ้าปิด incremental / ใช้ store ไม่ได้"""
+    if not incremental:
+        return None, None
+    try:
+        store_dir = crawl_store.get_store_dir()
+        return store_dir, crawl_store.load_site(store_dir, _site_key(url))
+    except Exception as e:
+        current_app.logger.warning(f"Crawl store unavailable, running full crawl: {e}")
+        return None, None
+
+def _save_crawl_store(store_dir, url: str, pages, urls) -> None:
+    if store_dir is None:
+        return
+    try:
+        # เก็บเฉพาะหน้าที่ยังเข้าถึงได้ในรอบนี้ (หน้าที่หายไปจะถูกตัดออก)
+        visited = {u: pages[u] for u in urls if u in pages}
+        crawl_store.save_site(store_dir, _site_key(url), visited)
+    except Exception as e:
+        current_app.logger.warning(f"Failed to save crawl store for {url}: {e}")
+
 # -------------------------
 # 7. Output / Reporting → ส่งผลลัพธ์ cleaned URLs + mapping
 # -------------------------
@@ -180,30 +156,29 @@ def scan():
     max_pages = int(data.get("max_pages", DEFAULT_MAX_PAGES))
     threshold = float(data.get("dedupe_threshold", DEFAULT_DEDUPE_THRESHOLD))
     concurrency = int(data.get("concurrency", DEFAULT_CONCURRENCY))
+    max_bytes = int(data.get("max_body_bytes", DEFAULT_MAX_BODY_BYTES))
+    incremental = bool(data.get("incremental", True))
+    pattern_budget = int(data.get("pattern_budget", DEFAULT_PATTERN_BUDGET))
+    use_sitemap = bool(data.get("use_sitemap", False))
 
     if not url or not urlparse(url).scheme in ("http", "https"):
         return jsonify({"ok": False, "msg": "invalid or missing url"}), 400
 
+    store_dir, store = _load_crawl_store(url, incremental)
+    stats = {}
     try:
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        urls = loop.run_until_complete(_crawl_async(url, max_pages=max_pages, concurrency=concurrency))
+        urls, targets = loop.run_until_complete(
+            crawl_async(url, max_pages=max_pages, concurrency=concurrency, max_bytes=max_bytes,
+                         store=store, stats=stats, pattern_budget=pattern_budget, use_sitemap=use_sitemap)
+        )
         loop.close()
     except Exception as e:
         return jsonify({"ok": False, "msg": "crawl failed", "error": str(e)}), 500
+    _save_crawl_store(store_dir, url, store, urls)
 
-    try:
-        representatives, groups = dedupe_urls_by_tfidf(urls, threshold=threshold)
-    except Exception:
-        representatives = []
-        groups = {}
-        seen = set()
-        for u in urls:
-            n = normalize_url(u)
-            if n not in seen:
-                seen.add(n)
-                representatives.append(n)
-                groups[n] = [u]
+    representatives, groups = _dedupe_with_fallback(urls, threshold)
 
     result = {
         "ok": True,
@@ -214,4 +189,91 @@ def scan():
         "cleaned_urls": representatives,
         "duplicates": groups
     }
+    targets = dedupe_targets(targets)
+    result["targets_count"] = len(targets)
+    result["targets"] = targets
+    result["crawl_stats"] = stats
     return jsonify(result)
+
+# -------------------------
+# 7b. Streaming Output → ส่ง URL ทีละรายการแบบ NDJSON
+# -------------------------
+def _ndjson(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False) + "\n"
+
+@bp.route("/scan/stream", methods=["POST"])
+@jwt_required()
+def scan_stream():
+    """
+    เหมือน /scan แต่ตอบกลับเป็น NDJSON (หนึ่ง event ต่อบรรทัด):
+      {"event": "url", ...}             → URL ที่ crawl เจอ
+      {"event": "representative", ...}  → URL ตัวแทนใหม่ (signature ยังไม่เคยเห็น)
+      {"event": "target", ...}          → target ใหม่ที่มี parameter (url/data/param) ส่งต่อให้ sqlmap ได้ทันที
+      {"event": "done", ...}            → ผลสรุปรูปแบบเดียวกับ /scan (dedupe ด้วย TF-IDF)
+      {"event": "error", ...}           → crawl ล้มเหลว
+    """
+    data = request.get_json(silent=True) or {}
+    url = data.get("url")
+    max_pages = int(data.get("max_pages", DEFAULT_MAX_PAGES))
+    threshold = float(data.get("dedupe_threshold", DEFAULT_DEDUPE_THRESHOLD))
+    concurrency = int(data.get("concurrency", DEFAULT_CONCURRENCY))
+    max_bytes = int(data.get("max_body_bytes", DEFAULT_MAX_BODY_BYTES))
+    incremental = bool(data.get("incremental", True))
+    pattern_budget = int(data.get("pattern_budget", DEFAULT_PATTERN_BUDGET))
+    use_sitemap = bool(data.get("use_sitemap", False))
+
+    if not url or not urlparse(url).scheme in ("http", "https"):
+        return jsonify({"ok": False, "msg": "invalid or missing url"}), 400
+
+    store_dir, store = _load_crawl_store(url, incremental)
+
+    def generate():
+        urls = []
+        signatures = set()
+        targets = {}
+        stats = {}
+        try:
+            for found, page_targets in _iter_async(
+                crawl_stream(url, max_pages=max_pages, concurrency=concurrency, max_bytes=max_bytes,
+                              store=store, stats=stats, pattern_budget=pattern_budget, use_sitemap=use_sitemap)
+            ):
+                urls.append(found)
+                yield _ndjson({"event": "url", "index": len(urls) - 1, "url": found})
+
+                # dedupe แบบเร็ว (signature ตรงกัน) ระหว่าง crawl, TF-IDF เต็มรูปแบบทำตอนจบ
+                normalized = normalize_url(found)
+                sig = url_to_text_signature(normalized)
+                if sig not in signatures:
+                    signatures.add(sig)
+                    yield _ndjson({"event": "representative", "url": normalized, "source": found})
+
+                for t in page_targets:
+                    key = target_signature(t)
+                    if key not in targets:
+                        targets[key] = t
+                        yield _ndjson({"event": "target", "source": found, **t})
+        except Exception as e:
+            yield _ndjson({"event": "error", "ok": False, "msg": "crawl failed", "error": str(e)})
+            return
+        _save_crawl_store(store_dir, url, store, urls)
+
+        representatives, groups = _dedupe_with_fallback(urls, threshold)
+        yield _ndjson({
+            "event": "done",
+            "ok": True,
+            "url": url,
+            "count_raw": len(urls),
+            "urls": urls,
+            "cleaned_count": len(representatives),
+            "cleaned_urls": representatives,
+            "duplicates": groups,
+            "targets_count": len(targets),
+            "targets": list(targets.values()),
+            "crawl_stats": stats
+        })
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,13 +1,18 @@
 # app/routes/llm_api.py
 import os
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required
+import json
 
-# 💡 เราจะใช้ SDK 'google-genai' ที่คุณติดตั้งไว้
-try:
-    from google import genai
-except ImportError:
-    genai = None
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from app.extensions import db
+from app.models.api_process import ApiProcess
+from app.models.user import User
+from app.utils.pdf_jobs import PDF_LAYOUT_CHOICES, request_pdf
+from app.utils.report_formats import iter_findings
+from app.utils.remediation import (
+    LLM_BATCH_MAX_ITEMS, RemediationError, distinct_findings, get_remediation, get_remediations,
+)
 
 bp = Blueprint("llm_api", __name__, url_prefix="/api/llm")
 
@@ -17,50 +22,86 @@ bp = Blueprint("llm_api", __name__, url_prefix="/api/llm")
 def analyze_payload():
     """
     Receives vulnerability type and title, then returns remediation steps from the LLM.
+    คำตอบของ title/type เดิมมาจาก cache (ดู app/utils/remediation.py), "refresh": true เพื่อถามโมเดลใหม่
     """
-    if not genai:
-        return jsonify({"ok": False, "error": "Google GenAI SDK not installed (run: pip install google-genai)"}), 500
+    data = request.get_json(silent=True) or {}
+    vuln_title = data.get("title")
+    vuln_type = data.get("type")
+
+    if not vuln_title or not vuln_type:
+        return jsonify({"ok": False, "error": "Vulnerability 'title' and 'type' are required"}), 400
 
     try:
-        data = request.get_json(silent=True) or {}
-        vuln_title = data.get("title")
-        vuln_type = data.get("type")
-
-        if not vuln_title or not vuln_type:
-            return jsonify({"ok": False, "error": "Vulnerability 'title' and 'type' are required"}), 400
-
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            return jsonify({"ok": False, "error": "AI service is not configured (missing GEMINI_API_KEY)"}), 500
-
-        prompt = f"""
-You are a security expert. Provide clear, actionable remediation steps for the following SQL Injection vulnerability.
-Provide code examples for the fix if possible (e.g., using parameterized queries in PHP or Python).
-Format the entire response in Markdown.
-
-Vulnerability Title: "{vuln_title}"
-Vulnerability Type: "{vuln_type}"
-"""
-        
-        # 💡 **สำคัญ:** ใช้โมเดล 'gemini-pro' ซึ่งเป็นโมเดลฟรีที่เสถียรที่สุด
-        # การใช้ 'gemini-1.5-flash' อาจทำให้เกิด Error 404 หาก API Key ของคุณยังไม่รองรับ
-        model_name = "gemini-2.5-flash"
-
-        # 💡 **แก้ไขถาวร:** ใช้วิธีการเรียกที่เรียบง่ายและถูกต้องที่สุด
-        
-        # 1. สร้าง Client object
-        client = genai.Client(api_key=api_key)
-        
-        # 2. เรียกใช้ generate_content โดยตรงจาก client.models
-        response = client.models.generate_content(
-            model=model_name,
-            contents=prompt
-        )
-        
-        analysis_result = response.text
-
-        return jsonify({"ok": True, "analysis": analysis_result})
-
-    except Exception as e:
-        print(f"Error in LLM API: {type(e).__name__} - {e}")
-        return jsonify({"ok": False, "error": f"An error occurred with the AI service: {str(e)}"}), 500
\ No newline at end of file
+        analysis_result, source = get_remediation(vuln_title, vuln_type, refresh=bool(data.get("refresh")))
+    except RemediationError as e:
+        current_app.logger.error(f"Error in LLM API: {e}")
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+    return jsonify({"ok": True, "analysis": analysis_result, "cached": source != "model", "source": source})
+
+
+@bp.route("/processes/<int:process_id>/remediation", methods=["POST"])
+@jwt_required(locations=["cookies"])
+def process_remediation(process_id):
+    """
+    คำแนะนำการแก้ไขของทุก finding ใน process เดียวในคำขอเดียว (แทนการเรียก /analyze-payload ทีละ finding)
+    finding ที่ type/title ซ้ำกันถูกรวมเป็นรายการเดียว แล้วถามโมเดลพร้อมกันแบบจำกัดจำนวน (ดู get_remediations)
+    body (ไม่บังคับ): {"refresh": bool, "embedInPdf": bool, "pdfLayout": "auto" | "full" | "compact"}
+    embedInPdf=true → สร้าง PDF ใหม่ที่มีภาคผนวกคำแนะนำ และให้ process ชี้ไปที่ไฟล์นั้น (เมื่อมีคำแนะนำอย่างน้อย 1 รายการ)
+    """
+    data = request.get_json(silent=True) or {}
+    embed_in_pdf = bool(data.get("embedInPdf"))
+    pdf_layout = (data.get("pdfLayout") or "").lower() or None
+    if pdf_layout and pdf_layout not in PDF_LAYOUT_CHOICES:
+        return jsonify({"ok": False, "error": f"pdfLayout must be one of: {', '.join(PDF_LAYOUT_CHOICES)}"}), 400
+
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    process = ApiProcess.query.get(process_id)
+    if not process:
+        return jsonify({"ok": False, "error": "Process not found"}), 404
+    if str(process.user_id) != str(current_user_id) and not (user and user.is_admin):
+        return jsonify({"ok": False, "error": "Access denied"}), 403
+    if not process.result_json:
+        return jsonify({"ok": False, "error": "Result file not available for this process"}), 404
+
+    try:
+        with open(os.path.join(current_app.static_folder, process.result_json), 'r', encoding='utf-8') as f:
+            results = json.load(f)
+    except (OSError, ValueError) as e:
+        current_app.logger.error(f"Cannot read results of process {process_id}: {e}")
+        return jsonify({"ok": False, "error": "Result file not found on server"}), 404
+    if not isinstance(results, list):
+        results = [results]
+
+    findings = distinct_findings(f for r in results if isinstance(r, dict) for f in iter_findings(r))
+    if len(findings) > LLM_BATCH_MAX_ITEMS:
+        return jsonify({"ok": False, "error": f"Too many distinct findings ({len(findings)} > {LLM_BATCH_MAX_ITEMS})"}), 413
+
+    items = get_remediations(findings, refresh=bool(data.get("refresh")))
+    sources = [item.get("source") for item in items]
+    response = {
+        "ok": True,
+        "processId": process.id,
+        "items": items,
+        "total": len(items),
+        "cached": sum(1 for s in sources if s in ("cache", "shared")),
+        "generated": sources.count("model"),
+        "failed": sum(1 for item in items if "error" in item),
+    }
+
+    # ส่งเฉพาะฟิลด์ที่แสดงใน PDF; source/error เปลี่ยนทุกครั้งที่เรียก ถ้าปนไปจะทำให้ cache key ของ PDF ไม่ตรงกัน
+    remediation = [{key: item.get(key) for key in ("type", "title", "count", "analysis")}
+                   for item in items if item.get("analysis")]
+    if embed_in_pdf and remediation:
+        try:
+            process.result_pdf, response["reportPdfStatus"] = request_pdf(
+                results, {"layout": pdf_layout, "remediation": remediation})
+            db.session.commit()
+            response["reportPdf"] = process.result_pdf
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"PDF with remediation failed for process {process_id}: {e}")
+            response["reportPdfError"] = "Could not generate the PDF report"
+
+    return jsonify(response)
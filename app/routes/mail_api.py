@@ -1,24 +1,51 @@
 from flask import request, jsonify, Blueprint, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.api_process import ApiProcess
-from app.utils.mailer import send_security_report_email
+from app.utils.mailer import build_security_report_message
+from app.utils.pdf_jobs import pdf_status
 from app.utils.decorators import admin_required
+from app.utils import mail_queue, report_links
 import os
+import re
 import datetime
 import json # <-- Import the json library
-from flask import url_for # <-- เพิ่มการ import url_for
 
 bp = Blueprint('mail_api', __name__)
 
+MAIL_BATCH_MAX_RECIPIENTS = int(os.getenv("MAIL_BATCH_MAX_RECIPIENTS", 50))
+EMAIL_RE = re.compile(r"^[^@\s,;]+@[^@\s,;]+\.[^@\s,;]+$")
+
+def _parse_recipients(data):
+    """'recipient' / 'recipients' (list หรือข้อความคั่นด้วย , ; หรือเว้นวรรค/ขึ้นบรรทัดใหม่) → list ไม่ซ้ำ"""
+    raw = []
+    for key in ('recipient', 'recipients'):
+        value = data.get(key) or []
+        raw.extend(re.split(r"[,;\s]+", value) if isinstance(value, str) else value)
+    recipients = []
+    for r in raw:
+        r = str(r).strip()
+        if r and r.lower() not in (x.lower() for x in recipients):
+            recipients.append(r)
+    return recipients
+
 @bp.route('/api/send-report/<int:process_id>', methods=['POST'])
 @jwt_required()
 @admin_required
 def send_report(process_id):
-    data = request.get_json()
-    recipient = data.get('recipient')
+    """
+    เข้าคิวส่ง report ของ process ให้ผู้รับ 1 คนหรือหลายคน (1 ฉบับต่อผู้รับ) แล้วตอบ 202 ทันที
+    ดูผลการส่งได้ที่ GET /api/send-report/batches/<batchId>
+    """
+    data = request.get_json(silent=True) or {}
+    recipients = _parse_recipients(data)
 
-    if not recipient:
+    if not recipients:
         return jsonify({"ok": False, "error": "Recipient email is required"}), 400
+    invalid = [r for r in recipients if not EMAIL_RE.match(r)]
+    if invalid:
+        return jsonify({"ok": False, "error": f"Invalid recipient email: {', '.join(invalid)}"}), 400
+    if len(recipients) > MAIL_BATCH_MAX_RECIPIENTS:
+        return jsonify({"ok": False, "error": f"Too many recipients (max {MAIL_BATCH_MAX_RECIPIENTS})"}), 400
 
     process = ApiProcess.query.get(process_id)
     if not process:
@@ -28,6 +55,10 @@ def send_report(process_id):
     if not process.result_pdf:
         return jsonify({"ok": False, "error": "No PDF path recorded"}), 404
     
+    pdf_state, _ = pdf_status(process.result_pdf)
+    if pdf_state == "pending":
+        return jsonify({"ok": False, "error": "PDF report is still being generated"}), 409
+
     absolute_pdf_path = os.path.join(current_app.root_path, 'static', process.result_pdf)
     if not os.path.exists(absolute_pdf_path):
         return jsonify({"ok": False, "error": "PDF report not found on server storage"}), 404
@@ -50,12 +81,11 @@ def send_report(process_id):
     # --- END: NEW FIX FOR JSON FILE ---
 
     try:
-        with open(absolute_pdf_path, 'rb') as f:
-            pdf_data = f.read()
-
         sender_username = get_jwt_identity()
         timestamp = datetime.datetime.now().strftime("%d %B %Y, %H:%M")
-        pdf_download_url = url_for('static', filename=process.result_pdf, _external=True)
+        # แนบไฟล์เฉพาะ PDF ที่ไม่ใหญ่เกิน MAIL_ATTACH_MAX_BYTES, ทุกฉบับมีลิงก์ดาวน์โหลดแบบลงชื่อ/หมดอายุ
+        attach_pdf = report_links.should_attach(absolute_pdf_path)
+        pdf_download_url, link_expires_at = report_links.make_download_url(process)
 
         report_data = {
             "url": process.endpoint,
@@ -63,23 +93,33 @@ def send_report(process_id):
             "db_count": db_count, # <-- Use the correctly calculated db_count
             "sender": sender_username,
             "sent_at": timestamp,
-            "pdf_download_url": pdf_download_url
+            "pdf_download_url": pdf_download_url,
+            "pdf_attached": attach_pdf,
+            "pdf_size_mb": round(os.path.getsize(absolute_pdf_path) / (1024 * 1024), 1),
+            "link_expires_at": link_expires_at.strftime("%d %B %Y, %H:%M"),
         }
         
         subject = f"SQLMap Scan Report for {process.endpoint}"
         
-        success, message = send_security_report_email(
-            recipient, 
-            subject, 
-            report_data, 
-            pdf_attachment=pdf_data,
-            pdf_filename=os.path.basename(process.result_pdf)
+        # ไฟล์ PDF ถูกอ่านตอน worker ส่งแต่ละฉบับ ไม่ใช่ใน request นี้
+        messages = [build_security_report_message(recipient, subject, report_data) for recipient in recipients]
+        batch = mail_queue.enqueue(
+            messages,
+            attachment_path=absolute_pdf_path if attach_pdf else None,
+            attachment_name=os.path.basename(process.result_pdf)
         )
-        
-        if success:
-            return jsonify({"ok": True, "message": "Email sent successfully"}), 200
-        else:
-            return jsonify({"ok": False, "error": message}), 500
+        return jsonify({"ok": True, "message": f"Queued {len(messages)} email(s)", "pdfAttached": attach_pdf, **batch}), 202
             
     except Exception as e:
-        return jsonify({"ok": False, "error": str(e)}), 500
\ No newline at end of file
+        current_app.logger.error(f"Failed to queue report email for process {process_id}: {e}")
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+
+@bp.route('/api/send-report/batches/<batch_id>', methods=['GET'])
+@jwt_required()
+@admin_required
+def send_report_status(batch_id):
+    batch = mail_queue.batch_status(batch_id)
+    if batch is None:
+        return jsonify({"ok": False, "error": "Batch not found"}), 404
+    return jsonify({"ok": True, **batch}), 200
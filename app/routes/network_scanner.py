@@ -1,107 +1,499 @@
 # app/routes/network_scanner.py
 import asyncio
 import aiohttp
+import ipaddress
 import os
 import re
-import json
 import uuid
+import hashlib
+import threading
+import itertools
 from datetime import datetime
 from flask import Blueprint, request, jsonify, current_app
 # --- CHANGE HERE: Import get_jwt_identity instead of get_current_user ---
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.exc import SQLAlchemyError
 from app.utils.decorators import admin_required
 from app.extensions import db
 from app.models.network_scan import NetworkScan
+from app.utils import scan_results, wordlists
+from app.utils.assessment import AssessmentJob, assessment_path, get_assessment
+from app.utils.scan_checkpoint import ScanCheckpoint, checkpoint_path
+from app.utils.connect_scan import RttEstimator, connect_batch
 
 bp = Blueprint("network_scanner", __name__, url_prefix="/api/network")
 
-_WORDLIST_CACHE = None
+FOUND_STATUSES = (200, 301, 302, 403)
+FINGERPRINT_BYTES = 64 * 1024
+# ถ้า path ที่ตอบ (พบจริง + เหมือน baseline) เกินสัดส่วนนี้ หลังยิงครบอย่างน้อย CATCH_ALL_MIN_PROBES
+# ถือว่า base_url ตอบทุก path (catch-all) แล้วหยุดยิง path ที่เหลือ
+CATCH_ALL_MIN_PROBES = int(os.getenv("NETWORK_SCAN_CATCHALL_MIN_PROBES", 20))
+CATCH_ALL_RATIO = float(os.getenv("NETWORK_SCAN_CATCHALL_RATIO", 0.5))
 
-FALLBACK_PATHS = [
-    "admin", "login", "dashboard", "test", "phpinfo.php", "e-learning",
-    "backup", "dev", "staging", "api", "phpmyadmin", "wordpress", "wp-admin"
-]
+def _fingerprint_body(body: bytes, marker: str):
+    """length / hash ของ body หลังตัด path ที่ขอออก (หลายหน้า 404 echo path กลับมา)"""
+    body = body.replace(marker.encode(), b"") if marker else body
+    return len(body), hashlib.sha1(body).hexdigest()[:16]
 
-# ... (โค้ดส่วนอื่นๆ ตั้งแต่ load_wordlist จนถึง parse_ip_range ยังคงเหมือนเดิม) ...
+def _strip_marker(location, marker: str):
+    return location.replace(marker, "") if location and marker else location
 
-def load_wordlist():
+async def fingerprint_base_url(session, base_url):
+    """
+    baseline ของ base_url: ยิง path สุ่มที่ไม่น่ามีอยู่จริง แล้วเก็บ status / length / hash ของ response
+    (และ Location ของ redirect) ไว้เทียบกับทุก path ที่ยิงภายหลัง ดู matches_baseline
+    """
+    token = uuid.uuid4().hex
     try:
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        wordlist_path = os.path.join(base_dir, 'wordlists', 'common.txt')
-        
-        if not os.path.exists(wordlist_path):
-            raise FileNotFoundError
-
-        with open(wordlist_path, 'r', encoding='utf-8') as f:
-            lines = [line.strip() for line in f]
-            wordlist = [line for line in lines if line and not re.search(r'\s', line) and not line.startswith('#')]
-            return wordlist if wordlist else FALLBACK_PATHS
-            
-    except FileNotFoundError:
-        current_app.logger.warning("wordlists/common.txt not found. Using internal fallback wordlist.")
-        return FALLBACK_PATHS
-
-async def check_path(session, base_url, path):
-    url_to_check = f"{base_url.rstrip('/')}/{path.lstrip('/')}"
+        async with session.get(f"{base_url.rstrip('/')}/{token}", timeout=2, allow_redirects=False) as response:
+            length, digest = _fingerprint_body(await response.content.read(FINGERPRINT_BYTES), token)
+            return {
+                "status": response.status,
+                "length": length,
+                "hash": digest,
+                "location": _strip_marker(response.headers.get("Location"), token),
+            }
+    except (asyncio.TimeoutError, aiohttp.ClientError):
+        return None
+
+def matches_baseline(baseline, status, path, location=None, body=None):
+    """
+    response ของ path นี้เหมือนกับของ path สุ่ม (baseline) หรือไม่:
+      True  = เหมือน → ไม่ใช่ path จริง (เช่น soft-404 ที่ตอบ 200, redirect ไป /login ทุก path, 403 ทุก path)
+      False = ต่างจาก baseline → path มีอยู่จริง
+      None  = status เดียวกันแต่ยังตัดสินไม่ได้ ต้องเทียบ body (ส่ง body มาด้วย)
+    """
+    if not baseline or status != baseline["status"]:
+        return False
+    if 300 <= status < 400:
+        return _strip_marker(location, path) == baseline.get("location")
+    if body is None:
+        return None
+    length, digest = _fingerprint_body(body, path)
+    return digest == baseline["hash"] or length == baseline["length"]
+
+# path discovery ใช้ connection แบบ keep-alive ต่อ host (pool จำกัดต่อ host) และยิง HEAD ก่อน
+# เพื่อไม่ต้องโหลด body; host ที่ไม่รองรับ HEAD (405/501) จะสลับไปใช้ GET ทั้ง base_url
+PATH_CONN_PER_HOST = int(os.getenv("NETWORK_SCAN_CONN_PER_HOST", 8))
+PATH_KEEPALIVE = float(os.getenv("NETWORK_SCAN_KEEPALIVE", 30))
+PATH_TIMEOUT = float(os.getenv("NETWORK_SCAN_PATH_TIMEOUT", 2))
+HEAD_UNSUPPORTED = (405, 501)
+# HEAD ที่ได้ status เดียวกับ baseline ต้อง GET มาเทียบ body; ถ้า GET ยืนยันว่าเหมือน baseline ครบจำนวนนี้
+# (และยังไม่เคยเจอ path ที่ต่าง) จะเชื่อ status ของ HEAD อย่างเดียวสำหรับ base_url นั้น ไม่ GET ซ้ำอีก
+HEAD_TRUST_PROBES = int(os.getenv("NETWORK_SCAN_HEAD_TRUST_PROBES", 5))
+# body ของ GET ที่เล็กกว่านี้จะถูกอ่านทิ้งเพื่อคืน connection กลับเข้า pool (ใหญ่กว่านี้ปิด connection แทน)
+DRAIN_MAX_BYTES = 64 * 1024
+
+def make_path_connector(path_concurrency):
+    return aiohttp.TCPConnector(
+        limit=path_concurrency,
+        limit_per_host=PATH_CONN_PER_HOST,
+        keepalive_timeout=PATH_KEEPALIVE,
+        ttl_dns_cache=300,
+        ssl=False,  # เป้าหมายส่วนใหญ่เป็น IP ภายในที่ใช้ self-signed cert
+    )
+
+async def check_path(session, target, path):
+    """
+    คืนค่า URL ถ้า path มีอยู่จริง: status อยู่ใน FOUND_STATUSES และ response ต่างจาก baseline ของ base_url
+    ยิง HEAD ก่อน (ตัดสินจาก status / Location ได้เลยในกรณีส่วนใหญ่) ถ้า status เดียวกับ baseline จะ GET เพื่อเทียบ body
+    (ดู HEAD_TRUST_PROBES) ถ้า base_url ตอบ HEAD ด้วย 405/501 จะจำไว้ใน target["use_get"] แล้วใช้ GET แทนตั้งแต่นั้น
+    response ที่เหมือน baseline ถูกนับใน target["baseline_hits"] เพื่อใช้ตัดสิน catch-all ใน run_scan_pipeline
+    """
+    url_to_check = f"{target['base_url'].rstrip('/')}/{path.lstrip('/')}"
+    marker = path.strip('/')
+    baseline = target.get("baseline")
+    timeout = aiohttp.ClientTimeout(total=PATH_TIMEOUT)
+
+    def verdict(same):
+        if same:
+            target["baseline_hits"] = target.get("baseline_hits", 0) + 1
+            return None
+        return url_to_check
+
     try:
-        async with session.get(url_to_check, timeout=2, allow_redirects=False) as response:
-            if response.status in [200, 301, 302, 403]:
-                return url_to_check
+        head_matched = False
+        if not target.get("use_get"):
+            async with session.head(url_to_check, timeout=timeout, allow_redirects=False) as response:
+                status, location = response.status, response.headers.get("Location")
+            if status not in HEAD_UNSUPPORTED:
+                if status not in FOUND_STATUSES:
+                    return None
+                same = matches_baseline(baseline, status, marker, location)
+                if same is None and not target.get("head_untrusted") \
+                        and target.get("head_confirmed", 0) >= HEAD_TRUST_PROBES:
+                    same = True
+                if same is not None:
+                    return verdict(same)
+                head_matched = True
+            else:
+                target["use_get"] = True
+
+        async with session.get(url_to_check, timeout=timeout, allow_redirects=False) as response:
+            if response.status not in FOUND_STATUSES:
+                if response.content_length is not None and response.content_length <= DRAIN_MAX_BYTES:
+                    await response.read()
+                return None
+            body = await response.content.read(FINGERPRINT_BYTES)
+            same = matches_baseline(baseline, response.status, marker, response.headers.get("Location"), body)
+        if head_matched:
+            if same:
+                target["head_confirmed"] = target.get("head_confirmed", 0) + 1
+            else:
+                target["head_untrusted"] = True
+        return verdict(same)
     except (asyncio.TimeoutError, aiohttp.ClientError):
         pass
     return None
 
-async def discover_content(session, base_url, wordlist):
-    tasks = [check_path(session, base_url, path) for path in wordlist]
-    results = await asyncio.gather(*tasks)
-    return [res for res in results if res]
+# --- Service fingerprint (optional stage): title / Server / tech ของ base_url และ path ที่พบ ---
+TITLE_RE = re.compile(rb"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+GENERATOR_RE = re.compile(rb'<meta[^>]+name=["\']generator["\'][^>]+content=["\']([^"\']+)', re.IGNORECASE)
+# (ชื่อ tech, แหล่งที่ดู: header/cookie/body, pattern)
+TECH_SIGNATURES = (
+    ("PHP", "cookie", re.compile(r"\bPHPSESSID=", re.IGNORECASE)),
+    ("Java", "cookie", re.compile(r"\bJSESSIONID=", re.IGNORECASE)),
+    ("ASP.NET", "cookie", re.compile(r"\bASP\.NET_SessionId=", re.IGNORECASE)),
+    ("Laravel", "cookie", re.compile(r"\blaravel_session=", re.IGNORECASE)),
+    ("Django", "cookie", re.compile(r"\bcsrftoken=")),
+    ("ASP.NET", "header", re.compile(r"^X-AspNet-Version:", re.IGNORECASE | re.MULTILINE)),
+    ("ASP.NET", "body", re.compile(rb"__VIEWSTATE")),
+    ("WordPress", "body", re.compile(rb"/wp-content/|/wp-includes/")),
+    ("Joomla", "body", re.compile(rb"/media/jui/|com_content", re.IGNORECASE)),
+    ("Drupal", "body", re.compile(rb"Drupal\.settings|/sites/default/files/")),
+    ("phpMyAdmin", "body", re.compile(rb"phpMyAdmin", re.IGNORECASE)),
+)
+
+def _detect_tech(headers, body: bytes):
+    tech = []
+    powered_by = headers.get("X-Powered-By")
+    if powered_by:
+        tech.append(powered_by)
+    cookies = "\n".join(headers.getall("Set-Cookie", []))
+    header_text = "\n".join(f"{k}: {v}" for k, v in headers.items())
+    generator = GENERATOR_RE.search(body)
+    if generator:
+        tech.append(generator.group(1).decode("utf-8", "replace").strip())
+    for name, source, pattern in TECH_SIGNATURES:
+        haystack = {"cookie": cookies, "header": header_text, "body": body}[source]
+        if pattern.search(haystack):
+            tech.append(name)
+    return list(dict.fromkeys(tech))
 
-async def check_port(host, port, timeout=0.5):
+async def fingerprint_service(session, url):
+    """GET หน้าแรกของ url (อ่านไม่เกิน FINGERPRINT_BYTES) แล้วดึง title, Server header และ tech ที่เดาได้"""
     try:
-        conn = asyncio.open_connection(host, port)
-        _, writer = await asyncio.wait_for(conn, timeout=timeout)
-        writer.close()
-        await writer.wait_closed()
-        return True
-    except (asyncio.TimeoutError, ConnectionRefusedError, OSError):
-        return False
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=PATH_TIMEOUT * 2),
+                               allow_redirects=False) as response:
+            body = await response.content.read(FINGERPRINT_BYTES)
+            title = TITLE_RE.search(body)
+            return {
+                "url": url,
+                "status": response.status,
+                "title": " ".join(title.group(1).decode("utf-8", "replace").split())[:200] if title else None,
+                "server": response.headers.get("Server"),
+                "content_type": response.headers.get("Content-Type"),
+                "tech": _detect_tech(response.headers, body),
+            }
+    except (asyncio.TimeoutError, aiohttp.ClientError):
+        return None
 
-async def scan_host(session, host, wordlist):
-    http_task = asyncio.create_task(check_port(host, 80))
-    https_task = asyncio.create_task(check_port(host, 443))
-
-    open_protocols = []
-    if await http_task: open_protocols.append("http")
-    if await https_task: open_protocols.append("https")
-            
-    if open_protocols:
-        result = {"host": host, "status": "open", "urls": [], "found_paths": []}
-        discovery_tasks = []
-        for proto in open_protocols:
-            base_url = f"{proto}://{host}"
-            result["urls"].append(base_url)
-            discovery_tasks.append(discover_content(session, base_url, wordlist))
-
-        if discovery_tasks:
-            all_found_paths = await asyncio.gather(*discovery_tasks)
-            for paths in all_found_paths:
-                result["found_paths"].extend(paths)
-        return result
-    return None
+def web_roots(result):
+    """base_url ของ host ที่ตอบ HTTP ได้ (status < 500) สำหรับส่งต่อให้ crawler/sqlmap"""
+    services = result.get("services")
+    if services is None:
+        return list(result["urls"])
+    alive = {s["url"] for s in services if s["status"] < 500}
+    return [u for u in result["urls"] if u in alive]
 
-def parse_ip_range(ip_range_str: str):
-    if '-' not in ip_range_str:
-        return [ip_range_str.strip()]
-    parts = ip_range_str.split('-')
-    base_ip_str = '.'.join(parts[0].split('.')[:-1])
+HTTPS_PORTS = {443, 8443, 9443}
+DEFAULT_SCAN_PORTS = os.getenv("NETWORK_SCAN_PORTS", "80,443,8080,8443,8000")
+DEFAULT_CONNECT_TIMEOUT = float(os.getenv("NETWORK_SCAN_CONNECT_TIMEOUT", 0.5))
+CONNECT_BATCH_SIZE = int(os.getenv("NETWORK_SCAN_CONNECT_BATCH", 512))
+
+def parse_ports(value):
+    """
+    แปลงรายการพอร์ต (list หรือข้อความคั่นด้วย comma) เป็น [(port, proto)]
+    ระบุ protocol เองได้แบบ "8081/https" ไม่ระบุจะเดาจากเลขพอร์ต
+    """
+    items = value if isinstance(value, list) else str(value or '').split(',')
+    ports = []
+    for item in items:
+        item = str(item).strip()
+        if not item:
+            continue
+        port_str, _, proto = item.partition('/')
+        try:
+            port = int(port_str)
+        except ValueError:
+            raise ValueError(f"Invalid port: {item}")
+        proto = proto.strip().lower() or ("https" if port in HTTPS_PORTS else "http")
+        if not (1 <= port <= 65535) or proto not in ("http", "https"):
+            raise ValueError(f"Invalid port: {item}")
+        if all(port != p for p, _ in ports):
+            ports.append((port, proto))
+    if not ports:
+        raise ValueError("At least one port is required")
+    return ports
+
+def _base_urls(host, open_ports):
+    url_host = f"[{host}]" if ':' in host else host  # IPv6 ต้องอยู่ใน []
+    urls = []
+    for port, proto in open_ports:
+        default_port = 443 if proto == "https" else 80
+        urls.append(f"{proto}://{url_host}" if port == default_port else f"{proto}://{url_host}:{port}")
+    return urls
+
+MAX_SCAN_HOSTS = int(os.getenv("NETWORK_SCAN_MAX_HOSTS", 65536))
+
+def _parse_ip_spec(spec: str):
+    """
+    แปลง 1 รายการเป็นช่วง (first, last) แบบ int และ IP version
+    รองรับ: 10.0.0.5 | 10.0.0.0/24 | 10.0.0.1-254 | 10.0.0.1-10.0.1.20 | 2001:db8::/120 | 2001:db8::1-2001:db8::ff
+    """
     try:
-        start_ip_last_octet = int(parts[0].split('.')[-1])
-        end_ip_last_octet = int(parts[1])
-    except (ValueError, IndexError):
-        raise ValueError("Invalid IP range format")
-    if not (0 <= start_ip_last_octet <= 255 and 0 <= end_ip_last_octet <= 255 and start_ip_last_octet <= end_ip_last_octet):
+        if '/' in spec:
+            net = ipaddress.ip_network(spec, strict=False)
+            first, last = int(net.network_address), int(net.broadcast_address)
+            # เหมือน net.hosts(): ไม่รวม network/broadcast (IPv4) และ subnet-router anycast (IPv6)
+            if net.version == 4 and net.prefixlen < 31:
+                first, last = first + 1, last - 1
+            elif net.version == 6 and net.prefixlen < 127:
+                first += 1
+            return net.version, first, last
+        if '-' in spec:
+            start_str, end_str = (x.strip() for x in spec.split('-', 1))
+            start = ipaddress.ip_address(start_str)
+            if end_str.isdigit() and start.version == 4:
+                # รูปแบบเดิม: 10.0.0.1-254 (เปลี่ยนเฉพาะ octet สุดท้าย)
+                end = ipaddress.ip_address('.'.join(start_str.split('.')[:-1] + [end_str]))
+            else:
+                end = ipaddress.ip_address(end_str)
+            if start.version != end.version or int(start) > int(end):
+                raise ValueError
+            return start.version, int(start), int(end)
+        addr = ipaddress.ip_address(spec)
+        return addr.version, int(addr), int(addr)
+    except ValueError:
+        raise ValueError(f"Invalid IP range format: {spec}")
+
+def _merge_ranges(ranges):
+    """รวมช่วงที่ซ้อนกัน/ติดกันให้เป็นช่วงไม่ซ้ำ เรียงตาม (version, first)"""
+    merged = []
+    for version, first, last in sorted(ranges):
+        if merged and merged[-1][0] == version and first <= merged[-1][2] + 1:
+            merged[-1][2] = max(merged[-1][2], last)
+        else:
+            merged.append([version, first, last])
+    return [tuple(r) for r in merged]
+
+def _subtract_ranges(includes, excludes):
+    result = []
+    for version, first, last in includes:
+        cur = first
+        for ex_version, ex_first, ex_last in excludes:
+            if ex_version != version or ex_last < cur or ex_first > last:
+                continue
+            if ex_first > cur:
+                result.append((version, cur, ex_first - 1))
+            cur = max(cur, ex_last + 1)
+            if cur > last:
+                break
+        if cur <= last:
+            result.append((version, cur, last))
+    return result
+
+def parse_ip_ranges(ip_range_str: str):
+    """
+    แยกข้อความเป้าหมาย (คั่นด้วย comma / เว้นวรรค, ขึ้นต้นด้วย '!' = ยกเว้น)
+    เป็นรายการช่วง (version, first, last) ที่ไม่ซ้ำกัน ตรวจรูปแบบทั้งหมดก่อนเริ่มสแกน
+    """
+    includes, excludes = [], []
+    for spec in re.split(r'[,\s]+', ip_range_str or ''):
+        if not spec:
+            continue
+        if spec.startswith('!'):
+            excludes.append(_parse_ip_spec(spec[1:].strip()))
+        else:
+            includes.append(_parse_ip_spec(spec))
+    if not includes:
         raise ValueError("Invalid IP range format")
-    return [f"{base_ip_str}.{i}" for i in range(start_ip_last_octet, end_ip_last_octet + 1)]
+    return _subtract_ranges(_merge_ranges(includes), _merge_ranges(excludes))
+
+def count_ip_ranges(ranges) -> int:
+    return sum(last - first + 1 for _, first, last in ranges)
+
+def iter_ip_ranges(ranges):
+    """generator: สร้าง IP ทีละตัว (ไม่สร้าง list ทั้งหมดไว้ใน memory)"""
+    for version, first, last in ranges:
+        cls = ipaddress.IPv4Address if version == 4 else ipaddress.IPv6Address
+        for value in range(first, last + 1):
+            yield str(cls(value))
+
+def skip_ip_ranges(ranges, count):
+    """ตัด count IP แรก (ตามลำดับของ iter_ip_ranges) ออกจาก ranges โดยไม่ต้องไล่ทีละ IP"""
+    remaining = []
+    for version, first, last in ranges:
+        size = last - first + 1
+        if count >= size:
+            count -= size
+            continue
+        remaining.append((version, first + count, last))
+        count = 0
+    return remaining
+
+def parse_ip_range(ip_range_str: str):
+    """คืนค่า generator ของ IP ทั้งหมดในเป้าหมาย (ตรวจรูปแบบทันที, สร้าง IP แบบ lazy)"""
+    return iter_ip_ranges(parse_ip_ranges(ip_range_str))
+
+
+DEFAULT_PORT_CONCURRENCY = int(os.getenv("NETWORK_SCAN_PORT_CONCURRENCY", 512))
+DEFAULT_PATH_CONCURRENCY = int(os.getenv("NETWORK_SCAN_PATH_CONCURRENCY", 100))
+
+async def run_scan_pipeline(ranges, wordlist, port_concurrency=DEFAULT_PORT_CONCURRENCY,
+                            path_concurrency=DEFAULT_PATH_CONCURRENCY, on_host=None, on_scanned=None,
+                            ports=None, connect_timeout=DEFAULT_CONNECT_TIMEOUT, fingerprint=False,
+                            hosts=None):
+    """
+    สแกนแบบ pipeline 2 ขั้น โดยมี worker จำนวนคงที่ (ไม่สร้าง coroutine ต่อ IP/ต่อ path):
+      1. port workers ดึง IP จาก generator ทีละชุด แล้วเช็คทุกพอร์ตของชุดนั้นด้วย connect_batch
+         (socket เปิดพร้อมกันไม่เกิน port_concurrency, timeout ปรับตาม RTT ที่วัดได้)
+         → host ที่เปิดจะถูกแตกเป็นงาน (base_url, path) ลง path_queue (มีขนาดจำกัด = backpressure)
+      2. path workers (path_concurrency ตัว) ดึงงานจาก path_queue มายิง HTTP
+    ก่อนแตกงาน จะทำ baseline (fingerprint_base_url) ของแต่ละ base_url แล้วทุก path ถูกเทียบกับ baseline (matches_baseline)
+    ระหว่างยิงถ้า path ที่ตอบกลับ (ทั้งที่พบจริงและที่เหมือน baseline เช่น soft-404 / 403 / redirect ทุก path)
+    เกิน CATCH_ALL_RATIO ของที่ยิงไปแล้ว จะจัด base_url นั้นเป็น catch-all และข้าม path ที่เหลือทันที
+    host จะถูกส่งออก (on_host / ผลลัพธ์) เมื่อ path ทุกตัวของ host นั้นเสร็จ
+    fingerprint=True: ก่อนส่งออกจะเก็บ title / Server / tech ของ base_url และ path ที่พบไว้ใน result["services"]
+    on_scanned(host) ถูกเรียกครั้งเดียวต่อ IP เมื่อสแกน IP นั้นเสร็จ (ใช้ทำ progress)
+    hosts: iterator ของ IP ที่จะใช้แทน iter_ip_ranges(ranges) (เช่นตอน resume จาก checkpoint)
+    """
+    ip_iter = iter(hosts) if hosts is not None else iter_ip_ranges(ranges)
+    ports = ports or parse_ports(DEFAULT_SCAN_PORTS)
+    batch_size = max(len(ports), min(CONNECT_BATCH_SIZE, port_concurrency))
+    hosts_per_batch = max(1, batch_size // len(ports))
+    port_workers = max(1, port_concurrency // (hosts_per_batch * len(ports)))
+    rtt = RttEstimator(initial_timeout=connect_timeout, max_timeout=connect_timeout)
+    path_queue = asyncio.Queue(maxsize=path_concurrency * 2)
+    found_hosts = []
+
+    def scanned(host):
+        if on_scanned is not None:
+            on_scanned(host)
+
+    async def finish(state):
+        result = state["result"]
+        for target in state["targets"]:
+            if target["catch_all"]:
+                result.setdefault("catch_all", []).append({"base_url": target["base_url"], **(target["baseline"] or {})})
+            else:
+                result["found_paths"].extend(target["found"])
+        if fingerprint:
+            urls = list(dict.fromkeys(result["urls"] + result["found_paths"]))
+            services = await asyncio.gather(*(fingerprint_service(session, u) for u in urls))
+            result["services"] = [svc for svc in services if svc]
+        found_hosts.append(result)
+        if on_host is not None:
+            on_host(result)
+        state["scanned"] = True
+        scanned(result["host"])
+
+    async def finish_safely(state):
+        """finish() ที่ไม่ raise: error ของ fingerprint / on_host / การเขียนผล ไม่ทำให้ worker ตาย (queue.join() จะค้าง)"""
+        try:
+            await finish(state)
+        except Exception as e:
+            current_app.logger.error(f"Network scan: cannot finish host {state['result']['host']}: {e}")
+            if not state.get("scanned"):
+                state["scanned"] = True
+                scanned(state["result"]["host"])
+
+    conn = make_path_connector(path_concurrency)
+    headers = {"User-Agent": "Mozilla/5.0"}
+    async with aiohttp.ClientSession(connector=conn, headers=headers) as session:
+
+        async def dispatch(host, open_ports):
+            base_urls = _base_urls(host, open_ports)
+            baselines = await asyncio.gather(*(fingerprint_base_url(session, u) for u in base_urls))
+            targets = [
+                {"base_url": u, "baseline": b, "catch_all": False, "use_get": False,
+                 "probed": 0, "found": [], "baseline_hits": 0,
+                 # จำกัด path ที่ยิงพร้อมกันต่อ base_url เท่ากับ pool ต่อ host เพื่อให้ตัดสิน catch-all ได้ก่อนงานที่เหลือเริ่ม
+                 "slots": asyncio.Semaphore(PATH_CONN_PER_HOST)}
+                for u, b in zip(base_urls, baselines)
+            ]
+            state = {
+                "result": {"host": host, "status": "open", "open_ports": [p for p, _ in open_ports],
+                           "urls": base_urls, "found_paths": []},
+                "targets": targets,
+                "pending": sum(len(wordlist) for t in targets if not t["catch_all"]),
+            }
+            if state["pending"] == 0:
+                await finish_safely(state)
+                return
+            for target in targets:
+                if target["catch_all"]:
+                    continue
+                for path in wordlist:
+                    await path_queue.put((state, target, path))
+
+        async def port_worker():
+            while True:
+                hosts = list(itertools.islice(ip_iter, hosts_per_batch))
+                if not hosts:
+                    break
+                probes = [(host, port) for host in hosts for port, _ in ports]
+                results = await connect_batch(probes, rtt.timeout())
+                for sample in results.values():
+                    if sample is not None:
+                        rtt.update(sample)
+                for host in hosts:
+                    open_ports = [(port, proto) for port, proto in ports if results.get((host, port)) is not None]
+                    if open_ports:
+                        await dispatch(host, open_ports)
+                    else:
+                        scanned(host)
+
+        async def probe(target, path):
+            async with target["slots"]:
+                # base_url ที่ถูกจัดเป็น catch-all ระหว่างทาง: งานที่ค้างใน queue / รอ slot ข้ามไปโดยไม่ยิง
+                if target["catch_all"]:
+                    return
+                found = await check_path(session, target, path)
+                target["probed"] += 1
+                if found:
+                    target["found"].append(found)
+                answered = len(target["found"]) + target["baseline_hits"]
+                if (target["probed"] >= CATCH_ALL_MIN_PROBES
+                        and answered > CATCH_ALL_RATIO * target["probed"]):
+                    target["catch_all"] = True
+
+        async def path_worker():
+            while True:
+                state, target, path = await path_queue.get()
+                try:
+                    if not target["catch_all"]:
+                        await probe(target, path)
+                except Exception as e:  # error ที่ไม่คาดคิดของ path เดียวไม่ทำให้ worker ตาย
+                    current_app.logger.error(f"Network scan: error probing {target['base_url']} {path}: {e}")
+                finally:
+                    try:
+                        state["pending"] -= 1
+                        if state["pending"] == 0:
+                            await finish_safely(state)
+                    finally:
+                        path_queue.task_done()
+
+        path_workers = [asyncio.create_task(path_worker()) for _ in range(path_concurrency)]
+        try:
+            await asyncio.gather(*(port_worker() for _ in range(port_workers)))
+            await path_queue.join()
+        finally:
+            for w in path_workers:
+                w.cancel()
+            await asyncio.gather(*path_workers, return_exceptions=True)
+
+    return found_hosts
 
 
 @bp.route("/scan-range", methods=["POST"])
@@ -109,16 +501,27 @@ def parse_ip_range(ip_range_str: str):
 @admin_required
 def scan_range():
     """API endpoint to scan an IP range and save the process."""
-    global _WORDLIST_CACHE
-    if _WORDLIST_CACHE is None:
-        _WORDLIST_CACHE = load_wordlist()
-
     data = request.get_json()
     if not data:
         return jsonify({"ok": False, "error": "Invalid JSON payload"}), 400
 
+    try:
+        wordlist = wordlists.load_wordlist(data.get("wordlist") or wordlists.DEFAULT_WORDLIST)
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
     ip_range_str = data.get("ip_range")
-    concurrency = int(data.get("concurrency", 150))
+    concurrency = int(data.get("concurrency", DEFAULT_PORT_CONCURRENCY))
+    path_concurrency = int(data.get("path_concurrency", DEFAULT_PATH_CONCURRENCY))
+    if concurrency < 1 or path_concurrency < 1:
+        return jsonify({"ok": False, "error": "concurrency and path_concurrency must be positive"}), 400
+    # assess: ส่ง web root ที่พบต่อให้ crawler + sqlmap อัตโนมัติ (ต้องใช้ผล fingerprint จึงเปิดให้ด้วย)
+    assess = bool(data.get("assess", False))
+    fingerprint = assess or bool(data.get("fingerprint", False))
+    try:
+        ports = parse_ports(data.get("ports") or DEFAULT_SCAN_PORTS)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
     
     # --- CHANGE HERE: Get user ID directly from the token's identity ---
     current_user_id = get_jwt_identity()
@@ -126,69 +529,287 @@ def scan_range():
     if not ip_range_str:
         return jsonify({"ok": False, "error": "ip_range is required"}), 400
 
+    if len(ip_range_str) > 255:
+        return jsonify({"ok": False, "error": "ip_range is too long (max 255 characters)"}), 400
+
     try:
-        target_ips = parse_ip_range(ip_range_str)
+        ranges = parse_ip_ranges(ip_range_str)
     except ValueError as e:
         return jsonify({"ok": False, "error": str(e)}), 400
 
+    total_hosts = count_ip_ranges(ranges)
+    if total_hosts > MAX_SCAN_HOSTS:
+        return jsonify({"ok": False, "error": f"Target range has {total_hosts} hosts (max {MAX_SCAN_HOSTS})"}), 400
+
+    reports_dir = os.path.join(current_app.static_folder, 'reports', 'network_scans')
+    os.makedirs(reports_dir, exist_ok=True)
+
     new_scan = NetworkScan(
         # --- CHANGE HERE: Use the ID we got from the identity ---
         user_id=current_user_id,
         ip_range=ip_range_str,
         concurrency=concurrency,
-        status=1
+        status=1,
+        total_hosts=total_hosts,
+        scanned_hosts=0,
     )
     db.session.add(new_scan)
     db.session.commit()
 
-    async def run_scan():
-        conn = aiohttp.TCPConnector(limit_per_host=20, limit=100)
-        headers = {"User-Agent": "Mozilla/5.0"}
-        async with aiohttp.ClientSession(connector=conn, headers=headers) as session:
-            sem = asyncio.Semaphore(concurrency)
-            async def bounded_scan(ip):
-                async with sem:
-                    return await scan_host(session, ip, _WORDLIST_CACHE)
-            tasks = [bounded_scan(ip) for ip in target_ips]
-            results = await asyncio.gather(*tasks)
-            return [res for res in results if res]
+    # ผลลัพธ์ถูกเขียนลงไฟล์ทีละ host ระหว่างสแกน จึงกำหนด path ไว้ตั้งแต่เริ่ม
+    result_filename = f"network_scan_{new_scan.id}_{uuid.uuid4().hex}.ndjson"
+    new_scan.result_json_path = os.path.join('reports', 'network_scans', result_filename).replace('\\', '/')
+    db.session.commit()
 
-    try:
-        found_hosts = asyncio.run(run_scan())
-        
-        reports_dir = os.path.join(current_app.static_folder, 'reports', 'network_scans')
-        os.makedirs(reports_dir, exist_ok=True)
-        result_filename = f"network_scan_{new_scan.id}_{uuid.uuid4().hex}.json"
-        result_filepath = os.path.join(reports_dir, result_filename)
-
-        scan_data = {
-            "scan_id": new_scan.id,
-            "ip_range": ip_range_str,
-            "found_hosts": found_hosts,
-            "count": len(found_hosts)
-        }
-        with open(result_filepath, 'w', encoding='utf-8') as f:
-            json.dump(scan_data, f, ensure_ascii=False, indent=4)
-        
-        new_scan.status = 2
-        new_scan.found_hosts_count = len(found_hosts)
-        new_scan.result_json_path = os.path.join('reports', 'network_scans', result_filename).replace('\\', '/')
+    result_filepath = os.path.join(reports_dir, result_filename)
+    checkpoint = ScanCheckpoint(checkpoint_path(result_filepath), {
+        "wordlist": data.get("wordlist") or wordlists.DEFAULT_WORDLIST,
+        "ports": ports,
+        "port_concurrency": concurrency,
+        "path_concurrency": path_concurrency,
+        "fingerprint": fingerprint,
+        "assess": assess,
+    })
+    if not checkpoint.acquire_lock():
+        # ไม่ควรเกิดกับไฟล์ผลใหม่ (ชื่อสุ่ม) แต่ถ้าเกิดจะไม่รัน scan โดยไม่ถือ lock
+        new_scan.status = 3
         new_scan.completed_at = datetime.utcnow()
         db.session.commit()
+        current_app.logger.error(f"Cannot lock checkpoint for new network scan {new_scan.id}")
+        return jsonify({"ok": False, "error": "Cannot lock scan checkpoint", "scan_id": new_scan.id}), 409
+    checkpoint.save()
+    _start_scan_job(current_app._get_current_object(), new_scan.id, ranges, wordlist, result_filepath, checkpoint)
 
-        return jsonify({
-            "ok": True,
-            "found_hosts": found_hosts,
-            "count": len(found_hosts),
-            "scan_id": new_scan.id,
-            "message": "Scan completed successfully."
-        })
+    return jsonify({
+        "ok": True,
+        "scan_id": new_scan.id,
+        "total_hosts": total_hosts,
+        "status": new_scan.STATUS_MAP.get(new_scan.status),
+        "fingerprint": fingerprint,
+        "assess": assess,
+        "message": "Scan started."
+    }), 202
 
-    except Exception as e:
-        db.session.rollback() # Rollback transaction on error
-        new_scan.status = 3
-        new_scan.completed_at = datetime.utcnow()
-        db.session.add(new_scan)
-        db.session.commit()
-        current_app.logger.error(f"Error during network scan for id {new_scan.id}: {e}")
-        return jsonify({"ok": False, "error": "An internal error occurred during the scan."}), 500
\ No newline at end of file
+
+@bp.route("/wordlists", methods=["GET"])
+@jwt_required(locations=["cookies", "headers"])
+@admin_required
+def list_wordlists():
+    """รายชื่อ wordlist ที่เลือกใช้ได้ (ไฟล์ .txt ใน wordlists/) พร้อมจำนวน path หลังตัดซ้ำ"""
+    items = []
+    for name in wordlists.list_wordlists():
+        try:
+            items.append({"name": name, "paths": len(wordlists.load_wordlist(name))})
+        except (OSError, ValueError) as e:
+            current_app.logger.warning(f"Cannot load wordlist {name}: {e}")
+    return jsonify({"ok": True, "default": wordlists.DEFAULT_WORDLIST, "wordlists": items})
+
+
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("NETWORK_SCAN_PROGRESS_INTERVAL", 2))
+
+def _start_scan_job(app, scan_id, ranges, wordlist, result_filepath, checkpoint):
+    params = checkpoint.params
+    job = threading.Thread(
+        target=_run_scan_job,
+        args=(app, scan_id, ranges, wordlist,
+              params["port_concurrency"], params["path_concurrency"],
+              [tuple(p) for p in params["ports"]], result_filepath,
+              params.get("fingerprint", False), params.get("assess", False), checkpoint),
+        name=f"network-scan-{scan_id}",
+        daemon=True,
+    )
+    job.start()
+    return job
+
+def _run_scan_job(app, scan_id, ranges, wordlist, port_concurrency, path_concurrency, ports, result_filepath,
+                  fingerprint=False, assess=False, checkpoint=None):
+    """
+    รัน network scan ใน background thread: เขียน host ที่พบลงไฟล์ทันที และอัปเดต progress ลง DB เป็นระยะ
+    assess=True: web root ของแต่ละ host ถูกส่งเข้า AssessmentJob ทันทีที่ host นั้นสแกนเสร็จ
+    checkpoint: บันทึก host ที่เสร็จแล้วทุกครั้งที่ flush progress ถ้า checkpoint มีงานเดิมอยู่จะสแกนต่อจากจุดนั้น
+    """
+    with app.app_context():
+        if checkpoint is None:
+            checkpoint = ScanCheckpoint(checkpoint_path(result_filepath), {})
+            if not checkpoint.acquire_lock():
+                # process อื่นกำลังรัน scan นี้อยู่ → ไม่รันซ้ำ และไม่แตะสถานะใน DB
+                app.logger.warning(f"Network scan {scan_id} is locked by another process; not starting it here")
+                db.session.remove()
+                return
+        scan = db.session.get(NetworkScan, scan_id)
+        assessment = AssessmentJob(app, scan_id, scan.user_id,
+                                   status_path=assessment_path(result_filepath)).start() if assess else None
+
+        writer = None
+
+        def flush_progress():
+            scan.scanned_hosts = checkpoint.scanned
+            scan.found_hosts_count = writer.summary["count"]
+            db.session.commit()
+            writer.write_index()
+            checkpoint.save()
+
+        try:
+            with scan_results.ResultWriter(result_filepath) as writer:
+                # host ที่อยู่ในไฟล์ผลแล้ว (เขียนหลัง checkpoint ล่าสุดก่อน process ตาย) ไม่ต้องสแกนซ้ำ
+                written = {h["host"] for h in scan_results.read_hosts(result_filepath)} if writer.summary["count"] else ()
+                hosts = checkpoint.iter_hosts(iter_ip_ranges(skip_ip_ranges(ranges, checkpoint.watermark)), written)
+
+                def on_host(result):
+                    writer.append(result)
+                    if assessment is not None:
+                        assessment.submit(web_roots(result))
+
+                async def run_scan():
+                    scan_task = asyncio.create_task(run_scan_pipeline(
+                        ranges, wordlist,
+                        port_concurrency=port_concurrency, path_concurrency=path_concurrency,
+                        on_host=on_host, on_scanned=checkpoint.mark_done, ports=ports, fingerprint=fingerprint,
+                        hosts=hosts,
+                    ))
+                    while not scan_task.done():
+                        await asyncio.wait({scan_task}, timeout=PROGRESS_FLUSH_INTERVAL)
+                        flush_progress()
+                    return scan_task.result()
+
+                asyncio.run(run_scan())
+
+            flush_progress()
+            scan.status = 2
+            scan.completed_at = datetime.utcnow()
+            db.session.commit()
+            checkpoint.remove()
+
+        except Exception as e:
+            db.session.rollback() # Rollback transaction on error
+            scan = db.session.get(NetworkScan, scan_id)
+            scan.status = 3
+            scan.scanned_hosts = checkpoint.scanned
+            if writer is not None:
+                scan.found_hosts_count = writer.summary["count"]
+                checkpoint.save()
+            scan.completed_at = datetime.utcnow()
+            db.session.commit()
+            app.logger.error(f"Error during network scan for id {scan_id}: {e}")
+        finally:
+            checkpoint.release_lock()
+            if assessment is not None:
+                assessment.close()
+            db.session.remove()
+
+
+def _resume_scan(app, scan, checkpoint):
+    """เริ่ม scan ต่อจาก checkpoint (ต้องถือ lock ของ checkpoint อยู่แล้ว)"""
+    ranges = parse_ip_ranges(scan.ip_range)
+    wordlist = wordlists.load_wordlist(checkpoint.params.get("wordlist") or wordlists.DEFAULT_WORDLIST)
+    scan.status = 1
+    scan.completed_at = None
+    db.session.commit()
+    return _start_scan_job(app, scan.id, ranges, wordlist, scan_results.scan_result_abspath(scan.result_json_path), checkpoint)
+
+
+@bp.route("/scans/<int:scan_id>/resume", methods=["POST"])
+@jwt_required(locations=["cookies", "headers"])
+@admin_required
+def resume_scan(scan_id):
+    """สแกนต่อจาก checkpoint ของ scan ที่ล้มเหลว/ค้าง (host ที่เสร็จแล้วจะไม่ถูกสแกนซ้ำ)"""
+    scan = db.session.get(NetworkScan, scan_id)
+    if not scan:
+        return jsonify({"ok": False, "error": "Scan not found"}), 404
+    if scan.status == 2:
+        return jsonify({"ok": False, "error": "Scan already completed"}), 400
+    if not scan.result_json_path or not scan.result_json_path.endswith('.ndjson'):
+        return jsonify({"ok": False, "error": "Scan has no checkpoint"}), 400
+
+    checkpoint = ScanCheckpoint.load(checkpoint_path(scan_results.scan_result_abspath(scan.result_json_path)))
+    if checkpoint is None:
+        return jsonify({"ok": False, "error": "Scan has no checkpoint"}), 400
+    if not checkpoint.acquire_lock():
+        return jsonify({"ok": False, "error": "Scan is still running"}), 409
+
+    try:
+        _resume_scan(current_app._get_current_object(), scan, checkpoint)
+    except (ValueError, FileNotFoundError) as e:
+        checkpoint.release_lock()
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    return jsonify({"ok": True, "scan": scan.to_dict(), "resumed_from": checkpoint.scanned}), 202
+
+
+def recover_stale_scans(app, mode=None):
+    """
+    เรียกตอน server start (manage.py) หรือผ่าน `flask recover-scans`: หา scan ที่ค้าง status=1
+    แต่ไม่มี process ไหนถือ lock อยู่ (process เดิมตายไปแล้ว)
+    mode (NETWORK_SCAN_RECOVERY): "resume" = สแกนต่อจาก checkpoint (ไม่มี checkpoint → Error),
+    "fail" = ปิดเป็น Error ทั้งหมด (resume เองได้ภายหลังผ่าน /scans/<id>/resume), "off" = ไม่ทำอะไร
+    คืนค่า list ของ thread ของ scan ที่ resume (scan รันใน daemon thread จึงต้องเรียกใน process ที่อยู่ต่อ เช่น server)
+    """
+    jobs = []
+    mode = (mode or os.getenv("NETWORK_SCAN_RECOVERY", "resume")).lower()
+    if mode == "off":
+        return jobs
+    with app.app_context():
+        try:
+            stale = NetworkScan.query.filter_by(status=1).all()
+        except SQLAlchemyError as e:
+            app.logger.warning(f"Cannot check for stale network scans: {e}")
+            db.session.rollback()
+            return jobs
+
+        for scan in stale:
+            checkpoint = None
+            if scan.result_json_path and scan.result_json_path.endswith('.ndjson'):
+                checkpoint = ScanCheckpoint.load(checkpoint_path(scan_results.scan_result_abspath(scan.result_json_path)))
+            if checkpoint is not None and not checkpoint.acquire_lock():
+                continue  # ยังรันอยู่ใน process อื่น
+
+            if mode == "resume" and checkpoint is not None:
+                try:
+                    jobs.append(_resume_scan(app, scan, checkpoint))
+                    app.logger.info(f"Resumed network scan {scan.id} from host #{checkpoint.scanned}")
+                    continue
+                except Exception as e:
+                    app.logger.error(f"Cannot resume network scan {scan.id}: {e}")
+
+            if checkpoint is not None:
+                checkpoint.release_lock()
+            scan.status = 3
+            scan.completed_at = datetime.utcnow()
+            db.session.commit()
+            app.logger.warning(f"Network scan {scan.id} was left running by a dead process; marked as Error")
+    return jobs
+
+
+@bp.route("/scans/<int:scan_id>", methods=["GET"])
+@jwt_required(locations=["cookies", "headers"])
+@admin_required
+def scan_progress(scan_id):
+    """
+    สถานะ/progress ของ scan พร้อม host ที่พบตั้งแต่ลำดับที่ ?since=N (ใช้ poll ระหว่างสแกน)
+    คืน host ไม่เกิน ?limit= ต่อครั้ง (อ่านแบบ seek ผ่าน index เหมือนหน้าผลลัพธ์) has_more=true → poll ต่อทันทีด้วย next_since
+    """
+    scan = db.session.get(NetworkScan, scan_id)
+    if not scan:
+        return jsonify({"ok": False, "error": "Scan not found"}), 404
+
+    since = max(0, request.args.get("since", 0, type=int))
+    limit = min(max(1, request.args.get("limit", scan_results.RESULT_PAGE_SIZE, type=int)), scan_results.RESULT_PAGE_SIZE_MAX)
+    found_hosts = []
+    status_path = None
+    if scan.result_json_path and scan.result_json_path.endswith('.ndjson'):
+        result_path = scan_results.scan_result_abspath(scan.result_json_path)
+        status_path = assessment_path(result_path)
+        # ขอเกิน 1 รายการเพื่อรู้ว่ายังมีหน้าถัดไปหรือไม่
+        found_hosts = scan_results.read_hosts(result_path, offset=since, limit=limit + 1)
+    has_more = len(found_hosts) > limit
+    found_hosts = found_hosts[:limit]
+
+    return jsonify({
+        "ok": True,
+        "scan": scan.to_dict(),
+        "since": since,
+        "next_since": since + len(found_hosts),
+        "has_more": has_more,
+        "found_hosts": found_hosts,
+        "assessment": get_assessment(scan_id, status_path),
+    })
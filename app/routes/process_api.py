@@ -1,13 +1,15 @@
 # app/routes/process_api.py
-from flask import Blueprint, jsonify, send_file, current_app
+from flask import Blueprint, jsonify, send_file, current_app, request, Response, stream_with_context, stream_template
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import os
 import json
+import datetime
 from app.extensions import db
 from app.models.api_process import ApiProcess
 from app.models.user import User
 from app.models.network_scan import NetworkScan
 from app.utils.decorators import admin_required
+from app.utils import scan_results, pdf_jobs, report_formats, report_links
 
 bp = Blueprint("api_process", __name__)
 
@@ -118,6 +120,8 @@ def get_all_processes():
 def download_process_pdf(process_id):
     """
     Endpoint สำหรับดาวน์โหลดไฟล์ Report ฉบับ PDF
+    PDF ถูก render ใน background: ระหว่างที่ยังไม่เสร็จจะตอบ 202 {"status": "pending"}
+    ?status=1 → ตอบเฉพาะสถานะ (pending / ready / failed) ไม่ส่งไฟล์
     """
     try:
         current_user_id = get_jwt_identity()
@@ -135,21 +139,108 @@ def download_process_pdf(process_id):
         if not process.result_pdf:
             return jsonify({"ok": False, "error": "PDF report not available for this process"}), 404
         
+        status, error = pdf_jobs.pdf_status(process.result_pdf)
+        if status == "pending":
+            return jsonify({"ok": True, "status": "pending"}), 202
+        if status == "failed":
+            return jsonify({"ok": False, "status": "failed", "error": error}), 500
+        if status == "missing":
+            current_app.logger.error(f"PDF file not found for process {process_id}: {process.result_pdf}")
+            return jsonify({"ok": False, "status": "missing", "error": "PDF file not found on server"}), 404
+        if request.args.get("status"):
+            return jsonify({"ok": True, "status": "ready"}), 200
+
         # สร้าง Path เต็มไปยังไฟล์ PDF
         absolute_path = os.path.join(current_app.root_path, 'static', process.result_pdf)
 
-        if not os.path.exists(absolute_path):
-            current_app.logger.error(f"PDF file not found at path: {absolute_path}")
-            return jsonify({"ok": False, "error": "PDF file not found on server"}), 404
-            
         # ✅ ใช้ send_file เพื่อส่งไฟล์ให้ผู้ใช้ดาวน์โหลด
-        return send_file(absolute_path, as_attachment=True)
+        return send_file(absolute_path, as_attachment=True,
+                         download_name=f"sqlmap_report_{process.id}.pdf")
 
     except Exception as e:
         current_app.logger.error(f"Error downloading PDF for process id {process_id}: {e}")
         return jsonify({"ok": False, "error": "An internal error occurred while processing the PDF download."}), 500
 # --- CHANGE END ---
 
+@bp.route("/api/reports/download/<token>", methods=["GET"])
+def download_report_link(token):
+    """
+    ลิงก์ดาวน์โหลด PDF จากอีเมล (ไม่ต้อง login: token ลงชื่อและหมดอายุเอง ดู report_links)
+    ส่งด้วย send_file แบบ conditional → รองรับ ETag / If-Modified-Since (304) และ Range (206) สำหรับดาวน์โหลดต่อ
+    """
+    payload, error = report_links.load_download_token(token)
+    if error == "expired":
+        return jsonify({"ok": False, "error": "Download link has expired"}), 410
+    if error:
+        return jsonify({"ok": False, "error": "Invalid download link"}), 404
+
+    process = ApiProcess.query.get(payload.get("p"))
+    # PDF ถูก render ใหม่ (path เปลี่ยน) หรือ process ถูกลบ → ลิงก์เดิมใช้ไม่ได้
+    if not process or not process.result_pdf or process.result_pdf != payload.get("f"):
+        return jsonify({"ok": False, "error": "Report no longer available"}), 404
+    absolute_path = os.path.join(current_app.root_path, 'static', process.result_pdf)
+    if not os.path.exists(absolute_path):
+        return jsonify({"ok": False, "error": "PDF file not found on server"}), 404
+
+    response = send_file(absolute_path, mimetype='application/pdf', as_attachment=True,
+                         download_name=f"sqlmap_report_{process.id}.pdf", conditional=True,
+                         max_age=report_links.REPORT_LINK_TTL)
+    # URL มี token อยู่ในตัว: ให้ cache ได้เฉพาะที่ browser ของผู้รับ
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+@bp.route("/api/processes/<int:process_id>/export/<fmt>", methods=["GET"])
+@jwt_required(locations=["cookies"])
+def export_process_report(process_id, fmt):
+    """
+    ส่งออกผลของ process เป็น report แบบเบา (ไม่ต้องรอ render PDF): html | csv | sarif
+    เนื้อหาถูก stream ทีละส่วนจากไฟล์ผล JSON ที่เก็บไว้
+    ?download=1 → ให้ HTML เป็นไฟล์แนบ (csv/sarif เป็นไฟล์แนบเสมอ)
+    """
+    if fmt not in report_formats.EXPORT_FORMATS:
+        return jsonify({"ok": False, "error": f"Unsupported format (use one of {', '.join(report_formats.EXPORT_FORMATS)})"}), 400
+    try:
+        current_user_id = get_jwt_identity()
+        user = User.query.get(current_user_id)
+
+        process = ApiProcess.query.get(process_id)
+        if not process:
+            return jsonify({"ok": False, "error": "Process not found"}), 404
+        if str(process.user_id) != str(current_user_id) and not (user and user.is_admin):
+            return jsonify({"ok": False, "error": "Access denied"}), 403
+        if not process.result_json:
+            return jsonify({"ok": False, "error": "Result file not available for this process"}), 404
+
+        absolute_path = os.path.join(current_app.root_path, 'static', process.result_json)
+        if not os.path.exists(absolute_path):
+            current_app.logger.error(f"Result file not found for process {process_id}: {process.result_json}")
+            return jsonify({"ok": False, "error": "Result file not found on server"}), 404
+        with open(absolute_path, 'r', encoding='utf-8') as f:
+            results = json.load(f)
+        if not isinstance(results, list):
+            return jsonify({"ok": False, "error": "Result file is not a list of scan results"}), 422
+    except Exception as e:
+        current_app.logger.error(f"Error exporting process {process_id} as {fmt}: {e}")
+        return jsonify({"ok": False, "error": "An internal error occurred while exporting the report."}), 500
+
+    mimetype, extension = report_formats.EXPORT_FORMATS[fmt]
+    if fmt == "html":
+        body = stream_template(
+            "reports/sqlmap_report.html", process=process, results=results,
+            summary=report_formats.summarize(results),
+            generated_at=f"{datetime.datetime.now():%d/%m/%Y %H:%M}",
+        )
+    elif fmt == "csv":
+        body = stream_with_context(report_formats.iter_csv(results))
+    else:
+        body = stream_with_context(report_formats.iter_sarif(results))
+
+    response = Response(body, mimetype=mimetype)
+    disposition = "inline" if fmt == "html" and not request.args.get("download") else "attachment"
+    response.headers["Content-Disposition"] = f'{disposition}; filename="sqlmap_report_{process.id}.{extension}"'
+    return response
+
 # --- Network Scan Routes ---
 
 @bp.route("/api/network-scans/all", methods=["GET"])
@@ -162,6 +253,7 @@ def get_all_scans():
         current_app.logger.error(f"Error fetching all network scans: {e}")
         return jsonify({"ok": False, "error": "Internal server error"}), 500
 
+
 @bp.route("/api/network-scans/results/<int:scan_id>", methods=["GET"])
 @jwt_required(locations=["cookies"])
 def get_scan_result(scan_id):
@@ -193,7 +285,39 @@ def get_scan_result(scan_id):
             # Loggin จะแสดงพาธเต็มที่มันพยายามหา เพื่อให้ดีบักได้ง่ายขึ้น
             current_app.logger.error(f"Result file not found at path: {absolute_path}")
             return jsonify({"ok": False, "error": "Result file not found on server"}), 404
-            
+
+        # scan แบบใหม่เขียนผลเป็น NDJSON (1 host ต่อบรรทัด)
+        #   ?format=ndjson → ส่งไฟล์ดิบ (ดาวน์โหลด)
+        #   ปกติ → summary + host ทีละหน้า (?offset=&limit=) กรองด้วย ?host= (IP, CIDR หรือข้อความบางส่วน)
+        if scan.result_json_path.endswith('.ndjson'):
+            if request.args.get("format") == "ndjson":
+                return send_file(absolute_path, mimetype='application/x-ndjson', as_attachment=True,
+                                 download_name=f"network_scan_{scan.id}.ndjson")
+
+            offset = max(0, request.args.get("offset", 0, type=int))
+            limit = min(max(1, request.args.get("limit", scan_results.RESULT_PAGE_SIZE, type=int)), scan_results.RESULT_PAGE_SIZE_MAX)
+            host_filter = (request.args.get("host") or "").strip() or None
+
+            summary = scan_results.read_summary(absolute_path)
+            # ขอเกิน 1 รายการเพื่อรู้ว่ายังมีหน้าถัดไปหรือไม่
+            found_hosts = scan_results.read_hosts(absolute_path, offset=offset, limit=limit + 1, host=host_filter)
+            has_more = len(found_hosts) > limit
+            found_hosts = found_hosts[:limit]
+            return jsonify({
+                "scan_id": scan.id,
+                "ip_range": scan.ip_range,
+                "status": scan.STATUS_MAP.get(scan.status, 'unknown'),
+                "summary": {k: summary[k] for k in ("count", "open_ports", "found_paths", "catch_all", "tech")},
+                "total": summary["count"],
+                "host": host_filter,
+                "offset": offset,
+                "limit": limit,
+                "next_offset": offset + len(found_hosts) if has_more else None,
+                "found_hosts": found_hosts,
+                "count": len(found_hosts)
+            }), 200
+
+
         return send_file(absolute_path, mimetype='application/json', as_attachment=False)
 
     except Exception as e:
@@ -16,7 +16,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.config import get_python_path, get_sqlmap_path
 from app.extensions import db
 from app.models.api_process import ApiProcess
-from app.utils.pdf_generator import generate_sqlmap_pdf_report
+from app.utils.pdf_jobs import PDF_LAYOUT_CHOICES, request_pdf
 
 bp = Blueprint("sqlmap_api", __name__)
 
@@ -306,6 +306,10 @@ def run_sqlmap():
         elif body and isinstance(body[0], dict) and body[0].get("createPdf"):
             create_pdf = True
 
+        pdf_layout = request.args.get("pdfLayout") or (body[0].get("pdfLayout") if body and isinstance(body[0], dict) else None)
+        if pdf_layout is not None and str(pdf_layout).lower() not in PDF_LAYOUT_CHOICES:
+            return {"ok": False, "error": f"Invalid 'pdfLayout' (must be one of {', '.join(PDF_LAYOUT_CHOICES)})."}, 400
+
         try:
             requested_max_concurrency = body[0].get("maxConcurrency") if body and isinstance(body[0], dict) else None
             max_concurrency = int(request.args.get("maxConcurrency") or requested_max_concurrency or DEFAULT_MAX_CONCURRENCY)
@@ -357,12 +361,8 @@ def run_sqlmap():
 
             if create_pdf:
                 try:
-                    pdf_dir = os.path.join(base_reports_dir, 'pdf')
-                    pdf_filename = f"sqlmap_report_{process.id}_{uuid.uuid4().hex}.pdf"
-                    
-                    generate_sqlmap_pdf_report(results_sorted, output_dir=pdf_dir, output_filename=pdf_filename)
-                    
-                    process.result_pdf = os.path.join('reports', 'sqlmap_basic', 'pdf', pdf_filename).replace('\\', '/')
+                    # render ใน background worker (ไฟล์เดิมถ้าผลชุดนี้เคย render แล้ว)
+                    process.result_pdf, response["reportPdfStatus"] = request_pdf(results_sorted, {"layout": pdf_layout})
                     response["reportPdf"] = process.result_pdf
                 except Exception as e:
                     current_app.logger.error(f"PDF generation failed for process {process.id}: {e}")
@@ -418,12 +418,7 @@ def run_sqlmap():
 
         if create_pdf_single:
             try:
-                pdf_dir = os.path.join(base_reports_dir, 'pdf')
-                pdf_filename = f"sqlmap_report_{process.id}_{uuid.uuid4().hex}.pdf"
-                
-                generate_sqlmap_pdf_report(wrapped_result, output_dir=pdf_dir, output_filename=pdf_filename)
-                
-                process.result_pdf = os.path.join('reports', 'sqlmap_basic', 'pdf', pdf_filename).replace('\\', '/')
+                process.result_pdf, result["reportPdfStatus"] = request_pdf(wrapped_result)
                 result["reportPdf"] = process.result_pdf
             except Exception as e:
                 current_app.logger.error(f"Single PDF generation failed for process {process.id}: {e}")
@@ -74,6 +74,14 @@ const DashboardCommon = {
         return '';
     },
 
+    // ปุ่มส่งออก report แบบเบา (HTML / CSV / SARIF) จากไฟล์ผล JSON
+    exportButtons(processId, hasJson) {
+        if (!hasJson) return '';
+        return ['html', 'csv', 'sarif'].map(fmt =>
+            `<a href="/api/processes/${processId}/export/${fmt}" class="btn btn-sm btn-outline-secondary" target="_blank" title="Export ${fmt.toUpperCase()}">${fmt.toUpperCase()}</a>`
+        ).join(' ');
+    },
+
 
     // โหลดข้อมูลจาก API
     async fetchData(endpoint, onSuccess, onError) {
@@ -0,0 +1,206 @@
+# app/utils/assessment.py
+import os
+import json
+import uuid
+import queue
+import asyncio
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.extensions import db
+from app.models.api_process import ApiProcess
+from app.utils.crawl import crawl_async, dedupe_targets
+from app.utils.sqlmap_runner import run_sqlmap_targets
+
+# ส่งต่อ web root ที่ network scan พบ → crawl หา target ที่มี parameter → รัน sqlmap
+# ทำงานใน background thread ของตัวเอง (1 thread ต่อ network scan) รับ web root ผ่าน queue
+# ระหว่างที่ network scan ยังรันอยู่ เมื่อเสร็จจะบันทึกผลเป็น ApiProcess แบบเดียวกับ /api/run-sqlmap-urls
+
+ASSESS_MAX_PAGES = int(os.getenv("NETWORK_ASSESS_MAX_PAGES", 50))
+ASSESS_CRAWL_CONCURRENCY = int(os.getenv("NETWORK_ASSESS_CRAWL_CONCURRENCY", 10))
+ASSESS_SQLMAP_CONCURRENCY = int(os.getenv("NETWORK_ASSESS_SQLMAP_CONCURRENCY", 3))
+# job ที่จบแล้วอยู่ในหน่วยความจำไม่เกิน TTL (วินาที) และไม่เกินจำนวนนี้ หลังจากนั้นสถานะอ่านจากไฟล์ (ดู assessment_path)
+ASSESS_JOB_TTL = int(os.getenv("NETWORK_ASSESS_JOB_TTL", 3600))
+ASSESS_MAX_FINISHED_JOBS = int(os.getenv("NETWORK_ASSESS_MAX_FINISHED_JOBS", 20))
+
+_STOP = object()
+
+# scan_id → AssessmentJob (อยู่ในหน่วยความจำของ process เท่านั้น)
+_JOBS: Dict[int, "AssessmentJob"] = {}
+_JOBS_LOCK = threading.Lock()
+
+
+def assessment_path(result_abs_path: str) -> str:
+    """สถานะสุดท้ายของ assessment เก็บข้างไฟล์ผลของ network scan (<name>.assessment.json)"""
+    base = result_abs_path[:-len('.ndjson')] if result_abs_path.endswith('.ndjson') else result_abs_path
+    return f"{base}.assessment.json"
+
+
+def _evict_finished_jobs() -> None:
+    """เอา job ที่จบแล้วเกิน ASSESS_JOB_TTL ออก และเก็บ job ที่จบแล้วไว้ไม่เกิน ASSESS_MAX_FINISHED_JOBS ตัว"""
+    now = time.monotonic()
+    with _JOBS_LOCK:
+        finished = sorted(
+            (job.finished_at, scan_id) for scan_id, job in _JOBS.items() if job.finished_at is not None
+        )
+        excess = len(finished) - ASSESS_MAX_FINISHED_JOBS
+        for idx, (finished_at, scan_id) in enumerate(finished):
+            if idx < excess or now - finished_at > ASSESS_JOB_TTL:
+                del _JOBS[scan_id]
+
+
+class AssessmentJob:
+    def __init__(self, app, scan_id: int, user_id: int, max_pages: int = ASSESS_MAX_PAGES,
+                 status_path: Optional[str] = None):
+        self.app = app
+        self.scan_id = scan_id
+        self.user_id = user_id
+        self.max_pages = max_pages
+        self.status_path = status_path
+        self.finished_at: Optional[float] = None
+        self.queue: "queue.Queue[Any]" = queue.Queue()
+        self.seen_roots = set()
+        self.status: Dict[str, Any] = {
+            "state": "running",
+            "roots_queued": 0,
+            "roots_done": 0,
+            "roots_failed": 0,
+            "targets": 0,
+            "sqlmap_runs": 0,
+            "vulnerable": 0,
+            "process_id": None,
+            "error": None,
+            # สรุปต่อ web root: pages / targets / fetch_errors / error (crawl ไม่ได้เลย ≠ เว็บที่ไม่มี target)
+            "roots": [],
+        }
+        # ผล sqlmap เต็ม (รวม stdout) เก็บไว้จนกว่า _save จะเขียนลงไฟล์ของ ApiProcess แล้วทิ้ง
+        self.results: List[Dict[str, Any]] = []
+        self.thread = threading.Thread(target=self._run, name=f"network-assess-{scan_id}", daemon=True)
+
+    def start(self) -> "AssessmentJob":
+        _evict_finished_jobs()
+        with _JOBS_LOCK:
+            _JOBS[self.scan_id] = self
+        self.thread.start()
+        return self
+
+    def submit(self, roots: List[str]) -> None:
+        for root in roots:
+            if root not in self.seen_roots:
+                self.seen_roots.add(root)
+                self.status["roots_queued"] += 1
+                self.queue.put(root)
+
+    def close(self) -> None:
+        """ไม่มี web root เพิ่มแล้ว: thread จะทำงานที่ค้างให้หมดแล้วบันทึกผล"""
+        self.queue.put(_STOP)
+
+    def _assess_root(self, root: str, summary: Dict[str, Any]) -> None:
+        # web root มาจาก network scan ซึ่งส่วนใหญ่เป็น host ภายในที่ใช้ self-signed cert → ไม่ตรวจ cert
+        stats: Dict[str, Any] = {}
+        urls, targets = asyncio.run(
+            crawl_async(root, max_pages=self.max_pages, concurrency=ASSESS_CRAWL_CONCURRENCY,
+                        stats=stats, verify_ssl=False)
+        )
+        summary["pages"] = len(urls)
+        summary["fetch_errors"] = stats.get("errors", 0)
+        if not urls and stats.get("errors"):
+            summary["error"] = stats.get("last_error")
+            return
+        targets = dedupe_targets(targets)
+        summary["targets"] = len(targets)
+        self.status["targets"] += len(targets)
+        if not targets:
+            return
+        results, _ = run_sqlmap_targets(targets, min(len(targets), ASSESS_SQLMAP_CONCURRENCY))
+        for entry in results:
+            entry["root"] = root
+            entry["index"] = len(self.results)
+            self.results.append(entry)
+            self.status["sqlmap_runs"] += 1
+            if entry.get("parametersRaw"):
+                self.status["vulnerable"] += 1
+
+    def _save(self) -> None:
+        all_ok = all(r.get("ok", False) for r in self.results)
+        process = ApiProcess(
+            user_id=self.user_id,
+            endpoint="/api/network/scan-range",
+            payload_count=len(self.results),
+            status_ok=all_ok,
+        )
+        db.session.add(process)
+        db.session.commit()
+
+        json_dir = os.path.join(self.app.static_folder, 'reports', 'sqlmap_urls', 'json')
+        os.makedirs(json_dir, exist_ok=True)
+        json_filename = f"sqlmap_urls_results_{process.id}_{uuid.uuid4().hex}.json"
+        with open(os.path.join(json_dir, json_filename), 'w', encoding='utf-8') as f:
+            json.dump(self.results, f, ensure_ascii=False, indent=4)
+        process.result_json = os.path.join('reports', 'sqlmap_urls', 'json', json_filename).replace('\\', '/')
+        db.session.commit()
+        self.status["process_id"] = process.id
+
+    def _persist_status(self) -> None:
+        if not self.status_path:
+            return
+        tmp_path = f"{self.status_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.status, f, ensure_ascii=False)
+        os.replace(tmp_path, self.status_path)
+
+    def _run(self) -> None:
+        with self.app.app_context():
+            try:
+                while True:
+                    root = self.queue.get()
+                    if root is _STOP:
+                        break
+                    summary = {"root": root, "pages": 0, "targets": 0, "fetch_errors": 0, "error": None}
+                    try:
+                        self._assess_root(root, summary)
+                    except Exception as e:
+                        summary["error"] = str(e)
+                    if summary["error"]:
+                        self.status["roots_failed"] += 1
+                        self.app.logger.warning(f"Assessment of {root} (scan {self.scan_id}) failed: {summary['error']}")
+                    self.status["roots"].append(summary)
+                    self.status["roots_done"] += 1
+
+                if self.results:
+                    self._save()
+                self.status["state"] = "done"
+            except Exception as e:
+                db.session.rollback()
+                self.status["state"] = "error"
+                self.status["error"] = str(e)
+                self.app.logger.error(f"Assessment for network scan {self.scan_id} failed: {e}")
+            finally:
+                self.results = []
+                self.status["finished_at"] = datetime.utcnow().isoformat()
+                try:
+                    self._persist_status()
+                except OSError as e:
+                    self.app.logger.error(f"Cannot write assessment status for scan {self.scan_id}: {e}")
+                self.finished_at = time.monotonic()
+                db.session.remove()
+        _evict_finished_jobs()
+
+
+def get_assessment(scan_id: int, status_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """สถานะของ job ที่ยังอยู่ในหน่วยความจำ ถ้าถูก evict ไปแล้ว (หรือ process restart) อ่านจาก status_path"""
+    with _JOBS_LOCK:
+        job = _JOBS.get(scan_id)
+    if job:
+        status = dict(job.status)
+        status["roots"] = list(status["roots"])
+        return status
+    if status_path and os.path.exists(status_path):
+        try:
+            with open(status_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    return None
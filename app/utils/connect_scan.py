@@ -0,0 +1,120 @@
+# app/utils/connect_scan.py
+import asyncio
+import errno
+import socket
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# TCP connect scan แบบ batch: เปิด socket แบบ non-blocking ทีละชุด, ลงทะเบียนกับ event loop
+# ด้วย add_writer แล้วรอทั้งชุดด้วย timeout เดียว (ไม่สร้าง StreamReader/Writer และ wait_for ต่อพอร์ต)
+# ทำให้ probe ได้หลักพันครั้งต่อวินาทีบน core เดียว
+
+DEFAULT_TIMEOUT = 0.5
+MIN_TIMEOUT = 0.15
+
+# connect_ex คืนค่าเหล่านี้เมื่อ connect กำลังดำเนินการ (10035 = WSAEWOULDBLOCK บน Windows)
+_IN_PROGRESS = {0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY, 10035}
+
+Probe = Tuple[str, int]
+
+
+class RttEstimator:
+    """
+    ประมาณ timeout จาก RTT ของ connect ที่สำเร็จ (แบบ TCP RTO: srtt + 4 * rttvar)
+    ก่อนมีตัวอย่างจะใช้ initial timeout และไม่เกิน max_timeout
+    """
+
+    def __init__(self, initial_timeout: float = DEFAULT_TIMEOUT, max_timeout: Optional[float] = None,
+                 min_timeout: float = MIN_TIMEOUT):
+        self.initial_timeout = initial_timeout
+        self.max_timeout = max_timeout or initial_timeout
+        self.min_timeout = min_timeout
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+
+    def update(self, rtt: float) -> None:
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+    def timeout(self) -> float:
+        if self.srtt is None:
+            return self.initial_timeout
+        return max(self.min_timeout, min(self.max_timeout, self.srtt + 4 * self.rttvar))
+
+
+def _on_writable(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(time.monotonic())
+
+
+async def _fallback_probe(host: str, port: int, timeout: float) -> Optional[float]:
+    """ใช้เมื่อ event loop ไม่รองรับ add_writer (เช่น Proactor บน Windows)"""
+    start = time.monotonic()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=timeout)
+        writer.close()
+        await writer.wait_closed()
+        return time.monotonic() - start
+    except (asyncio.TimeoutError, OSError):
+        return None
+
+
+async def connect_batch(probes: Iterable[Probe], timeout: float) -> Dict[Probe, Optional[float]]:
+    """
+    ลอง TCP connect ทุก (host, port) ใน probes พร้อมกัน
+    คืนค่า dict (host, port) → RTT (วินาที) ถ้าพอร์ตเปิด หรือ None ถ้าปิด/timeout
+    """
+    loop = asyncio.get_running_loop()
+    results: Dict[Probe, Optional[float]] = {}
+    pending = {}
+    fallback: List[Probe] = []
+
+    for host, port in probes:
+        family = socket.AF_INET6 if ':' in host else socket.AF_INET
+        try:
+            sock = socket.socket(family, socket.SOCK_STREAM)
+        except OSError:
+            results[(host, port)] = None
+            continue
+        sock.setblocking(False)
+        start = time.monotonic()
+        try:
+            err = sock.connect_ex((host, port))
+        except OSError:
+            err = -1
+        if err not in _IN_PROGRESS:
+            sock.close()
+            results[(host, port)] = None
+            continue
+
+        fut = loop.create_future()
+        try:
+            loop.add_writer(sock.fileno(), _on_writable, fut)
+        except NotImplementedError:
+            sock.close()
+            fallback.append((host, port))
+            continue
+        pending[fut] = (sock, (host, port), start)
+
+    if pending:
+        await asyncio.wait(pending.keys(), timeout=timeout)
+
+    for fut, (sock, probe, start) in pending.items():
+        loop.remove_writer(sock.fileno())
+        rtt = None
+        if fut.done() and sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+            rtt = fut.result() - start
+        else:
+            fut.cancel()
+        sock.close()
+        results[probe] = rtt
+
+    if fallback:
+        rtts = await asyncio.gather(*(_fallback_probe(h, p, timeout) for h, p in fallback))
+        results.update(zip(fallback, rtts))
+
+    return results
@@ -0,0 +1,462 @@
+# app/utils/crawl.py
+import asyncio
+import datetime
+import html as html_lib
+import os
+import re
+from collections import Counter
+from urllib.parse import urlparse, urljoin, parse_qsl, urlencode, urlunparse
+
+import aiohttp
+from bs4 import BeautifulSoup
+from yarl import URL
+
+from app.utils import crawl_store
+
+# แกนของ crawler (ดึงหน้าเว็บ, หา link / target ที่มี parameter, sitemap, budget ต่อ pattern)
+# ใช้ร่วมกันระหว่าง /api/crawler (app/routes/crawler.py) และ network assessment (app/utils/assessment.py)
+# ส่วน dedupe URL ด้วย TF-IDF (ต้องใช้ scikit-learn) อยู่ใน route
+
+DEFAULT_MAX_BODY_BYTES = int(os.getenv("CRAWLER_MAX_BODY_BYTES", 2 * 1024 * 1024))
+# จำนวน URL สูงสุดต่อ pattern (path + ชื่อ param) ก่อนหยุด enqueue, 0 = ไม่จำกัด
+DEFAULT_PATTERN_BUDGET = int(os.getenv("CRAWLER_PATTERN_BUDGET", 20))
+MAX_SITEMAP_FILES = int(os.getenv("CRAWLER_MAX_SITEMAP_FILES", 10))
+
+# tracking params ที่ต้องละเว้นเวลาทำ normalization
+TRACKING_PARAMS_RE = re.compile(r'^(utm_|fbclid$|gclid$|sessionid$|phpsessid$)', re.IGNORECASE)
+
+# -------------------------
+# 1. Data Collection → เก็บข้อมูลเอกสาร/URL
+# -------------------------
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+# นามสกุลที่ถือว่าเป็นหน้าเว็บได้ (ไม่ต้อง HEAD ก่อน)
+HTML_LIKE_EXTENSIONS = {"", ".html", ".htm", ".xhtml", ".php", ".asp", ".aspx", ".jsp", ".jspx", ".do", ".action", ".cfm", ".cgi", ".pl", ".shtml"}
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?\s*([A-Za-z0-9_\-:.]+)', re.IGNORECASE)
+CHARSET_SNIFF_BYTES = 2048
+READ_CHUNK_SIZE = 64 * 1024
+
+def _is_html(content_type: str) -> bool:
+    ct = (content_type or "").split(";", 1)[0].strip().lower()
+    return ct in HTML_CONTENT_TYPES
+
+def _looks_like_html_url(url: str) -> bool:
+    last = urlparse(url).path.rsplit("/", 1)[-1]
+    ext = os.path.splitext(last)[1].lower()
+    return ext in HTML_LIKE_EXTENSIONS
+
+def _sniff_charset(content_type: str, head: bytes) -> str:
+    """หา charset จาก header ก่อน แล้วค่อยดู <meta charset> ในช่วงต้นของเอกสาร (ไม่ decode ทั้งไฟล์)"""
+    for part in (content_type or "").split(";")[1:]:
+        k, _, v = part.strip().partition("=")
+        if k.lower() == "charset" and v:
+            return v.strip('"\' ')
+    m = META_CHARSET_RE.search(head[:CHARSET_SNIFF_BYTES])
+    if m:
+        return m.group(1).decode("ascii", "ignore")
+    return "utf-8"
+
+async def _read_capped(resp, max_bytes: int) -> bytearray:
+    """อ่าน body เป็น chunk และหยุดทันทีเมื่อครบ max_bytes"""
+    buf = bytearray()
+    async for chunk in resp.content.iter_chunked(READ_CHUNK_SIZE):
+        buf.extend(chunk)
+        if len(buf) >= max_bytes:
+            del buf[max_bytes:]
+            break
+    return buf
+
+async def _fetch(session, url, timeout=10, max_bytes=None, cached=None, on_error=None):
+    """
+    ดึงเฉพาะหน้า HTML โดยจำกัดขนาด body ไม่เกิน max_bytes:
+      - URL ที่นามสกุลไม่ใช่หน้าเว็บ → HEAD ก่อน, ไม่ใช่ HTML ก็ไม่ GET
+      - GET ส่ง Range ไปด้วย (server ที่รองรับจะส่งมาแค่ส่วนต้น)
+      - ตรวจ Content-Type ก่อนอ่าน body, อ่านเป็น chunk และหยุดเมื่อครบ max_bytes
+      - ถ้ามี cached (state จาก crawl ครั้งก่อน) จะส่ง If-None-Match / If-Modified-Since
+
+    คืนค่า {"html": str|None, "not_modified": bool, "etag": ..., "last_modified": ...}
+    หรือ None ถ้าไม่ใช่หน้า HTML / ดึงไม่ได้ (error ของการเชื่อมต่อ / TLS / timeout ส่งให้ on_error(url, exc) ด้วย)
+    """
+    max_bytes = max_bytes or DEFAULT_MAX_BODY_BYTES
+    try:
+        if not _looks_like_html_url(url):
+            async with session.head(url, timeout=timeout, allow_redirects=True) as resp:
+                if resp.status >= 400 and resp.status not in (405, 501):
+                    return None
+                if resp.status < 400 and not _is_html(resp.headers.get('Content-Type', '')):
+                    return None
+
+        headers = {"Range": f"bytes=0-{max_bytes - 1}"}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        async with session.get(url, timeout=timeout, headers=headers) as resp:
+            validators = {
+                "etag": resp.headers.get("ETag") or (cached or {}).get("etag"),
+                "last_modified": resp.headers.get("Last-Modified") or (cached or {}).get("last_modified"),
+            }
+            if resp.status == 304 and cached:
+                return {"html": None, "not_modified": True, **validators}
+            if resp.status not in (200, 206):
+                return None
+            content_type = resp.headers.get('Content-Type', '')
+            if not _is_html(content_type):
+                return None
+
+            buf = await _read_capped(resp, max_bytes)
+            charset = _sniff_charset(content_type, bytes(buf[:CHARSET_SNIFF_BYTES]))
+            try:
+                html = buf.decode(charset, errors="replace")
+            except LookupError:
+                html = buf.decode("utf-8", errors="replace")
+            return {"html": html, "not_modified": False, **validators}
+    except Exception as e:
+        if on_error is not None:
+            on_error(url, e)
+        return None
+
+# -------------------------
+# 1b. Parameter Discovery → หา form / query param ที่ส่งให้ sqlmap ได้
+# -------------------------
+# field ที่ไม่ใช่ input ของผู้ใช้ (ส่งค่าไปด้วยแต่ไม่ให้ sqlmap ทดสอบ)
+NON_INJECTABLE_INPUT_TYPES = {"submit", "button", "image", "reset", "file"}
+
+def _form_fields(form):
+    """คืนค่า [(name, value, injectable)] ของทุก field ที่มี name ใน form"""
+    fields = []
+    for el in form.find_all(["input", "textarea", "select"]):
+        name = el.get("name")
+        if not name:
+            continue
+        if el.name == "select":
+            option = el.find("option", selected=True) or el.find("option")
+            value = (option.get("value", option.get_text()) if option else "") or ""
+            injectable = True
+        elif el.name == "textarea":
+            value = el.get_text() or ""
+            injectable = True
+        else:
+            input_type = (el.get("type") or "text").lower()
+            if input_type in ("checkbox", "radio") and not el.has_attr("checked"):
+                # ส่งเฉพาะตัวเลือกแรกของ group เพื่อให้ได้ชื่อ param
+                if any(n == name for n, _, _ in fields):
+                    continue
+            value = el.get("value", "") or ""
+            injectable = input_type not in NON_INJECTABLE_INPUT_TYPES
+        fields.append((name, value, injectable))
+    return fields
+
+def extract_targets(page_url: str, soup) -> list:
+    """
+    ดึง target ที่มี parameter จากหน้าเว็บ ในรูปแบบเดียวกับที่ build_cmd_from_item รับ:
+      {"url": ..., "method": "GET"|"POST", "data": <urlencoded body หรือ None>, "param": "a,b"}
+    หน้าที่ไม่มี query param และไม่มี form จะไม่ได้ target
+    """
+    targets = []
+
+    query = parse_qsl(urlparse(page_url).query, keep_blank_values=True)
+    if query:
+        targets.append({
+            "url": page_url,
+            "method": "GET",
+            "data": None,
+            "param": ",".join(dict.fromkeys(k for k, _ in query)),
+        })
+
+    for form in soup.find_all("form"):
+        action = (form.get("action") or "").strip()
+        if action.startswith("javascript:") or action.startswith("mailto:"):
+            continue
+        action_url = str(URL(urljoin(page_url, action)).with_fragment(None))
+        method = (form.get("method") or "get").strip().upper()
+        fields = _form_fields(form)
+        params = list(dict.fromkeys(name for name, _, injectable in fields if injectable))
+        if not params:
+            continue
+        pairs = [(name, value) for name, value, _ in fields]
+
+        if method == "POST":
+            targets.append({
+                "url": action_url,
+                "method": "POST",
+                "data": urlencode(pairs),
+                "param": ",".join(params),
+            })
+        else:
+            p = urlparse(action_url)
+            targets.append({
+                "url": urlunparse((p.scheme, p.netloc, p.path, p.params, urlencode(pairs), "")),
+                "method": "GET",
+                "data": None,
+                "param": ",".join(params),
+            })
+
+    return targets
+
+def normalize_url(u: str) -> str:
+    try:
+        p = urlparse(u)
+    except Exception:
+        return u
+
+    scheme = p.scheme.lower()
+    netloc = p.netloc.lower()
+    if netloc.endswith(":80") and scheme == "http":
+        netloc = netloc[:-3]
+    if netloc.endswith(":443") and scheme == "https":
+        netloc = netloc[:-4]
+
+    path = p.path or "/"
+    q = parse_qsl(p.query, keep_blank_values=True)
+    # ลบ tracking params
+    q_filtered = [(k, v) for (k, v) in q if not TRACKING_PARAMS_RE.match(k)]
+    q_filtered.sort(key=lambda kv: (kv[0], kv[1]))
+    query = urlencode(q_filtered, doseq=True)
+
+    return urlunparse((scheme, netloc, path, "", query, ""))
+
+def target_signature(t: dict) -> str:
+    """method + path + ชื่อ param (ไม่เอาค่า) ใช้ตัด target ที่ซ้ำกัน"""
+    p = urlparse(normalize_url(t["url"]))
+    names = sorted(set(t["param"].split(",")))
+    return f"{t['method']} {p.netloc}{p.path} {','.join(names)}"
+
+def dedupe_targets(targets):
+    out = {}
+    for t in targets:
+        out.setdefault(target_signature(t), t)
+    return list(out.values())
+
+# -------------------------
+# 1c. Crawl Budget → กัน crawler trap (ปฏิทิน, faceted search)
+# -------------------------
+NUMERIC_SEGMENT_RE = re.compile(r"^\d+$")
+ID_SEGMENT_RE = re.compile(r"^(?=.*\d)[0-9a-f\-]{8,}$", re.IGNORECASE)
+DIGITS_RE = re.compile(r"\d+")
+
+def crawl_pattern(u: str) -> str:
+    """
+    pattern ของ URL: path ที่แทนตัวเลข/ID ด้วย placeholder + ชื่อ query param (ไม่เอาค่า)
+    เช่น /calendar/2024/05?view=day → /calendar/{n}/{n}?view
+    """
+    p = urlparse(u)
+    segs = []
+    for seg in (p.path or "/").split("/"):
+        if NUMERIC_SEGMENT_RE.match(seg):
+            segs.append("{n}")
+        elif ID_SEGMENT_RE.match(seg):
+            segs.append("{id}")
+        else:
+            segs.append(DIGITS_RE.sub("{n}", seg))
+    keys = sorted({k for k, _ in parse_qsl(p.query, keep_blank_values=True)})
+    return "/".join(segs) + ("?" + "&".join(keys) if keys else "")
+
+# -------------------------
+# 1d. Seeding → robots.txt / sitemap.xml
+# -------------------------
+SITEMAP_LINE_RE = re.compile(r"^\s*sitemap\s*:\s*(\S+)", re.IGNORECASE | re.MULTILINE)
+SITEMAP_LOC_RE = re.compile(r"<loc>\s*([^<\s]+)\s*</loc>", re.IGNORECASE)
+
+async def _fetch_text(session, url, max_bytes, timeout=10):
+    try:
+        async with session.get(url, timeout=timeout) as resp:
+            if resp.status != 200:
+                return None
+            buf = await _read_capped(resp, max_bytes)
+            return buf.decode("utf-8", errors="replace")
+    except Exception:
+        return None
+
+async def _sitemap_urls(session, start_url, base_domain, limit, max_bytes):
+    """หา URL จาก sitemap (ตามที่ประกาศใน robots.txt หรือ /sitemap.xml) ไม่เกิน limit รายการ"""
+    root = urljoin(start_url, "/")
+    robots = await _fetch_text(session, urljoin(root, "/robots.txt"), max_bytes)
+    pending = SITEMAP_LINE_RE.findall(robots or "") or [urljoin(root, "/sitemap.xml")]
+
+    urls = []
+    fetched = 0
+    while pending and fetched < MAX_SITEMAP_FILES and len(urls) < limit:
+        sitemap_url = pending.pop(0)
+        if sitemap_url.endswith(".gz"):
+            continue
+        body = await _fetch_text(session, sitemap_url, max_bytes)
+        fetched += 1
+        if not body:
+            continue
+        locs = [html_lib.unescape(loc) for loc in SITEMAP_LOC_RE.findall(body)]
+        if "<sitemapindex" in body[:1024].lower():
+            pending.extend(locs)
+            continue
+        for loc in locs:
+            if urlparse(loc).netloc == base_domain:
+                urls.append(loc)
+                if len(urls) >= limit:
+                    break
+    return urls
+
+def extract_links(page_url: str, soup, base_domain: str) -> list:
+    """ลิงก์ <a href> ภายในโดเมนเดียวกัน (ตัด fragment แล้ว, ไม่ซ้ำ)"""
+    links = []
+    for a in soup.find_all("a", href=True):
+        href = a.get("href").strip()
+        if href.startswith("mailto:") or href.startswith("javascript:"):
+            continue
+        new_str = str(URL(urljoin(page_url, href)).with_fragment(None))
+        if urlparse(new_str).netloc != base_domain:
+            continue
+        links.append(new_str)
+    return list(dict.fromkeys(links))
+
+async def crawl_async(start_url, max_pages=500, concurrency=20, on_page=None, max_bytes=None,
+                       store=None, stats=None, pattern_budget=None, use_sitemap=False, verify_ssl=True):
+    """
+    pattern_budget: จำนวน URL สูงสุดต่อ crawl_pattern ที่จะ enqueue (0 = ไม่จำกัด)
+    use_sitemap: seed URL จาก sitemap.xml ก่อนเริ่ม crawl
+    store: dict url → state จาก crawl ครั้งก่อน (crawl_store) ใช้ทำ conditional request
+           และจะถูกอัปเดตในที่ด้วย state ล่าสุดของทุกหน้าที่ดึงได้
+    stats: dict สำหรับนับ fetched / not_modified / unchanged / parsed
+           และ errors (ดึงไม่ได้เพราะ connection / TLS / timeout) พร้อม last_error ของครั้งล่าสุด
+    verify_ssl: False = ไม่ตรวจ cert (web root ภายในที่ใช้ self-signed cert เช่นที่มาจาก network scan)
+    """
+    parsed = urlparse(start_url)
+    base_domain = parsed.netloc
+    if stats is None:
+        stats = {}
+    for key in ("fetched", "not_modified", "unchanged", "parsed", "sitemap_seeded", "skipped_by_pattern", "errors"):
+        stats.setdefault(key, 0)
+    if pattern_budget is None:
+        pattern_budget = DEFAULT_PATTERN_BUDGET
+
+    to_visit = asyncio.Queue()
+    seen = set()
+    pattern_hits = Counter()
+    results = []
+    targets = []
+
+    def enqueue(u):
+        """ใส่ URL เข้า queue ถ้ายังไม่เคยเห็น และ pattern ยังไม่เกิน budget"""
+        if u in seen:
+            return False
+        seen.add(u)
+        if pattern_budget > 0:
+            pattern = crawl_pattern(u)
+            if pattern_hits[pattern] >= pattern_budget:
+                stats["skipped_by_pattern"] += 1
+                return False
+            pattern_hits[pattern] += 1
+        to_visit.put_nowait(u)
+        return True
+
+    enqueue(start_url)
+
+    sem = asyncio.Semaphore(concurrency)
+    timeout = aiohttp.ClientTimeout(total=15)
+    connector = aiohttp.TCPConnector(limit=concurrency, force_close=True, ssl=verify_ssl)
+    headers = {"User-Agent": "simple-crawler/1.0"}
+
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector, headers=headers) as session:
+
+        if use_sitemap:
+            for u in await _sitemap_urls(session, start_url, base_domain, max_pages,
+                                         max_bytes or DEFAULT_MAX_BODY_BYTES):
+                if enqueue(str(URL(u).with_fragment(None))):
+                    stats["sitemap_seeded"] += 1
+
+        def fetch_error(url, e):
+            stats["errors"] += 1
+            stats["last_error"] = f"{url}: {type(e).__name__}: {e}"
+
+        def analyze(url, res, cached):
+            """คืนค่า (links, targets) ของหน้า โดยใช้ผลเดิมถ้าหน้าไม่เปลี่ยน"""
+            if res["not_modified"]:
+                stats["not_modified"] += 1
+                return cached.get("links", []), cached.get("targets", []), cached.get("hash")
+
+            page_hash = crawl_store.content_hash(res["html"])
+            if cached and cached.get("hash") == page_hash:
+                stats["unchanged"] += 1
+                return cached.get("links", []), cached.get("targets", []), page_hash
+
+            stats["parsed"] += 1
+            soup = BeautifulSoup(res["html"], "html.parser")
+            page_targets = [
+                t for t in extract_targets(url, soup)
+                if urlparse(t["url"]).netloc == base_domain
+            ]
+            return extract_links(url, soup, base_domain), page_targets, page_hash
+
+        async def worker():
+            # worker ทำงานจนถูก cancel; เมื่อครบ max_pages จะ drain queue ที่เหลือเพื่อให้ join() จบ
+            while True:
+                url = await to_visit.get()
+                try:
+                    await process(url)
+                finally:
+                    to_visit.task_done()
+
+        async def process(url):
+            if len(results) >= max_pages:
+                return
+            cached = store.get(url) if store is not None else None
+            async with sem:
+                res = await _fetch(session, url, max_bytes=max_bytes, cached=cached, on_error=fetch_error)
+            if not res or len(results) >= max_pages:
+                return
+            stats["fetched"] += 1
+            results.append(url)
+
+            links, page_targets, page_hash = analyze(url, res, cached)
+            if store is not None:
+                store[url] = {
+                    "etag": res.get("etag"),
+                    "last_modified": res.get("last_modified"),
+                    "hash": page_hash,
+                    "links": links,
+                    "targets": page_targets,
+                    "fetched_at": datetime.datetime.utcnow().isoformat(),
+                }
+
+            targets.extend(page_targets)
+            if on_page is not None:
+                on_page((url, page_targets))
+
+            # -------------------------
+            # 1a. เก็บลิงก์ภายในเพื่อติดตามต่อ
+            # -------------------------
+            for new_str in links:
+                enqueue(new_str)
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        await to_visit.join()
+        for w in workers:
+            w.cancel()
+        return list(dict.fromkeys(results)), targets
+
+async def crawl_stream(start_url, max_pages=500, concurrency=20, max_bytes=None, store=None, stats=None,
+                        pattern_budget=None, use_sitemap=False, verify_ssl=True):
+    """
+    async generator: yield (url, targets) ทีละหน้าทันทีที่ crawl เจอ (ไม่ต้องรอทั้งเว็บ)
+    """
+    found = asyncio.Queue()
+    task = asyncio.create_task(
+        crawl_async(start_url, max_pages=max_pages, concurrency=concurrency,
+                     on_page=found.put_nowait, max_bytes=max_bytes, store=store, stats=stats,
+                     pattern_budget=pattern_budget, use_sitemap=use_sitemap, verify_ssl=verify_ssl)
+    )
+    task.add_done_callback(lambda t: found.put_nowait(None))
+    try:
+        while True:
+            page = await found.get()
+            if page is None:
+                break
+            yield page
+        # ให้ exception ของ crawl (ถ้ามี) ถูก raise ออกไปให้ผู้เรียก
+        await task
+    finally:
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
@@ -0,0 +1,80 @@
+# app/utils/crawl_store.py
+import os
+import json
+import hashlib
+import datetime
+import threading
+from typing import Any, Dict
+
+from flask import current_app
+
+# เก็บสถานะการ crawl ต่อเว็บไซต์ (1 ไฟล์ JSON ต่อ netloc) เพื่อให้ re-crawl ครั้งถัดไป
+# ส่ง If-None-Match / If-Modified-Since และไม่ต้อง parse หน้าที่ไม่เปลี่ยน
+#
+# รูปแบบไฟล์:
+# {
+#   "site": "example.com",
+#   "updated_at": "...",
+#   "pages": {
+#       "<url>": {"etag": ..., "last_modified": ..., "hash": ..., "links": [...], "targets": [...], "fetched_at": ...}
+#   }
+# }
+
+STORE_VERSION = 1
+
+
+def get_store_dir() -> str:
+    store_dir = os.getenv("CRAWLER_STORE_DIR")
+    if not store_dir:
+        store_dir = os.path.join(current_app.instance_path, "crawl_store")
+    os.makedirs(store_dir, exist_ok=True)
+    return store_dir
+
+
+def _store_path(store_dir: str, site: str) -> str:
+    key = hashlib.sha1(site.lower().encode("utf-8")).hexdigest()
+    return os.path.join(store_dir, f"{key}.json")
+
+
+def content_hash(html: str) -> str:
+    return hashlib.sha256(html.encode("utf-8", errors="replace")).hexdigest()
+
+
+def load_site(store_dir: str, site: str) -> Dict[str, Dict[str, Any]]:
+    """คืนค่า dict ของหน้าที่เคย crawl (url → state) หรือ dict ว่างถ้ายังไม่เคย/ไฟล์เสีย"""
+    path = _store_path(store_dir, site)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != STORE_VERSION:
+            return {}
+        return data.get("pages") or {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_site(store_dir: str, site: str, pages: Dict[str, Dict[str, Any]]) -> None:
+    """
+    เขียนแบบ atomic (tmp + replace) กันไฟล์เสียถ้า process ตายระหว่างเขียน
+    ไฟล์ tmp แยกต่อ process/thread: crawl เว็บเดียวกันพร้อมกันจะไม่เขียนทับไฟล์ tmp ของกันและกัน (ครั้งที่ replace ทีหลังชนะ)
+    """
+    path = _store_path(store_dir, site)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    data = {
+        "version": STORE_VERSION,
+        "site": site,
+        "updated_at": datetime.datetime.utcnow().isoformat(),
+        "pages": pages,
+    }
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
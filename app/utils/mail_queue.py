@@ -0,0 +1,221 @@
+# app/utils/mail_queue.py
+import os
+import time
+import uuid
+import heapq
+import queue
+import smtplib
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+
+from app.extensions import mail
+
+# ส่งอีเมลจาก background thread แทนการส่งใน request
+#
+# worker 1 thread ต่อ process ถือ SMTP connection (flask_mail Connection) ไว้ใช้ส่งหลายฉบับต่อเนื่อง
+# ปิด connection เมื่อไม่มีงานเกิน MAIL_QUEUE_IDLE_SECONDS และเปิดใหม่เมื่อมีงานเข้ามา
+# ส่งไม่สำเร็จจะ retry แบบ exponential backoff (error ถาวรเช่น 5xx / ผู้รับถูกปฏิเสธจะไม่ retry)
+# ไฟล์แนบอ่านจาก disk ตอนส่ง (ไม่เก็บ bytes ไว้ในคิว)
+#
+# สถานะงานอยู่ในหน่วยความจำของ process เท่านั้น (เหมือน network assessment) งานที่ค้างในคิวจะหายถ้า process ปิด
+# ทดสอบกับ SMTP จำลองในเครื่องได้ด้วย scripts/smtp_sink.py (MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=false)
+
+MAIL_QUEUE_IDLE_SECONDS = float(os.getenv("MAIL_QUEUE_IDLE_SECONDS", 30))
+MAIL_RETRY_MAX = int(os.getenv("MAIL_RETRY_MAX", 4))
+MAIL_RETRY_BACKOFF = float(os.getenv("MAIL_RETRY_BACKOFF", 2))
+# เก็บสถานะ batch ที่จบแล้วไว้ให้ถามได้ไม่เกินจำนวนนี้
+MAIL_BATCH_HISTORY = int(os.getenv("MAIL_BATCH_HISTORY", 200))
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+class MailJob:
+    def __init__(self, batch_id: str, message, attachment_path: Optional[str] = None,
+                 attachment_name: Optional[str] = None, attachment_type: str = "application/pdf"):
+        self.id = uuid.uuid4().hex
+        self.batch_id = batch_id
+        self.message = message
+        self.attachment_path = attachment_path
+        self.attachment_name = attachment_name
+        self.attachment_type = attachment_type
+        self.state = "queued"
+        self.attempts = 0
+        self.error: Optional[str] = None
+        self.sent_at: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "recipients": list(self.message.recipients),
+            "state": self.state,
+            "attempts": self.attempts,
+            "error": self.error,
+            "sent_at": self.sent_at,
+        }
+
+
+def _is_permanent(error: Exception) -> bool:
+    """error ที่ส่งซ้ำไปก็ไม่สำเร็จ: ผู้รับถูกปฏิเสธทั้งหมด, SMTP 5xx, server ไม่รองรับ (เช่น AUTH), ไฟล์แนบหาย, ข้อความไม่ถูกต้อง"""
+    if isinstance(error, (smtplib.SMTPRecipientsRefused, smtplib.SMTPNotSupportedError)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 500 <= error.smtp_code < 600
+    return isinstance(error, (FileNotFoundError, AssertionError, ValueError))
+
+
+class MailQueue:
+    def __init__(self, app):
+        self.app = app
+        self.queue: "queue.Queue[MailJob]" = queue.Queue()
+        self._retry: List[Any] = []  # heap ของ (เวลาที่ส่งซ้ำได้, ลำดับ, job) ใช้เฉพาะใน worker thread
+        self._seq = 0
+        self._batches: Dict[str, List[MailJob]] = {}
+        self._lock = threading.Lock()
+        self._connection = None
+        self._last_used = 0.0
+        self.connections_opened = 0
+        self.thread = threading.Thread(target=self._run, name="mail-queue", daemon=True)
+
+    def start(self) -> "MailQueue":
+        self.thread.start()
+        return self
+
+    def submit(self, jobs: List[MailJob]) -> None:
+        with self._lock:
+            for job in jobs:
+                self._batches.setdefault(job.batch_id, []).append(job)
+            while len(self._batches) > MAIL_BATCH_HISTORY:
+                oldest = next(iter(self._batches))
+                if any(j.state in ("queued", "sending", "retrying") for j in self._batches[oldest]):
+                    break
+                del self._batches[oldest]
+        for job in jobs:
+            self.queue.put(job)
+
+    def batch_status(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            jobs = list(self._batches.get(batch_id) or [])
+        if not jobs:
+            return None
+        states = [j.state for j in jobs]
+        return {
+            "batchId": batch_id,
+            "done": all(s in ("sent", "failed") for s in states),
+            "sent": states.count("sent"),
+            "failed": states.count("failed"),
+            "pending": sum(1 for s in states if s not in ("sent", "failed")),
+            "jobs": [j.to_dict() for j in jobs],
+        }
+
+    # --- worker ---
+    def _next_job(self) -> Optional[MailJob]:
+        """job ถัดไป (retry ที่ถึงเวลาก่อน) หรือ None เมื่อถือ connection ไว้เปล่าๆ นานเกิน idle timeout"""
+        while True:
+            now = time.monotonic()
+            if self._retry and self._retry[0][0] <= now:
+                return heapq.heappop(self._retry)[2]
+            wait = self._retry[0][0] - now if self._retry else None
+            if self._connection is not None:
+                idle_left = self._last_used + MAIL_QUEUE_IDLE_SECONDS - now
+                if idle_left <= 0:
+                    return None
+                wait = idle_left if wait is None else min(wait, idle_left)
+            try:
+                return self.queue.get(timeout=wait)
+            except queue.Empty:
+                continue
+
+    def _connect(self):
+        if self._connection is None:
+            connection = mail.connect()
+            connection.__enter__()
+            self._connection = connection
+            self.connections_opened += 1
+        return self._connection
+
+    def _disconnect(self, graceful: bool = True) -> None:
+        connection, self._connection = self._connection, None
+        if connection is None or connection.host is None:
+            return
+        try:
+            if graceful:
+                connection.host.quit()
+            else:
+                connection.host.close()
+        except (smtplib.SMTPException, OSError):
+            pass
+
+    def _send(self, job: MailJob) -> None:
+        msg = job.message
+        if job.attachment_path and not msg.attachments:
+            with open(job.attachment_path, 'rb') as f:
+                msg.attach(job.attachment_name or os.path.basename(job.attachment_path), job.attachment_type, f.read())
+        self._connect().send(msg)
+        # ไม่เก็บไฟล์แนบค้างไว้ใน job หลังส่งแล้ว (สถานะยังถามได้อีกนาน)
+        msg.attachments = []
+
+    def _handle(self, job: MailJob) -> None:
+        job.state = "sending"
+        job.attempts += 1
+        try:
+            self._send(job)
+        except Exception as e:
+            job.error = str(e)
+            # server ตอบ error กลับมา = connection ยังใช้ต่อได้, error อื่น (หลุด/timeout) ทิ้งแล้วเปิดใหม่รอบถัดไป
+            if not isinstance(e, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)) \
+                    or isinstance(e, smtplib.SMTPServerDisconnected):
+                self._disconnect(graceful=False)
+            if _is_permanent(e) or job.attempts >= MAIL_RETRY_MAX:
+                job.state = "failed"
+                self.app.logger.error(f"Mail to {', '.join(job.message.recipients)} failed after {job.attempts} attempt(s): {e}")
+                return
+            delay = MAIL_RETRY_BACKOFF * (2 ** (job.attempts - 1))
+            job.state = "retrying"
+            self._seq += 1
+            heapq.heappush(self._retry, (time.monotonic() + delay, self._seq, job))
+            self.app.logger.warning(f"Mail to {', '.join(job.message.recipients)} failed (attempt {job.attempts}), retrying in {delay:g}s: {e}")
+        else:
+            job.state = "sent"
+            job.error = None
+            job.sent_at = datetime.utcnow().isoformat()
+        finally:
+            self._last_used = time.monotonic()
+
+    def _run(self) -> None:
+        with self.app.app_context():
+            while True:
+                job = self._next_job()
+                if job is None:
+                    self._disconnect()
+                    continue
+                try:
+                    self._handle(job)
+                except Exception as e:  # ไม่ให้ worker ตาย
+                    self.app.logger.error(f"Mail queue worker error: {e}")
+
+
+def get_mail_queue() -> MailQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = MailQueue(current_app._get_current_object()).start()
+    return _queue
+
+
+def enqueue(messages: List[Any], attachment_path: Optional[str] = None,
+            attachment_name: Optional[str] = None) -> Dict[str, Any]:
+    """เข้าคิวส่งอีเมลหลายฉบับเป็น batch เดียว (ไฟล์แนบเดียวกันทุกฉบับ) คืนค่าสถานะเริ่มต้นของ batch"""
+    batch_id = uuid.uuid4().hex
+    jobs = [MailJob(batch_id, msg, attachment_path, attachment_name) for msg in messages]
+    mail_queue = get_mail_queue()
+    mail_queue.submit(jobs)
+    return mail_queue.batch_status(batch_id)
+
+
+def batch_status(batch_id: str) -> Optional[Dict[str, Any]]:
+    return get_mail_queue().batch_status(batch_id)
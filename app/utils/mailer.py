@@ -3,20 +3,28 @@ from app.extensions import mail
 from flask import render_template
 from flask import current_app # <-- 1. เพิ่มการ import current_app
 
+def build_security_report_message(recipient, subject, report_data):
+    """
+    สร้างอีเมลรายงานความปลอดภัย (ยังไม่แนบไฟล์) — ต้องเรียกใน app context เพราะ render template
+    """
+    # 2. ดึงอีเมลผู้ส่งมาจากไฟล์คอนฟิก
+    sender_email = current_app.config.get('MAIL_USERNAME') or current_app.config.get('MAIL_DEFAULT_SENDER')
+
+    # 3. เพิ่มพารามิเตอร์ sender เข้าไปใน Message object
+    msg = Message(subject,
+                  sender=sender_email, # <-- เพิ่มบรรทัดนี้
+                  recipients=[recipient])
+    
+    msg.html = render_template('email/security_report.html', report_data=report_data)
+    return msg
+
 def send_security_report_email(recipient, subject, report_data, pdf_attachment=None, pdf_filename=None):
     """
-    ส่งอีเมลรายงานความปลอดภัยพร้อมไฟล์ PDF ที่แนบ
+    ส่งอีเมลรายงานความปลอดภัยพร้อมไฟล์ PDF ที่แนบ (ส่งทันที เปิด SMTP connection ใหม่ต่อฉบับ)
+    งานส่งจาก request ให้ใช้ app.utils.mail_queue แทน
     """
     try:
-        # 2. ดึงอีเมลผู้ส่งมาจากไฟล์คอนฟิก
-        sender_email = current_app.config.get('MAIL_USERNAME')
-
-        # 3. เพิ่มพารามิเตอร์ sender เข้าไปใน Message object
-        msg = Message(subject,
-                      sender=sender_email, # <-- เพิ่มบรรทัดนี้
-                      recipients=[recipient])
-        
-        msg.html = render_template('email/security_report.html', report_data=report_data)
+        msg = build_security_report_message(recipient, subject, report_data)
 
         if pdf_attachment and pdf_filename:
             msg.attach(pdf_filename, "application/pdf", pdf_attachment)
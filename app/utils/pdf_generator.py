@@ -1,23 +1,37 @@
 # app/utils/pdf_generator.py
 import os
+import re
+import copy
 import datetime
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+from xml.sax.saxutils import escape
 from io import BytesIO
 
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import BaseDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak, Frame, PageTemplate
+from reportlab.platypus import BaseDocTemplate, Paragraph, Preformatted, Spacer, Table, TableStyle, PageBreak, CondPageBreak, Frame, PageTemplate
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfbase.pdfmetrics import registerFontFamily
 from reportlab.lib.units import cm
+from reportlab.pdfgen import canvas
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 
 THAI_FONT_NAME = "Sarabun"
 THAI_FONT_BOLD_NAME = "Sarabun-bold"
 
+# layout ของ report: full = ทุกรายการแยกหน้า, compact = ตารางสรุปทุกรายการ + รายละเอียดเฉพาะรายการที่พบช่องโหว่
+REPORT_LAYOUTS = ("full", "compact")
+
+# story ถูกสร้างทีละส่วนระหว่าง layout (ดู LazyStory): เก็บ flowable ที่ยังไม่ได้วางไว้ประมาณเท่านี้
+STORY_LOW_WATER = int(os.getenv("PDF_STORY_LOW_WATER", 64))
+# ตารางสรุปของ layout compact ถูกแบ่งเป็นตารางละไม่เกินเท่านี้แถว
+SUMMARY_TABLE_CHUNK = int(os.getenv("PDF_SUMMARY_TABLE_CHUNK", 50))
+
 # --- Font Registration ---
+# ลงทะเบียนฟอนต์แบบ lazy ครั้งเดียวต่อ process (ตอน render report แรก) ไม่ใช่ตอน import
 project_app_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 font_dir = os.path.join(project_app_dir, "fonts")
 
@@ -28,35 +42,47 @@ font_files = {
     'bolditalic': 'Sarabun-BoldItalic.ttf'
 }
 
-try:
-    if not os.path.exists(font_dir):
-        raise FileNotFoundError(f"Font directory not found: {font_dir}")
-
-    registered_fonts = {}
-    for variant, filename in font_files.items():
-        font_path = os.path.join(font_dir, filename)
-        if not os.path.exists(font_path): continue
-        font_name = f"{THAI_FONT_NAME}-{variant}" if variant != 'regular' else THAI_FONT_NAME
-        pdfmetrics.registerFont(TTFont(font_name, font_path))
-        registered_fonts[variant] = font_name
-
-    if 'regular' not in registered_fonts or 'bold' not in registered_fonts:
-        raise FileNotFoundError("Sarabun-Regular.ttf and Sarabun-Bold.ttf are required.")
-
-    THAI_FONT_BOLD_NAME = registered_fonts.get('bold')
-
-    registerFontFamily(
-        THAI_FONT_NAME,
-        normal=registered_fonts.get('regular'),
-        bold=registered_fonts.get('bold'),
-        italic=registered_fonts.get('italic'),
-        boldItalic=registered_fonts.get('bolditalic')
-    )
-    print(f"✅ Registered Sarabun font family successfully")
+_fonts_registered = False
+_font_lock = threading.Lock()
+
+def register_fonts():
+    """Registers the Sarabun font family once per process (thread-safe, no-op afterwards)."""
+    global _fonts_registered, THAI_FONT_BOLD_NAME
+    if _fonts_registered:
+        return
+    with _font_lock:
+        if _fonts_registered:
+            return
+        try:
+            if not os.path.exists(font_dir):
+                raise FileNotFoundError(f"Font directory not found: {font_dir}")
+
+            registered_fonts = {}
+            for variant, filename in font_files.items():
+                font_path = os.path.join(font_dir, filename)
+                if not os.path.exists(font_path): continue
+                font_name = f"{THAI_FONT_NAME}-{variant}" if variant != 'regular' else THAI_FONT_NAME
+                pdfmetrics.registerFont(TTFont(font_name, font_path))
+                registered_fonts[variant] = font_name
+
+            if 'regular' not in registered_fonts or 'bold' not in registered_fonts:
+                raise FileNotFoundError("Sarabun-Regular.ttf and Sarabun-Bold.ttf are required.")
+
+            THAI_FONT_BOLD_NAME = registered_fonts.get('bold')
 
-except Exception as e:
-    print(f"❌ Error: Thai font registration failed: {e}")
-    raise
+            registerFontFamily(
+                THAI_FONT_NAME,
+                normal=registered_fonts.get('regular'),
+                bold=registered_fonts.get('bold'),
+                italic=registered_fonts.get('italic'),
+                boldItalic=registered_fonts.get('bolditalic')
+            )
+            _fonts_registered = True
+            print(f"✅ Registered Sarabun font family successfully")
+
+        except Exception as e:
+            print(f"❌ Error: Thai font registration failed: {e}")
+            raise
 
 # --- Helper Functions ---
 def thai_datetime_str() -> str:
@@ -66,8 +92,24 @@ def thai_datetime_str() -> str:
     d = datetime.datetime.now()
     return f"วันที่ {d.day} {months[d.month-1]} พ.ศ. {d.year+543} เวลา {d.hour:02d}:{d.minute:02d} น."
 
+_styles = None
+_styles_lock = threading.Lock()
+
 def get_custom_styles():
+    """
+    Returns the Thai stylesheet as a fresh dict of style copies.
+    ต้นแบบสร้างครั้งเดียวต่อ process แต่แต่ละครั้งที่เรียกจะได้สำเนาของตัวเอง แก้ได้โดยไม่กระทบรายงานอื่นที่ render พร้อมกัน
+    """
+    global _styles
+    if _styles is None:
+        with _styles_lock:
+            if _styles is None:
+                _styles = _build_custom_styles()
+    return {name: copy.copy(style) for name, style in _styles.items()}
+
+def _build_custom_styles():
     """Gets the default stylesheet and modifies it with custom Thai font settings."""
+    register_fonts()
     styles = getSampleStyleSheet()
     base_font_name = THAI_FONT_NAME
     bold_font_name = THAI_FONT_BOLD_NAME
@@ -105,14 +147,61 @@ def get_custom_styles():
     styles.add(ParagraphStyle(name='SuccessStatus', parent=styles['Normal'], textColor=colors.HexColor("#2E7D32")))
     styles.add(ParagraphStyle(name='ErrorStatus', parent=styles['Normal'], textColor=colors.HexColor("#C62828")))
     
-    return styles
+    return dict(styles.byName)
 
 # --- Custom Document Template with Header/Footer ---
+class NumberedCanvas(canvas.Canvas):
+    """
+    Canvas ที่วาด "หน้า X / Y" ในรอบ layout เดียว: ทุกหน้าอ้างถึง form "pageTotal" ที่ยังไม่มีเนื้อหา
+    แล้วค่อยวาดจำนวนหน้าทั้งหมดลง form นั้นตอน save() → ส่งหน้าเข้า document ได้ทันทีโดยไม่ต้องเก็บ state ของทุกหน้าไว้
+    """
+    TOTAL_FORM = "pageTotal"
+
+    def showPage(self):
+        self._draw_page_number()
+        super().showPage()
+
+    def save(self):
+        self.beginForm(self.TOTAL_FORM)
+        self.setFont(THAI_FONT_NAME, 9)
+        self.drawString(A4[0]/2 + 2, 1.5*cm, str(self._pageNumber - 1))
+        self.endForm()
+        super().save()
+
+    def _draw_page_number(self):
+        self.saveState()
+        self.setFont(THAI_FONT_NAME, 9)
+        self.drawRightString(A4[0]/2 - 2, 1.5*cm, f"หน้า {self._pageNumber} /")
+        self.doForm(self.TOTAL_FORM)
+        self.restoreState()
+
+
+class LazyStory(list):
+    """
+    story ที่ดึง flowable จาก generator ของ section ทีละส่วนระหว่าง doc.build()
+    (build อ่าน len() ก่อนวาง flowable ทุกตัว → เติมให้มีค้างไว้อย่างน้อย low_water ตัว)
+    flowable ที่วางแล้วถูกทิ้งทันที หน่วยความจำจึงไม่โตตามจำนวนผลลัพธ์/finding
+    """
+    def __init__(self, sections: Iterable[list], low_water: int = STORY_LOW_WATER):
+        super().__init__()
+        self._sections: Iterator[list] = iter(sections)
+        self._low_water = low_water
+
+    def __len__(self):
+        while self._sections is not None and list.__len__(self) < self._low_water:
+            section = next(self._sections, None)
+            if section is None:
+                self._sections = None
+            else:
+                self.extend(section)
+        return list.__len__(self)
+
+
 class ReportDocTemplate(BaseDocTemplate):
-    """Custom document template with header, footer, and a two-pass page count."""
+    """Custom document template with header, footer, and single-pass "page X / Y" numbering."""
     def __init__(self, filename, **kw):
+        register_fonts()
         super().__init__(filename, **kw)
-        self.page_count = 0
         self.allowSplitting = 1
         template = PageTemplate(id='main_template', onPage=self._header_footer, frames=[
             Frame(self.leftMargin, self.bottomMargin, self.width, self.height, id='main_frame')
@@ -120,7 +209,7 @@ class ReportDocTemplate(BaseDocTemplate):
         self.addPageTemplates([template])
         
     def _header_footer(self, canvas, doc):
-        """Draws the header and footer on each page."""
+        """Draws the header and footer on each page (page number is drawn by NumberedCanvas)."""
         canvas.saveState()
         canvas.setFont(THAI_FONT_NAME, 9)
         
@@ -131,25 +220,20 @@ class ReportDocTemplate(BaseDocTemplate):
 
         # Footer
         canvas.drawString(self.leftMargin, 1.5*cm, "Generated by Security Assessment Platform")
-        page_num_text = f"หน้า {doc.page} / {self.page_count}"
-        canvas.drawCentredString(A4[0]/2, 1.5*cm, page_num_text)
         canvas.drawRightString(A4[0] - self.rightMargin, 1.5*cm, f"พิมพ์เมื่อ: {datetime.datetime.now():%d/%m/%Y %H:%M}")
         canvas.line(self.leftMargin, 2.0*cm, A4[0] - self.rightMargin, 2.0*cm)
         
         canvas.restoreState()
 
-    def afterFlowable(self, flowable):
-        """Register page number after each flowable is processed."""
-        if hasattr(self, 'page'):
-            self.page_count = self.page
+    def build(self, flowables, canvasmaker=NumberedCanvas, **kw):
+        super().build(flowables, canvasmaker=canvasmaker, **kw)
 
 # --- Main PDF Generation Logic ---
-def generate_sqlmap_pdf_report(results: List[Dict[str, Any]], output_dir: str, output_filename: str) -> str:
-    """Creates a professionally styled PDF report from SQLMap scan results."""
-    os.makedirs(output_dir, exist_ok=True)
-    pdf_path = os.path.join(output_dir, output_filename)
+def _is_vulnerable(r: Dict[str, Any]) -> bool:
+    return bool(r.get("parametersRaw"))
 
-    styles = get_custom_styles()
+def _title_and_summary(results: List[Dict[str, Any]], styles) -> list:
+    """Title page + executive summary (shared by every layout)."""
     story = []
 
     # ===== Title Page =====
@@ -171,6 +255,7 @@ def generate_sqlmap_pdf_report(results: List[Dict[str, Any]], output_dir: str, o
             ("รายการที่สแกนทั้งหมด", f"{total_items} รายการ"),
             ("สแกนสำเร็จ", f"{success_count} รายการ"),
             ("ล้มเหลว", f"{total_items - success_count} รายการ"),
+            ("พบช่องโหว่", f"{sum(1 for r in results if _is_vulnerable(r))} รายการ"),
             ("ฐานข้อมูลที่พบ (ไม่ซ้ำกัน)", f"{len(all_db_names)} ฐานข้อมูล"),
             ("Payload ที่พบ (ไม่ซ้ำกัน)", f"{len(unique_payloads)} รูปแบบ"),
         ]
@@ -183,10 +268,13 @@ def generate_sqlmap_pdf_report(results: List[Dict[str, Any]], output_dir: str, o
     ]))
     story.append(summary_table)
     story.append(PageBreak())
+    return story
 
-    # ===== Detailed Scan Results =====
-    story.append(Paragraph("รายละเอียดผลการสแกน", styles["Heading1"]))
+def _detail_full(results: List[Dict[str, Any]], styles) -> Iterator[list]:
+    """ทุกรายการ 1 หน้าขึ้นไป พร้อมตารางย่อยต่อ finding (layout เดิม) — yield ทีละรายการ"""
+    yield [Paragraph("รายละเอียดผลการสแกน", styles["Heading1"])]
     for idx, r in enumerate(results, 1):
+        story = []
         story.append(Paragraph(f"รายการที่ {idx}: ผลการสแกน URL", styles["Heading2"]))
         story.append(Paragraph("<b>URL เป้าหมาย:</b>", styles['Normal']))
         story.append(Paragraph(r.get('url', 'N/A'), styles["URLStyle"]))
@@ -238,16 +326,212 @@ def generate_sqlmap_pdf_report(results: List[Dict[str, Any]], output_dir: str, o
 
         else: story.append(Paragraph("✅ ไม่พบพารามิเตอร์ที่มีช่องโหว่", styles["SuccessStatus"]))
         if idx < len(results): story.append(PageBreak())
+        yield story
+
+def _target_table(results: List[Dict[str, Any]], styles, start: int = 1) -> Table:
+    """ตารางสรุป 1 แถวต่อ URL (เซลล์อื่นนอกจาก URL เป็น string ธรรมดา ไม่ต้อง layout Paragraph)"""
+    rows = [["#", "URL เป้าหมาย", "สถานะ", "ฐานข้อมูล", "พารามิเตอร์"]]
+    row_styles = []
+    for row, (idx, r) in enumerate(enumerate(results, start), 1):
+        params = r.get("parametersRaw", [])
+        rows.append([
+            str(idx),
+            Paragraph(r.get('url') or 'N/A', styles["URLStyle"]),
+            "สำเร็จ" if r.get('ok') else "ล้มเหลว",
+            str(len(r.get("listDb", {}).get("names", []))),
+            str(len(params)) if params else "-",
+        ])
+        if params:
+            row_styles.append(('BACKGROUND', (0, row), (-1, row), colors.HexColor("#FFEBEE")))
+        elif not r.get('ok'):
+            row_styles.append(('TEXTCOLOR', (2, row), (2, row), colors.HexColor("#C62828")))
+    table = Table(rows, colWidths=[1.2*cm, 9.3*cm, 1.9*cm, 1.8*cm, 1.8*cm], repeatRows=1, hAlign='LEFT')
+    table.setStyle(TableStyle([
+        ('FONTNAME', (0,0), (-1,-1), THAI_FONT_NAME),
+        ('FONTNAME', (0,0), (-1,0), THAI_FONT_BOLD_NAME),
+        ('FONTSIZE', (0,0), (-1,-1), 9),
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#E3F2FD")),
+        ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey),
+        ('VALIGN', (0,0), (-1,-1), 'TOP'),
+        ('ALIGN', (0,0), (0,-1), 'RIGHT'),
+        ('ALIGN', (2,0), (-1,-1), 'CENTER'),
+    ] + row_styles))
+    return table
+
+def _findings_table(findings: List[Dict[str, Any]], styles) -> Table:
+    """findings ทั้งหมดของพารามิเตอร์เดียวในตารางแบนอันเดียว (1 แถวต่อ finding ไม่มีตารางซ้อน)"""
+    rows = [["ประเภท", "หัวข้อ", "Payload ที่ใช้ทดสอบ"]]
+    for f in findings:
+        rows.append([
+            Paragraph(f.get('type') or 'N/A', styles['Normal']),
+            Paragraph(f.get('title') or 'N/A', styles['Normal']),
+            Paragraph(f.get('payload') or 'N/A', styles['Code']),
+        ])
+    table = Table(rows, colWidths=[3.2*cm, 5.8*cm, 6*cm], repeatRows=1, hAlign='LEFT')
+    table.setStyle(TableStyle([
+        ('FONTNAME', (0,0), (-1,0), THAI_FONT_BOLD_NAME),
+        ('FONTSIZE', (0,0), (-1,0), 10),
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#f5f5f5")),
+        ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey),
+        ('VALIGN', (0,0), (-1,-1), 'TOP'),
+        ('LEFTPADDING', (0,0), (-1,-1), 6),
+    ]))
+    return table
+
+def _detail_compact(results: List[Dict[str, Any]], styles) -> Iterator[list]:
+    """ตารางสรุปทุกรายการ แล้วตามด้วยรายละเอียดเฉพาะรายการที่พบช่องโหว่ (ไม่ขึ้นหน้าใหม่ทุกรายการ)"""
+    yield [Paragraph("ผลการสแกนทุกรายการ", styles["Heading1"])]
+    for start in range(0, len(results), SUMMARY_TABLE_CHUNK):
+        yield [_target_table(results[start:start + SUMMARY_TABLE_CHUNK], styles, start + 1)]
+
+    vulnerable_count = sum(1 for r in results if _is_vulnerable(r))
+    story = [PageBreak(), Paragraph(f"รายการที่พบช่องโหว่ ({vulnerable_count} รายการ)", styles["Heading1"])]
+    if not vulnerable_count:
+        story.append(Paragraph("✅ ไม่พบพารามิเตอร์ที่มีช่องโหว่", styles["SuccessStatus"]))
+    yield story
+
+    for idx, r in enumerate(results, 1):
+        if not _is_vulnerable(r):
+            continue
+        story = [CondPageBreak(5*cm)]  # ไม่ให้หัวข้อไปค้างท้ายหน้าโดยไม่มีเนื้อหา
+        story.append(Paragraph(f"รายการที่ {idx}", styles["Heading2"]))
+        story.append(Paragraph(r.get('url', 'N/A'), styles["URLStyle"]))
+        db_names = r.get("listDb", {}).get("names", [])
+        if db_names:
+            story.append(Paragraph(f"<b>ฐานข้อมูลที่พบ:</b> {', '.join(db_names)}", styles['Normal']))
+        for p in r.get("parametersRaw", []):
+            story.append(Spacer(1, 6))
+            story.append(Paragraph(f"<b>พารามิเตอร์: {p.get('parameter', 'N/A')}</b> (ตำแหน่ง: {p.get('location', 'N/A')})", styles['Normal']))
+            if p.get("findings"):
+                story.append(_findings_table(p["findings"], styles))
+        story.append(Spacer(1, 12))
+        yield story
+
+_MD_HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+_MD_BULLET = re.compile(r"^\s*(?:[-*+]|(\d+)[.)])\s+(.*)$")
+_MD_INLINE = re.compile(r"(`[^`]+`|\*\*.+?\*\*)")
+_MD_CODE = re.compile(r"`([^`]+)`")
+
+def _markdown_code(text: str) -> str:
+    return _MD_CODE.sub(lambda m: f'<font name="Courier">{escape(m.group(1))}</font>',
+                        text) if "`" in text else escape(text)
+
+def _markdown_inline(text: str) -> str:
+    """
+    แปลงเฉพาะ **bold** และ `code` เป็น markup ของ Paragraph ส่วนอื่น escape ทั้งหมด
+    ตัดข้อความเป็น token จากซ้ายไปขวาในรอบเดียว tag จึงซ้อนกันถูกเสมอ (code ใน bold ได้, bold ใน code เป็นข้อความธรรมดา)
+    """
+    out = []
+    for i, token in enumerate(_MD_INLINE.split(text)):
+        if not token:
+            continue
+        if i % 2 == 0:
+            out.append(escape(token))
+        elif token.startswith("`"):
+            out.append(f'<font name="Courier">{escape(token[1:-1])}</font>')
+        else:
+            out.append(f"<b>{_markdown_code(token[2:-2])}</b>")
+    return "".join(out)
+
+def _markdown_paragraph(text: str, style, **kwargs) -> Paragraph:
+    """Paragraph จาก markdown inline; ถ้า ReportLab parse markup ไม่ได้ให้ถอยไปใช้ข้อความธรรมดาที่ escape แล้ว"""
+    try:
+        return Paragraph(_markdown_inline(text), style, **kwargs)
+    except ValueError:
+        return Paragraph(escape(text), style, **kwargs)
+
+def _markdown_flowables(markdown: str, styles) -> list:
+    """
+    แปลง markdown ของคำแนะนำจาก LLM เป็น flowable แบบง่าย: หัวข้อ, รายการ, code block และย่อหน้า
+    (ไม่ใช่ parser เต็มรูปแบบ ส่วนที่ไม่รู้จักแสดงเป็นข้อความธรรมดา)
+    """
+    story, paragraph, code = [], [], None
+
+    def flush_paragraph():
+        if paragraph:
+            story.append(_markdown_paragraph(" ".join(paragraph), styles["Normal"]))
+            paragraph.clear()
+
+    for line in markdown.replace("\r\n", "\n").split("\n"):
+        if line.strip().startswith("```"):
+            if code is None:
+                flush_paragraph()
+                code = []
+            else:
+                story.append(Preformatted("\n".join(code), styles["Code"], maxLineLength=90))
+                code = None
+            continue
+        if code is not None:
+            code.append(line)
+            continue
+        if not line.strip() or line.strip().startswith("<!--"):
+            flush_paragraph()
+            continue
+        heading = _MD_HEADING.match(line)
+        bullet = _MD_BULLET.match(line)
+        if heading:
+            flush_paragraph()
+            story.append(_markdown_paragraph(heading.group(2), styles["Heading3"]))
+        elif bullet:
+            flush_paragraph()
+            marker = f"{bullet.group(1)}." if bullet.group(1) else "•"
+            story.append(_markdown_paragraph(bullet.group(2), styles["Normal"], bulletText=marker))
+        else:
+            paragraph.append(line.strip())
+    flush_paragraph()
+    if code:
+        story.append(Preformatted("\n".join(code), styles["Code"], maxLineLength=90))
+    return story
+
+def _remediation_sections(remediation: List[Dict[str, Any]], styles) -> Iterator[list]:
+    """ภาคผนวก: คำแนะนำการแก้ไขจาก AI 1 หัวข้อต่อ type/title ที่ไม่ซ้ำกัน"""
+    yield [PageBreak(), Paragraph("แนวทางการแก้ไขช่องโหว่ (วิเคราะห์โดย AI)", styles["Heading1"]),
+           Paragraph("คำแนะนำต่อไปนี้สร้างโดยโมเดลภาษา ควรตรวจสอบก่อนนำไปใช้งานจริง", styles["SubTitle"]),
+           Spacer(1, 12)]
+    for idx, item in enumerate(remediation, 1):
+        story = [CondPageBreak(4*cm)]
+        story.append(Paragraph(f"{idx}. {escape(item.get('title') or 'N/A')}", styles["Heading2"]))
+        story.append(Paragraph(f"<b>ประเภท:</b> {escape(item.get('type') or 'N/A')} · พบ {item.get('count', 1)} ครั้ง", styles["Normal"]))
+        story.append(Spacer(1, 6))
+        story.extend(_markdown_flowables(item.get("analysis") or "", styles))
+        story.append(Spacer(1, 12))
+        yield story
+
+def _story_sections(results: List[Dict[str, Any]], layout: str, styles,
+                    remediation: Optional[List[Dict[str, Any]]] = None) -> Iterator[list]:
+    yield _title_and_summary(results, styles)
+    # ===== Detailed Scan Results =====
+    if layout == "compact":
+        yield from _detail_compact(results, styles)
+    else:
+        yield from _detail_full(results, styles)
+    if remediation:
+        yield from _remediation_sections(remediation, styles)
+
+def generate_sqlmap_pdf_report(results: List[Dict[str, Any]], output_dir: str, output_filename: str,
+                               layout: str = "full", remediation: Optional[List[Dict[str, Any]]] = None) -> str:
+    """
+    Creates a professionally styled PDF report from SQLMap scan results.
+    layout="compact" สำหรับ batch ขนาดใหญ่: ตารางสรุปทุก URL + รายละเอียดเฉพาะ URL ที่พบช่องโหว่
+    remediation: [{"type", "title", "count", "analysis"}] (จาก remediation.get_remediations) → เพิ่มภาคผนวกคำแนะนำการแก้ไข
+    """
+    if layout not in REPORT_LAYOUTS:
+        raise ValueError(f"Unknown report layout: {layout!r}")
+    os.makedirs(output_dir, exist_ok=True)
+    pdf_path = os.path.join(output_dir, output_filename)
+
+    styles = get_custom_styles()
+    # flowable ถูกสร้างทีละรายการระหว่าง layout แทนที่จะสร้าง story ทั้งก้อนไว้ก่อน
+    story = LazyStory(_story_sections(results, layout, styles, remediation))
     
-    # --- Build the PDF Document using the two-pass method ---
+    # --- Build the PDF Document (single pass, page totals drawn by NumberedCanvas at save) ---
     doc = ReportDocTemplate(
         pdf_path, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm,
         topMargin=2.5*cm, bottomMargin=2.5*cm,
         title="รายงานผลการสแกน SQLMap", author="Security Assessment Platform"
     )
     
-    # First pass to count pages, second pass to build the final PDF
-    doc.multiBuild(story)
+    doc.build(story)
     
     print(f"✅ PDF Report generated: {pdf_path}")
     return pdf_path
@@ -277,6 +561,6 @@ def generate_simple_report(title: str, data: Dict[str, Any], output_filename: st
     story.append(table)
     
     doc = ReportDocTemplate(pdf_path, pagesize=A4, topMargin=2.5*cm, bottomMargin=2.5*cm)
-    doc.multiBuild(story)
+    doc.build(story)
     
     return pdf_path
\ No newline at end of file
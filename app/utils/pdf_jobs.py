@@ -0,0 +1,223 @@
+# app/utils/pdf_jobs.py
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import current_app
+
+# สร้าง PDF report นอก request: ส่งงานเข้า worker pool แล้วคืน path ทันที
+# ไฟล์ถูกตั้งชื่อตาม hash ของเนื้อหาผลลัพธ์ (reports/pdf_cache/<sha256>.pdf) ผลชุดเดิมจึงได้ไฟล์เดิมทันทีโดยไม่ render ซ้ำ
+#
+# สถานะอ่านจากไฟล์ (ใช้ได้ข้าม process):
+#   <hash>.pdf          → ready
+#   <hash>.pdf.pending  → pending (กำลัง render)
+#   <hash>.pdf.error    → failed (ข้อความ error อยู่ในไฟล์)
+#
+# cache ถูกล้างเป็นระยะ (prune_pdf_cache, เรียกจาก request_pdf ไม่เกินทุก PDF_CACHE_PRUNE_INTERVAL หรือ `flask prune-pdf-cache`):
+#   ไฟล์ที่ไม่มี process ไหนชี้อยู่แล้ว (render ใหม่เพราะ layout / RENDERER_VERSION / remediation เปลี่ยน) → ลบเมื่อเก่ากว่า PDF_CACHE_ORPHAN_AGE
+#   ไฟล์ที่เก่ากว่า PDF_CACHE_MAX_AGE → ลบ, รวมแล้วเกิน PDF_CACHE_MAX_BYTES → ลบไฟล์ที่ไม่มีใครใช้และเก่าสุดก่อน
+#   marker .pending / .error และไฟล์ .tmp ที่เก่ากว่า PDF_RENDER_TIMEOUT → ลบ
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", 2))
+# thread (ค่าเริ่มต้น) หรือ process (render ขนานได้จริง ไม่ติด GIL)
+PDF_WORKER_MODE = os.getenv("PDF_WORKER_MODE", "thread").lower()
+# pending marker ที่เก่ากว่านี้ถือว่า worker ตายไปแล้ว
+PDF_RENDER_TIMEOUT = int(os.getenv("PDF_RENDER_TIMEOUT", 600))
+# layout ของ report: full | compact | auto (compact เมื่อจำนวนรายการเกิน PDF_COMPACT_THRESHOLD)
+PDF_LAYOUT_CHOICES = ("auto", "full", "compact")
+PDF_LAYOUT = os.getenv("PDF_LAYOUT", "auto").lower()
+PDF_COMPACT_THRESHOLD = int(os.getenv("PDF_COMPACT_THRESHOLD", 20))
+PDF_CACHE_MAX_AGE = int(os.getenv("PDF_CACHE_MAX_AGE", 90 * 24 * 3600))
+PDF_CACHE_ORPHAN_AGE = int(os.getenv("PDF_CACHE_ORPHAN_AGE", 24 * 3600))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+PDF_CACHE_PRUNE_INTERVAL = int(os.getenv("PDF_CACHE_PRUNE_INTERVAL", 3600))
+# เปลี่ยนเมื่อ layout ของ report เปลี่ยน เพื่อไม่ให้ใช้ไฟล์ cache รูปแบบเก่า
+RENDERER_VERSION = 2
+
+PDF_CACHE_DIR = ('reports', 'pdf_cache')
+
+_executor = None
+_inflight: Dict[str, Future] = {}
+_lock = threading.Lock()
+_last_prune = 0.0
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        if PDF_WORKER_MODE == "process":
+            _executor = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix="pdf-worker")
+    return _executor
+
+
+def result_hash(results: List[Dict[str, Any]], options: Optional[Dict[str, Any]] = None) -> str:
+    payload = json.dumps({"v": RENDERER_VERSION, "options": options or {}, "results": results},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def resolve_layout(result_count: int, layout: Optional[str] = None) -> str:
+    """layout ที่จะใช้จริง: ค่าที่ขอมา (full/compact) หรือค่าตั้งต้นจาก PDF_LAYOUT, auto → ตามจำนวนรายการ"""
+    layout = (layout or PDF_LAYOUT or "auto").lower()
+    if layout == "auto":
+        return "compact" if result_count > PDF_COMPACT_THRESHOLD else "full"
+    if layout not in PDF_LAYOUT_CHOICES:
+        raise ValueError(f"Unknown PDF layout: {layout!r}")
+    return layout
+
+
+def _abs_path(rel_path: str) -> str:
+    return os.path.join(current_app.static_folder, rel_path)
+
+
+def _render(results, output_dir, output_filename, options):
+    """รันใน worker: render ลงไฟล์ชั่วคราวแล้ว rename เพื่อไม่ให้ใครเห็นไฟล์ที่เขียนไม่เสร็จ"""
+    from app.utils.pdf_generator import generate_sqlmap_pdf_report
+
+    tmp_filename = f"{output_filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    generate_sqlmap_pdf_report(results, output_dir=output_dir, output_filename=tmp_filename, **(options or {}))
+    os.replace(os.path.join(output_dir, tmp_filename), os.path.join(output_dir, output_filename))
+
+
+def _on_done(app, digest, pdf_path, future):
+    with _lock:
+        _inflight.pop(digest, None)
+    error = future.exception()
+    if error is not None:
+        app.logger.error(f"PDF generation failed for {os.path.basename(pdf_path)}: {error}")
+        with open(f"{pdf_path}.error", 'w', encoding='utf-8') as f:
+            f.write(str(error))
+    try:
+        os.remove(f"{pdf_path}.pending")
+    except OSError:
+        pass
+
+
+def request_pdf(results: List[Dict[str, Any]], options: Optional[Dict[str, Any]] = None) -> Tuple[str, str]:
+    """
+    ขอ PDF ของผลลัพธ์ชุดนี้: คืนค่า (relative path ใต้ static, สถานะ "ready" | "pending")
+    ถ้าเคย render ผลชุดเดียวกันแล้วจะได้ "ready" ทันที
+    options["layout"]: full | compact | auto (ไม่ระบุ = PDF_LAYOUT)
+    """
+    options = dict(options or {})
+    options["layout"] = resolve_layout(len(results), options.get("layout"))
+    digest = result_hash(results, options)
+    filename = f"{digest}.pdf"
+    rel_path = '/'.join(PDF_CACHE_DIR + (filename,))
+    pdf_path = _abs_path(rel_path)
+    output_dir = os.path.dirname(pdf_path)
+    os.makedirs(output_dir, exist_ok=True)
+    _maybe_prune()
+
+    if os.path.exists(pdf_path):
+        return rel_path, "ready"
+
+    with _lock:
+        if digest in _inflight or pdf_status(rel_path)[0] == "pending":
+            return rel_path, "pending"  # กำลัง render อยู่ (ใน process นี้หรือ process อื่น)
+        if os.path.exists(f"{pdf_path}.error"):
+            os.remove(f"{pdf_path}.error")  # ลองใหม่หลังจากครั้งก่อนล้มเหลว
+        with open(f"{pdf_path}.pending", 'w', encoding='utf-8') as f:
+            f.write(str(os.getpid()))
+        future = _get_executor().submit(_render, results, output_dir, filename, options)
+        _inflight[digest] = future
+
+    app = current_app._get_current_object()
+    future.add_done_callback(lambda fut: _on_done(app, digest, pdf_path, fut))
+    return rel_path, "pending"
+
+
+def pdf_status(rel_path: str) -> Tuple[str, Optional[str]]:
+    """สถานะของไฟล์ PDF: ("ready" | "pending" | "failed" | "missing", ข้อความ error)"""
+    pdf_path = _abs_path(rel_path)
+    if os.path.exists(pdf_path):
+        return "ready", None
+    pending = f"{pdf_path}.pending"
+    if os.path.exists(pending):
+        if time.time() - os.path.getmtime(pending) < PDF_RENDER_TIMEOUT:
+            return "pending", None
+        return "failed", "PDF generation timed out"
+    error_path = f"{pdf_path}.error"
+    if os.path.exists(error_path):
+        with open(error_path, 'r', encoding='utf-8') as f:
+            return "failed", f.read() or "PDF generation failed"
+    return "missing", None
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+def prune_pdf_cache(max_age: Optional[int] = None, max_bytes: Optional[int] = None) -> Dict[str, int]:
+    """ลบไฟล์ใน pdf_cache ตามนโยบายด้านบน คืนค่าสถิติ {"removed", "markers", "kept", "bytes"}"""
+    from app.models.api_process import ApiProcess
+
+    max_age = PDF_CACHE_MAX_AGE if max_age is None else max_age
+    max_bytes = PDF_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    cache_dir = _abs_path('/'.join(PDF_CACHE_DIR))
+    prefix = '/'.join(PDF_CACHE_DIR) + '/'
+    stats = {"removed": 0, "markers": 0, "kept": 0, "bytes": 0}
+    try:
+        entries = list(os.scandir(cache_dir))
+    except OSError:
+        return stats
+
+    referenced = {p for (p,) in ApiProcess.query.with_entities(ApiProcess.result_pdf)
+                  .filter(ApiProcess.result_pdf.like(f"{prefix}%"))}
+    with _lock:
+        inflight = set(_inflight)
+    now = time.time()
+    pdfs = []
+    for entry in entries:
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        age = now - st.st_mtime
+        if entry.name.endswith((".pending", ".error", ".tmp")):
+            if age > PDF_RENDER_TIMEOUT and entry.name.split('.', 1)[0] not in inflight and _remove(entry.path):
+                stats["markers"] += 1
+        elif entry.name.endswith(".pdf"):
+            in_use = prefix + entry.name in referenced
+            if age > max_age or (not in_use and age > PDF_CACHE_ORPHAN_AGE):
+                stats["removed"] += _remove(entry.path)
+            else:
+                pdfs.append((in_use, st.st_mtime, st.st_size, entry.path))
+
+    total = sum(size for _, _, size, _ in pdfs)
+    kept = len(pdfs)
+    # เกินขนาด: ลบไฟล์ที่ไม่มี process ใช้ก่อน แล้วจึงไฟล์ที่เก่าที่สุด
+    for in_use, _, size, path in sorted(pdfs):
+        if total <= max_bytes:
+            break
+        if _remove(path):
+            stats["removed"] += 1
+            kept -= 1
+            total -= size
+    stats["kept"], stats["bytes"] = kept, total
+    return stats
+
+
+def _maybe_prune() -> None:
+    global _last_prune
+    now = time.time()
+    with _lock:
+        if now - _last_prune < PDF_CACHE_PRUNE_INTERVAL:
+            return
+        _last_prune = now
+    try:
+        stats = prune_pdf_cache()
+        if stats["removed"] or stats["markers"]:
+            current_app.logger.info(f"PDF cache pruned: {stats}")
+    except Exception as e:
+        current_app.logger.warning(f"PDF cache prune failed: {e}")
@@ -0,0 +1,259 @@
+# app/utils/remediation.py
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from flask import current_app
+
+try:
+    from google import genai
+except ImportError:
+    genai = None
+
+# คำแนะนำการแก้ช่องโหว่จาก LLM พร้อม cache
+#
+# finding ชุดเดิม (title/type ของ sqlmap) ถูกถามซ้ำตลอด จึงเก็บคำตอบไว้ 2 ชั้น:
+#   หน่วยความจำ (LRU, LLM_CACHE_MEMORY_ITEMS รายการ) → ไฟล์ใน instance/remediation_cache/<key>.json (ใช้ข้าม process/restart)
+# key มาจาก title/type ที่ normalize แล้ว (ตัวพิมพ์เล็ก, ช่องว่างเดียว) + ชื่อโมเดล + PROMPT_VERSION
+# คำขอเดียวกันที่เข้ามาพร้อมกันจะรอผลจากการเรียกโมเดลครั้งเดียว (coalescing) ผลที่ error ไม่ถูก cache
+#
+# remediation ทั้ง process: distinct_findings() รวม type/title ที่ซ้ำกัน แล้ว get_remediations() ถามเฉพาะที่ไม่อยู่ใน cache
+# พร้อมกันไม่เกิน LLM_BATCH_CONCURRENCY คำขอ
+#
+# LLM_BACKEND=stub ใช้คำตอบสำเร็จรูปในเครื่องแทนการเรียก Gemini (ทดสอบโดยไม่ใช้ API key/quota)
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 30 * 24 * 3600))
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", 512))
+# เวลาสูงสุดที่คำขอซ้ำจะรอผลจากคำขอแรก
+LLM_WAIT_TIMEOUT = float(os.getenv("LLM_WAIT_TIMEOUT", 120))
+LLM_STUB_DELAY = float(os.getenv("LLM_STUB_DELAY", 0))
+# จำนวนคำขอไปยังโมเดลพร้อมกันสูงสุดของ batch เดียว และจำนวน finding (ไม่ซ้ำ) สูงสุดต่อ batch
+LLM_BATCH_CONCURRENCY = int(os.getenv("LLM_BATCH_CONCURRENCY", 4))
+LLM_BATCH_MAX_ITEMS = int(os.getenv("LLM_BATCH_MAX_ITEMS", 100))
+# เปลี่ยนเมื่อแก้ prompt เพื่อไม่ให้ใช้คำตอบจาก prompt เก่า
+PROMPT_VERSION = 1
+
+PROMPT_TEMPLATE = """
+You are a security expert. Provide clear, actionable remediation steps for the following SQL Injection vulnerability.
+Provide code examples for the fix if possible (e.g., using parameterized queries in PHP or Python).
+Format the entire response in Markdown.
+
+Vulnerability Title: "{title}"
+Vulnerability Type: "{type}"
+"""
+
+
+class RemediationError(Exception):
+    """เรียกโมเดลไม่ได้ (ไม่ได้ตั้งค่า, SDK ไม่มี หรือ service error)"""
+
+
+# key → (created_at, analysis)
+_memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+_inflight: Dict[str, Future] = {}
+_lock = threading.Lock()
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+
+
+def normalize(text: Optional[str]) -> str:
+    return " ".join((text or "").split()).lower()
+
+
+def cache_key(title: str, vuln_type: str) -> str:
+    raw = f"v{PROMPT_VERSION}|{LLM_BACKEND}|{LLM_MODEL}|{normalize(vuln_type)}|{normalize(title)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_cache_dir() -> str:
+    cache_dir = os.path.join(current_app.instance_path, "remediation_cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+# --- backends ---
+def _get_client():
+    """genai.Client ตัวเดียวต่อ process (สร้างใหม่เมื่อ GEMINI_API_KEY เปลี่ยน)"""
+    global _client, _client_key
+    if genai is None:
+        raise RemediationError("Google GenAI SDK not installed (run: pip install google-genai)")
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise RemediationError("AI service is not configured (missing GEMINI_API_KEY)")
+    with _client_lock:
+        if _client is None or _client_key != api_key:
+            _client = genai.Client(api_key=api_key)
+            _client_key = api_key
+        return _client
+
+
+def _generate_gemini(prompt: str) -> str:
+    response = _get_client().models.generate_content(model=LLM_MODEL, contents=prompt)
+    return response.text
+
+
+def _generate_stub(prompt: str) -> str:
+    if LLM_STUB_DELAY:
+        time.sleep(LLM_STUB_DELAY)
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+    return (
+        "## Remediation (stub)\n\n"
+        "1. Use parameterized queries / prepared statements for every query that includes user input.\n"
+        "2. Validate input types (e.g. cast numeric IDs to int) and apply least-privilege DB accounts.\n\n"
+        "```python\ncursor.execute(\"SELECT * FROM items WHERE id = %s\", (item_id,))\n```\n\n"
+        f"<!-- stub:{digest} -->"
+    )
+
+
+def _generate(title: str, vuln_type: str) -> str:
+    prompt = PROMPT_TEMPLATE.format(title=title, type=vuln_type)
+    if LLM_BACKEND == "stub":
+        return _generate_stub(prompt)
+    return _generate_gemini(prompt)
+
+
+# --- cache ---
+def _remember(key: str, created_at: float, analysis: str) -> None:
+    with _lock:
+        _memory[key] = (created_at, analysis)
+        _memory.move_to_end(key)
+        while len(_memory) > LLM_CACHE_MEMORY_ITEMS:
+            _memory.popitem(last=False)
+
+
+def _lookup(key: str) -> Optional[str]:
+    now = time.time()
+    with _lock:
+        entry = _memory.get(key)
+        if entry and now - entry[0] < LLM_CACHE_TTL:
+            _memory.move_to_end(key)
+            return entry[1]
+    try:
+        with open(os.path.join(get_cache_dir(), f"{key}.json"), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if now - data.get("created_at", 0) >= LLM_CACHE_TTL or not data.get("analysis"):
+        return None
+    _remember(key, data["created_at"], data["analysis"])
+    return data["analysis"]
+
+
+def _store(key: str, title: str, vuln_type: str, analysis: str) -> None:
+    created_at = time.time()
+    _remember(key, created_at, analysis)
+    path = os.path.join(get_cache_dir(), f"{key}.json")
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"created_at": created_at, "model": LLM_MODEL, "title": title, "type": vuln_type,
+                       "analysis": analysis}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        current_app.logger.warning(f"Cannot write remediation cache {key}: {e}")
+
+
+def get_remediation(title: str, vuln_type: str, refresh: bool = False) -> Tuple[str, str]:
+    """
+    คำแนะนำการแก้ไขของ finding: คืนค่า (markdown, ที่มา "cache" | "shared" | "model")
+    shared = ได้ผลจากคำขอเดียวกันที่กำลังเรียกโมเดลอยู่ในขณะนั้น
+    refresh=True ข้าม cache แล้วเรียกโมเดลใหม่ (ยังรวมกับคำขอที่กำลังรันอยู่ได้)
+    raise RemediationError เมื่อเรียกโมเดลไม่สำเร็จ
+    """
+    key = cache_key(title, vuln_type)
+    if not refresh:
+        analysis = _lookup(key)
+        if analysis is not None:
+            return analysis, "cache"
+
+    with _lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _inflight[key] = future
+
+    if not owner:
+        try:
+            return future.result(timeout=LLM_WAIT_TIMEOUT), "shared"
+        except RemediationError:
+            raise
+        except Exception as e:
+            raise RemediationError(str(e)) from e
+
+    try:
+        analysis = _generate(title, vuln_type)
+        if not analysis:
+            raise RemediationError("AI service returned an empty response")
+        _store(key, title, vuln_type, analysis)
+        future.set_result(analysis)
+        return analysis, "model"
+    except RemediationError as e:
+        future.set_exception(e)
+        raise
+    except Exception as e:
+        error = RemediationError(f"An error occurred with the AI service: {e}")
+        future.set_exception(error)
+        raise error from e
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+
+def distinct_findings(findings: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    type/title ที่ไม่ซ้ำกัน (เทียบแบบ normalize เหมือน cache key) ตามลำดับที่พบครั้งแรก
+    พร้อมจำนวนครั้งที่พบ: [{"type", "title", "count"}]
+    """
+    distinct: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for f in findings:
+        vuln_type, title = f.get("type"), f.get("title")
+        if not vuln_type or not title:
+            continue
+        item = distinct.setdefault((normalize(vuln_type), normalize(title)),
+                                   {"type": vuln_type, "title": title, "count": 0})
+        item["count"] += 1
+    return list(distinct.values())
+
+
+def get_remediations(items: List[Dict[str, Any]], refresh: bool = False,
+                     max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    คำแนะนำของหลาย finding ในครั้งเดียว (items จาก distinct_findings)
+    ที่อยู่ใน cache ตอบทันที ที่เหลือเรียกโมเดลพร้อมกันผ่าน thread pool ขนาดไม่เกิน max_workers (LLM_BATCH_CONCURRENCY)
+    คืนค่า item เดิมเพิ่ม "analysis" + "source" หรือ "error" (finding ที่ล้มเหลวไม่ทำให้ทั้ง batch ล้ม)
+    """
+    results = [dict(item) for item in items]
+    pending = []
+    for item in results:
+        analysis = None if refresh else _lookup(cache_key(item["title"], item["type"]))
+        if analysis is not None:
+            item.update(analysis=analysis, source="cache")
+        else:
+            pending.append(item)
+    if not pending:
+        return results
+
+    app = current_app._get_current_object()
+
+    def run(item):
+        with app.app_context():
+            try:
+                analysis, source = get_remediation(item["title"], item["type"], refresh=refresh)
+                item.update(analysis=analysis, source=source)
+            except RemediationError as e:
+                app.logger.error(f"Remediation failed for {item['type']!r} / {item['title']!r}: {e}")
+                item["error"] = str(e)
+
+    workers = max(1, min(max_workers or LLM_BATCH_CONCURRENCY, len(pending)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-batch") as executor:
+        list(executor.map(run, pending))
+    return results
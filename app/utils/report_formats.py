@@ -0,0 +1,141 @@
+# app/utils/report_formats.py
+import io
+import re
+import csv
+import json
+from typing import Any, Dict, Iterator, List, Optional
+
+# report แบบเบาจากผล sqlmap ชุดเดียวกับ PDF (HTML / CSV / SARIF)
+# CSV/SARIF เป็น generator คืนข้อความทีละส่วน → ใช้กับ Response(stream_with_context(...)) ได้ทันที
+# ส่วน HTML render จาก templates/reports/sqlmap_report.html ด้วย stream_template
+# ไม่ต้องประกอบทั้งไฟล์ไว้ในหน่วยความจำก่อนส่ง
+
+EXPORT_FORMATS = {
+    "html": ("text/html", "html"),
+    "csv": ("text/csv", "csv"),
+    "sarif": ("application/sarif+json", "sarif"),
+}
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+CSV_COLUMNS = ["index", "url", "status", "error", "databases", "parameter", "location", "type", "title", "payload"]
+# ค่าที่ขึ้นต้นด้วยตัวอักษรเหล่านี้ spreadsheet จะตีความเป็นสูตร (payload แบบ "-1 OR 1=1" ก็เข้าข่าย)
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def iter_findings(result: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """finding ทั้งหมดของผลลัพธ์ 1 URL แบบแบน (แนบ parameter/location มาด้วย)"""
+    for p in result.get("parametersRaw") or []:
+        for f in p.get("findings") or []:
+            yield {"parameter": p.get("parameter"), "location": p.get("location"), **f}
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """ตัวเลขสรุปชุดเดียวกับบทสรุปใน PDF"""
+    return {
+        "total": len(results),
+        "success": sum(1 for r in results if r.get("ok")),
+        "failed": sum(1 for r in results if not r.get("ok")),
+        "vulnerable": sum(1 for r in results if r.get("parametersRaw")),
+        "databases": len({n for r in results for n in (r.get("listDb") or {}).get("names", [])}),
+        "payloads": len({f.get("payload") for r in results for f in iter_findings(r) if f.get("payload")}),
+    }
+
+
+# --- CSV ---
+def _csv_cell(value: Any) -> str:
+    text = "" if value is None else str(value)
+    return f"'{text}" if text.startswith(_FORMULA_PREFIXES) else text
+
+
+def iter_csv(results: List[Dict[str, Any]]) -> Iterator[str]:
+    """
+    1 แถวต่อ finding (URL ที่ไม่พบช่องโหว่/สแกนล้มเหลวได้ 1 แถวที่คอลัมน์ finding ว่าง)
+    ขึ้นต้นด้วย BOM ให้ Excel อ่านภาษาไทยเป็น UTF-8
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def row(values):
+        writer.writerow([_csv_cell(v) for v in values])
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    yield "\ufeff" + row(CSV_COLUMNS)
+    for idx, r in enumerate(results, 1):
+        base = [
+            idx,
+            r.get("url"),
+            "ok" if r.get("ok") else "failed",
+            r.get("error") if not r.get("ok") else "",
+            ";".join((r.get("listDb") or {}).get("names", [])),
+        ]
+        findings = list(iter_findings(r))
+        if not findings:
+            yield row(base + [""] * 5)
+        for f in findings:
+            yield row(base + [f.get("parameter"), f.get("location"), f.get("type"), f.get("title"), f.get("payload")])
+
+
+# --- SARIF 2.1.0 ---
+def _rule_id(finding_type: Optional[str]) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", (finding_type or "unknown").lower()).strip("-")
+    return f"sqli/{slug or 'unknown'}"
+
+
+def iter_sarif(results: List[Dict[str, Any]], tool_version: Optional[str] = None) -> Iterator[str]:
+    """
+    SARIF 2.1.0 (1 run ของ sqlmap): 1 rule ต่อประเภทเทคนิค injection, 1 result ต่อ finding
+    URL ที่สแกนล้มเหลวถูกรายงานเป็น toolExecutionNotifications
+    """
+    rules = {}
+    for r in results:
+        for f in iter_findings(r):
+            rule_id = _rule_id(f.get("type"))
+            if rule_id not in rules:
+                rules[rule_id] = {
+                    "id": rule_id,
+                    "name": "SqlInjection",
+                    "shortDescription": {"text": f"SQL injection ({f.get('type') or 'unknown'})"},
+                    "helpUri": "https://owasp.org/www-community/attacks/SQL_Injection",
+                    "defaultConfiguration": {"level": "error"},
+                    "properties": {"tags": ["security", "sql-injection", "CWE-89"]},
+                }
+    rule_index = {rule_id: i for i, rule_id in enumerate(rules)}
+    driver = {"name": "sqlmap", "informationUri": "https://sqlmap.org", "rules": list(rules.values())}
+    if tool_version:
+        driver["version"] = tool_version
+    notifications = [
+        {"level": "error", "message": {"text": f"{r.get('url')}: {r.get('error') or 'scan failed'}"}}
+        for r in results if not r.get("ok")
+    ]
+
+    yield '{"$schema": %s, "version": "2.1.0", "runs": [{"tool": {"driver": %s}, "invocations": %s, "results": [' % (
+        json.dumps(SARIF_SCHEMA),
+        json.dumps(driver, ensure_ascii=False),
+        json.dumps([{"executionSuccessful": not notifications, "toolExecutionNotifications": notifications}],
+                   ensure_ascii=False),
+    )
+    first = True
+    for r in results:
+        for f in iter_findings(r):
+            rule_id = _rule_id(f.get("type"))
+            sarif_result = {
+                "ruleId": rule_id,
+                "ruleIndex": rule_index[rule_id],
+                "level": "error",
+                "message": {"text": f"Parameter '{f.get('parameter')}' ({f.get('location')}) is injectable: {f.get('title')}"},
+                "locations": [{"physicalLocation": {"artifactLocation": {"uri": r.get("url") or ""}}}],
+                "partialFingerprints": {"target/parameter/type": f"{r.get('url')}|{f.get('parameter')}|{f.get('type')}"},
+                "properties": {
+                    "parameter": f.get("parameter"),
+                    "location": f.get("location"),
+                    "title": f.get("title"),
+                    "payload": f.get("payload"),
+                    "databases": (r.get("listDb") or {}).get("names", []),
+                },
+            }
+            yield ("" if first else ",") + json.dumps(sarif_result, ensure_ascii=False)
+            first = False
+    yield "]}]}"
@@ -0,0 +1,42 @@
+# app/utils/report_links.py
+import os
+import datetime
+from typing import Optional, Tuple
+
+from flask import current_app, url_for
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+# ลิงก์ดาวน์โหลด report แบบลงชื่อ (ใช้ในอีเมลแทนการแนบไฟล์ใหญ่ และแทน URL ของ static ที่เปิดให้ทุกคนตลอดไป)
+# token เก็บ process id + path ของ PDF ที่ลิงก์ถูกสร้าง ลงชื่อด้วย SECRET_KEY และหมดอายุตาม REPORT_LINK_TTL
+# ไม่ต้องมีตารางใน DB: ตรวจลายเซ็น + อายุ แล้วเทียบ path กับ process ปัจจุบัน
+
+REPORT_LINK_TTL = int(os.getenv("REPORT_LINK_TTL", 7 * 24 * 3600))
+# PDF ที่ใหญ่กว่านี้ส่งเป็นลิงก์อย่างเดียว ไม่แนบในอีเมล
+MAIL_ATTACH_MAX_BYTES = int(os.getenv("MAIL_ATTACH_MAX_BYTES", 5 * 1024 * 1024))
+
+_SALT = "report-download"
+
+
+def _serializer() -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(current_app.config["SECRET_KEY"], salt=_SALT)
+
+
+def make_download_url(process) -> Tuple[str, datetime.datetime]:
+    """URL ดาวน์โหลด PDF ของ process (absolute) และเวลาที่ลิงก์หมดอายุ"""
+    token = _serializer().dumps({"p": process.id, "f": process.result_pdf})
+    expires_at = datetime.datetime.now() + datetime.timedelta(seconds=REPORT_LINK_TTL)
+    return url_for("api_process.download_report_link", token=token, _external=True), expires_at
+
+
+def load_download_token(token: str) -> Tuple[Optional[dict], Optional[str]]:
+    """คืนค่า (payload, None) หรือ (None, "expired" | "invalid")"""
+    try:
+        return _serializer().loads(token, max_age=REPORT_LINK_TTL), None
+    except SignatureExpired:
+        return None, "expired"
+    except BadSignature:
+        return None, "invalid"
+
+
+def should_attach(pdf_path: str) -> bool:
+    return os.path.getsize(pdf_path) <= MAIL_ATTACH_MAX_BYTES
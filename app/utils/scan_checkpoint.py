@@ -0,0 +1,125 @@
+# app/utils/scan_checkpoint.py
+import os
+import json
+import datetime
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# checkpoint ของ network scan (<name>.checkpoint.json ข้างไฟล์ผล .ndjson)
+#
+# host ถูกสแกนเสร็จไม่เรียงลำดับ จึงเก็บเป็น:
+#   watermark  = จำนวน host แรกตามลำดับของช่วง IP ที่เสร็จครบทุกตัวแล้ว
+#   done_hosts = host ที่เสร็จแล้วแต่อยู่หลัง watermark
+# ตอน resume จะข้าม watermark ตัวแรกด้วยการคำนวณ (ไม่ต้องไล่ IP) และข้าม done_hosts / host ที่มีในไฟล์ผลแล้ว
+#
+# ระหว่างที่ scan รันอยู่ process จะถือ lock ของไฟล์ <name>.checkpoint.lock ไว้ (OS ปล่อยให้เองเมื่อ process ตาย)
+# ใช้แยก scan ที่ยังรันอยู่ใน process อื่นออกจาก scan ที่ค้างเพราะ process ตาย
+
+CHECKPOINT_VERSION = 1
+
+
+def checkpoint_path(result_abs_path: str) -> str:
+    base = result_abs_path[:-len('.ndjson')] if result_abs_path.endswith('.ndjson') else result_abs_path
+    return f"{base}.checkpoint.json"
+
+
+class ScanCheckpoint:
+    def __init__(self, path: str, params: Dict[str, Any], watermark: int = 0,
+                 done_hosts: Iterable[str] = ()):
+        self.path = path
+        self.params = params
+        self.watermark = watermark
+        self._skip = set(done_hosts)
+        self._positions: Dict[str, int] = {}  # host ที่กำลังสแกน → ลำดับในช่วง IP
+        self._done: Dict[int, str] = {}       # ลำดับ → host ที่เสร็จแล้ว (หลัง watermark)
+        self._lock_fp = None
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ScanCheckpoint"]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != CHECKPOINT_VERSION:
+            return None
+        return cls(path, data.get("params") or {}, data.get("watermark", 0), data.get("done_hosts") or ())
+
+    @property
+    def scanned(self) -> int:
+        return self.watermark + len(self._done)
+
+    def acquire_lock(self) -> bool:
+        """lock แบบ non-blocking: คืนค่า False ถ้า process อื่นที่ยังมีชีวิตถือ scan นี้อยู่"""
+        if self._lock_fp is not None:
+            return True
+        fp = open(f"{self.path[:-len('.json')]}.lock", 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                fp.seek(0)
+                msvcrt.locking(fp.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            fp.close()
+            return False
+        self._lock_fp = fp
+        return True
+
+    def release_lock(self) -> None:
+        if self._lock_fp is not None:
+            self._lock_fp.close()
+            self._lock_fp = None
+
+    def iter_hosts(self, hosts: Iterator[str], skip_hosts: Iterable[str] = ()) -> Iterator[str]:
+        """
+        hosts: generator ของ IP ที่เริ่มจากลำดับที่ watermark แล้ว (ดู skip_ip_ranges)
+        host ที่เสร็จแล้ว (done_hosts หรือ skip_hosts) ถูกนับเป็นเสร็จทันทีโดยไม่ส่งออกไปสแกนซ้ำ
+        """
+        skip = self._skip | set(skip_hosts)
+        self._skip = set()
+        for pos, host in enumerate(hosts, start=self.watermark):
+            if host in skip:
+                self._complete(pos, host)
+                continue
+            self._positions[host] = pos
+            yield host
+
+    def mark_done(self, host: str) -> None:
+        pos = self._positions.pop(host, None)
+        if pos is not None:
+            self._complete(pos, host)
+
+    def _complete(self, pos: int, host: str) -> None:
+        self._done[pos] = host
+        while self.watermark in self._done:
+            del self._done[self.watermark]
+            self.watermark += 1
+
+    def save(self) -> None:
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "params": self.params,
+            "watermark": self.watermark,
+            "done_hosts": list(self._done.values()),
+            "updated_at": datetime.datetime.utcnow().isoformat(),
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def remove(self) -> None:
+        """scan จบสมบูรณ์แล้ว: ลบ checkpoint (lock file ลบหลังปล่อย lock)"""
+        for path in (self.path, f"{self.path[:-len('.json')]}.lock"):
+            if path.endswith('.lock'):
+                self.release_lock()
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,192 @@
+# app/utils/scan_results.py
+import os
+import json
+import ipaddress
+import datetime
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import current_app
+
+# ผลของ network scan ถูกเขียนเป็น NDJSON (1 host ต่อบรรทัด) ระหว่างที่สแกนยังรันอยู่
+# ไฟล์เก่า (.json) ยังเป็น JSON ก้อนเดียวแบบเดิม
+#
+# ข้างไฟล์ .ndjson มี index เล็กๆ (<name>.index.json) เก็บสรุปผล (จำนวน host, พอร์ต, tech ฯลฯ)
+# และ byte offset ของทุกๆ INDEX_STRIDE บรรทัด ทำให้อ่านหน้าใดก็ได้โดย seek ไม่ต้องไล่อ่านตั้งแต่ต้นไฟล์
+
+INDEX_STRIDE = 256
+INDEX_VERSION = 1
+# จำนวน host ต่อหน้า (ทั้งหน้าผลลัพธ์และการ poll ?since= ระหว่างสแกน)
+RESULT_PAGE_SIZE = int(os.getenv("NETWORK_RESULT_PAGE_SIZE", 100))
+RESULT_PAGE_SIZE_MAX = int(os.getenv("NETWORK_RESULT_PAGE_SIZE_MAX", 1000))
+
+
+def scan_result_abspath(rel_path: str) -> str:
+    return os.path.join(current_app.root_path, 'static', rel_path)
+
+
+def index_path(abs_path: str) -> str:
+    base = abs_path[:-len('.ndjson')] if abs_path.endswith('.ndjson') else abs_path
+    return f"{base}.index.json"
+
+
+def _empty_summary() -> Dict[str, Any]:
+    return {
+        "version": INDEX_VERSION,
+        "stride": INDEX_STRIDE,
+        "count": 0,
+        "bytes": 0,
+        "offsets": [],
+        "open_ports": {},
+        "found_paths": 0,
+        "catch_all": 0,
+        "tech": {},
+    }
+
+
+def _add_to_summary(summary: Dict[str, Any], result: Dict[str, Any], ports: Counter, tech: Counter) -> None:
+    summary["count"] += 1
+    summary["found_paths"] += len(result.get("found_paths") or [])
+    summary["catch_all"] += len(result.get("catch_all") or [])
+    ports.update(str(p) for p in result.get("open_ports") or [])
+    for svc in result.get("services") or []:
+        tech.update(svc.get("tech") or [])
+
+
+class ResultWriter:
+    """
+    เขียน host ต่อท้ายไฟล์ NDJSON พร้อมดูแล summary index
+    (index ถูกเขียนเมื่อเรียก write_index() เช่นตอน flush progress และตอนสแกนจบ)
+    """
+
+    def __init__(self, abs_path: str):
+        self.abs_path = abs_path
+        self.summary = read_summary(abs_path) if os.path.exists(abs_path) else _empty_summary()
+        self.ports = Counter(self.summary["open_ports"])
+        self.tech = Counter(self.summary["tech"])
+        self.fp = open(abs_path, 'ab')
+        self.fp.seek(self.summary["bytes"])
+        self.fp.truncate()  # ตัดบรรทัดที่เขียนไม่ครบ (process ตายกลางบรรทัด)
+
+    def append(self, host_result: Dict[str, Any]) -> None:
+        line = (json.dumps(host_result, ensure_ascii=False) + "\n").encode("utf-8")
+        if self.summary["count"] % INDEX_STRIDE == 0:
+            self.summary["offsets"].append(self.summary["bytes"])
+        self.fp.write(line)
+        self.fp.flush()
+        self.summary["bytes"] += len(line)
+        _add_to_summary(self.summary, host_result, self.ports, self.tech)
+
+    def write_index(self) -> None:
+        self.summary["open_ports"] = dict(self.ports.most_common())
+        self.summary["tech"] = dict(self.tech.most_common())
+        self.summary["updated_at"] = datetime.datetime.utcnow().isoformat()
+        path = index_path(self.abs_path)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def close(self) -> None:
+        self.write_index()
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _load_index(abs_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(index_path(abs_path), 'r', encoding='utf-8') as f:
+            summary = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if summary.get("version") != INDEX_VERSION or summary.get("stride") != INDEX_STRIDE:
+        return None
+    return summary
+
+
+def read_summary(abs_path: str) -> Dict[str, Any]:
+    """
+    summary ของไฟล์ผลลัพธ์: ใช้ index ที่มีอยู่ แล้วอ่านต่อเฉพาะบรรทัดที่เขียนหลัง index ล่าสุด
+    (ไฟล์ที่ไม่มี index จะถูกไล่อ่านทั้งไฟล์ครั้งเดียว)
+    """
+    summary = _load_index(abs_path) or _empty_summary()
+    ports = Counter(summary["open_ports"])
+    tech = Counter(summary["tech"])
+    if os.path.exists(abs_path) and os.path.getsize(abs_path) > summary["bytes"]:
+        with open(abs_path, 'rb') as f:
+            f.seek(summary["bytes"])
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # บรรทัดสุดท้ายที่ยังเขียนไม่เสร็จ
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    result = {}
+                if summary["count"] % INDEX_STRIDE == 0:
+                    summary["offsets"].append(summary["bytes"])
+                summary["bytes"] += len(line)
+                _add_to_summary(summary, result, ports, tech)
+    summary["open_ports"] = dict(ports.most_common())
+    summary["tech"] = dict(tech.most_common())
+    return summary
+
+
+def host_matcher(spec: str) -> Callable[[Dict[str, Any]], bool]:
+    """ตัวกรอง host: IP ตรงตัว, CIDR (10.0.0.0/24) หรือข้อความบางส่วนของ host/URL"""
+    spec = (spec or "").strip()
+    try:
+        net = ipaddress.ip_network(spec, strict=False)
+    except ValueError:
+        needle = spec.lower()
+        return lambda r: needle in r.get("host", "").lower() or any(needle in u.lower() for u in r.get("urls") or [])
+
+    def match(r):
+        try:
+            return ipaddress.ip_address(r.get("host", "")) in net
+        except ValueError:
+            return False
+    return match
+
+
+def read_hosts(abs_path: str, offset: int = 0, limit: Optional[int] = None,
+               host: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    อ่าน host จากไฟล์ NDJSON ตั้งแต่ลำดับที่ offset (ข้ามบรรทัดที่เขียนไม่ครบ)
+    host: ตัวกรองแบบ host_matcher — offset/limit จะนับหลังกรองแล้ว
+    """
+    hosts = []
+    if not os.path.exists(abs_path):
+        return hosts
+
+    start_byte, skip = 0, offset
+    match = host_matcher(host) if host else None
+    if match is None:
+        index = _load_index(abs_path)
+        if index and index["offsets"]:
+            block = min(offset // INDEX_STRIDE, len(index["offsets"]) - 1)
+            start_byte = index["offsets"][block]
+            skip = offset - block * INDEX_STRIDE
+
+    with open(abs_path, 'rb') as f:
+        f.seek(start_byte)
+        for line in f:
+            if limit is not None and len(hosts) >= limit:
+                break
+            if not line.endswith(b"\n"):
+                break  # บรรทัดสุดท้ายที่ยังเขียนไม่เสร็จ
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if match is not None and not match(result):
+                continue
+            if skip > 0:
+                skip -= 1
+                continue
+            hosts.append(result)
+    return hosts
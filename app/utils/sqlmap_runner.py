@@ -0,0 +1,285 @@
+# app/utils/sqlmap_runner.py
+import os
+import re
+import shlex
+import subprocess
+from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app.config import get_python_path, get_sqlmap_path
+
+# รัน sqlmap เป็น subprocess แล้ว parse ผล (parameter / finding / ฐานข้อมูล) จาก stdout
+# ใช้ร่วมกันระหว่าง /api/run-sqlmap-urls (app/routes/sqlmap_urls.py) และ network assessment (app/utils/assessment.py)
+
+BLOCK_RE = re.compile(r"---\n(Parameter:.*?)\n---", flags=re.DOTALL | re.IGNORECASE)
+PARAM_LINE_RE = re.compile(r"Parameter:\s*(?P<name>[\w\-\._]+)\s*(?:\((?P<loc>[^)]+)\))?", flags=re.IGNORECASE)
+
+def extract_databases_from_stdout_v3(stdout: str):
+    if not stdout:
+        return {"names": [], "count": 0, "rawMatches": []}
+    lines = stdout.splitlines()
+    names = []
+    raw_matches = []
+    count = None
+    count_m = re.search(r"available databases\s*\[(\d+)\]", stdout, flags=re.IGNORECASE)
+    if count_m:
+        try:
+            count = int(count_m.group(1))
+        except:
+            count = None
+    list_item_re = re.compile(r"^\s*\[\*\]\s*`?([A-Za-z0-9_\-\.]+)`?\s*$")
+    for ln in lines:
+        m = list_item_re.match(ln)
+        if m:
+            name = m.group(1).strip()
+            raw_matches.append(name)
+            if name not in names:
+                names.append(name)
+    if not names:
+        resumed_re = re.compile(r"resumed:\s*'?(?P<val>[^']+)'?", flags=re.IGNORECASE)
+        for ln in lines:
+            m = resumed_re.search(ln)
+            if m:
+                val = m.group("val").strip().strip("'\"")
+                if val and not re.fullmatch(r"\d+", val):
+                    raw_matches.append(val)
+                    if val not in names:
+                        names.append(val)
+    final_count = int(count) if count is not None else len(names)
+    return {"names": names, "count": final_count, "rawMatches": raw_matches}
+
+def parse_parameter_block(raw_block: str) -> Dict[str, Any]:
+    lines = raw_block.splitlines()
+    if not lines:
+        return {}
+    m = PARAM_LINE_RE.match(lines[0].strip())
+    name = m.group("name") if m else None
+    loc = m.group("loc").strip() if (m and m.group("loc")) else None
+    findings = []
+    cur = None
+    for raw in lines[1:]:
+        s = raw.strip()
+        if not s:
+            continue
+        low = s.lower()
+        if low.startswith("type:"):
+            if cur:
+                findings.append(cur)
+            cur = {"type": s[len("Type:"):].strip(), "title": None, "payload": None}
+        elif low.startswith("title:"):
+            if cur is None:
+                cur = {"type": None, "title": s[len("Title:"):].strip(), "payload": None}
+            else:
+                cur["title"] = s[len("Title:"):].strip()
+        elif low.startswith("payload:"):
+            if cur is None:
+                cur = {"type": None, "title": None, "payload": s[len("Payload:"):].strip()}
+            else:
+                cur["payload"] = s[len("Payload:"):].strip()
+        else:
+            if cur and cur.get("payload") is not None:
+                cur["payload"] = cur["payload"] + "\n" + s
+    if cur:
+        findings.append(cur)
+    return {"parameter": name, "location": loc, "raw": raw_block.strip(), "findings": findings}
+
+def extract_parameters_from_stdout(stdout: str) -> List[Dict[str, Any]]:
+    if not stdout:
+        return []
+    matches = BLOCK_RE.findall(stdout)
+    results = []
+    for idx, block in enumerate(matches):
+        parsed = parse_parameter_block(block)
+        parsed["index"] = idx
+        results.append(parsed)
+    return results
+
+def safe_int(v: Any, default: int) -> int:
+    try:
+        return int(v)
+    except Exception:
+        return default
+
+EXTRA_ARG_SAFE_RE = re.compile(r"^[-]{1,2}[A-Za-z0-9\-\._/]+=?.*$")
+ALLOWED_FLAGS = {
+    "--level", "--risk", "--threads", "--timeout", "--technique",
+    "--smart", "-p", "--dbs", "--batch", "--skip", "--start", "--passwords", "--password"
+}
+
+def validate_and_split_extra_args(extra_args_raw: Any) -> List[str]:
+    tokens: List[str] = []
+    if not extra_args_raw:
+        return tokens
+    if isinstance(extra_args_raw, str):
+        try:
+            tokens = shlex.split(extra_args_raw)
+        except Exception:
+            tokens = [extra_args_raw]
+    elif isinstance(extra_args_raw, list):
+        tokens = [str(x) for x in extra_args_raw]
+    else:
+        return []
+    safe_tokens: List[str] = []
+    i = 0
+    while i < len(tokens):
+        t = tokens[i].strip()
+        if not t:
+            i += 1
+            continue
+        if not t.startswith("-"):
+            i += 1
+            continue
+        if not EXTRA_ARG_SAFE_RE.match(t):
+            i += 1
+            continue
+        flag_name = t.split("=", 1)[0]
+        if flag_name not in ALLOWED_FLAGS:
+            i += 1
+            continue
+        safe_tokens.append(t)
+        i += 1
+    return safe_tokens
+
+def _build_cmd(python_path: str, sqlmap_path: str, url: str, options: Dict[str, Any],
+               data: Optional[str] = None, param: Optional[str] = None) -> List[str]:
+    cmd: List[str] = [python_path, sqlmap_path, "-u", str(url), "--batch", "--dbs"]
+    if data:
+        cmd.extend(["--data", str(data)])
+    if param:
+        cmd.extend(["-p", str(param)])
+    sqlmap_http_timeout = str(safe_int(options.get("timeout"), 10))
+    sqlmap_threads = str(safe_int(options.get("threads"), 10))
+    sqlmap_level = str(safe_int(options.get("level"), 1))
+    sqlmap_risk = str(safe_int(options.get("risk"), 1))
+    use_smart = options.get("smart", True)
+
+    cmd.extend([
+        "--timeout", sqlmap_http_timeout,
+        "--threads", sqlmap_threads,
+        "--level", sqlmap_level,
+        "--risk", sqlmap_risk,
+    ])
+    if use_smart:
+        cmd.append("--smart")
+
+    safe_extra = validate_and_split_extra_args(options.get("extraArgs"))
+    if safe_extra:
+        cmd.extend(safe_extra)
+
+    return cmd
+
+def _run_cmd(cmd: List[str], timeout_seconds: int) -> Dict[str, Any]:
+    try:
+        completed = subprocess.run(
+            cmd,
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            shell=False,
+            timeout=timeout_seconds,
+        )
+    except subprocess.TimeoutExpired:
+        return {"ok": False, "error": "sqlmap execution timed out", "command": cmd}
+    except FileNotFoundError as e:
+        return {"ok": False, "error": f"Executable not found: {e}", "command": cmd}
+    except Exception as e:
+        return {"ok": False, "error": f"Unexpected error: {e}", "command": cmd}
+
+    ok = completed.returncode == 0
+    max_len = 2_000_000
+    stdout = (completed.stdout or "")
+    stderr = (completed.stderr or "")
+    if len(stdout) > max_len:
+        stdout = stdout[:max_len] + "\n... [truncated]"
+    if len(stderr) > max_len:
+        stderr = stderr[:max_len] + "\n... [truncated]"
+
+    chunks = stdout.split("\n") if stdout else []
+    log_tags = {"INFO": [], "WARNING": [], "CRITICAL": []}
+    if stdout:
+        for line in stdout.splitlines():
+            if "[INFO]" in line:
+                log_tags["INFO"].append(line)
+            if "[WARNING]" in line:
+                log_tags["WARNING"].append(line)
+            if "[CRITICAL]" in line:
+                log_tags["CRITICAL"].append(line)
+
+    parameters_structured = extract_parameters_from_stdout(stdout)
+    try:
+        list_db = extract_databases_from_stdout_v3(stdout)
+        list_db_minimal = {"names": list_db["names"], "count": list_db["count"]}
+    except Exception:
+        list_db_minimal = {"names": [], "count": 0}
+
+    return {
+        "ok": ok,
+        "exitCode": completed.returncode,
+        "command": cmd,
+        "stdout": stdout,
+        "stderr": stderr,
+        "stdoutChunks": chunks,
+        "logMatches": log_tags,
+        "parametersRaw": parameters_structured,
+        "listDb": list_db_minimal,
+    }
+
+def default_sqlmap_options() -> Dict[str, Any]:
+    """ค่า sqlmap ตั้งต้นจาก env (SQLMAP_DEFAULT_*, SQLMAP_EXTRA_ARGS) + --passwords เสมอ"""
+    smart_env = os.getenv("SQLMAP_DEFAULT_SMART", "1").lower()
+    env_extra = os.getenv("SQLMAP_EXTRA_ARGS", "").strip()
+    combined_extra = env_extra.split() if env_extra else []
+    if "--passwords" not in combined_extra:
+        combined_extra.append("--passwords")
+    return {
+        "timeout": safe_int(os.getenv("SQLMAP_DEFAULT_TIMEOUT"), 15),
+        "threads": safe_int(os.getenv("SQLMAP_DEFAULT_THREADS"), 5),
+        "level": safe_int(os.getenv("SQLMAP_DEFAULT_LEVEL"), 2),
+        "risk": safe_int(os.getenv("SQLMAP_DEFAULT_RISK"), 1),
+        "smart": smart_env in ("1", "true", "yes", "on"),
+        "extraArgs": " ".join(combined_extra) if combined_extra else None,
+    }
+
+def run_sqlmap_targets(raw_targets: List[Any], max_concurrency: int,
+                       options: Optional[Dict[str, Any]] = None):
+    """
+    รัน sqlmap กับ target ทุกตัวแบบขนาน (target เป็น dict {url, method, data, param} หรือ URL string)
+    คืนค่า (results เรียงตามลำดับ input, all_ok) — ใช้ได้นอก request context
+    """
+    python_path = get_python_path()
+    sqlmap_path = get_sqlmap_path()
+    process_timeout = safe_int(os.getenv("SQLMAP_PROCESS_TIMEOUT"), 300)
+    options = options or default_sqlmap_options()
+
+    results: List[Dict[str, Any]] = []
+    all_ok = True
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as ex:
+        future_to_index = {}
+        for i, item in enumerate(raw_targets):
+            target = item if isinstance(item, dict) else {"url": item}
+            u = str(target.get("url") or "").strip()
+            if not u:
+                results.append({"index": i, "url": target.get("url"), "ok": False, "error": "invalid url"})
+                all_ok = False
+                continue
+            cmd = _build_cmd(python_path, sqlmap_path, u, options,
+                             data=target.get("data"), param=target.get("param"))
+            fut = ex.submit(_run_cmd, cmd, process_timeout)
+            future_to_index[fut] = (i, u, target)
+
+        for fut in as_completed(future_to_index):
+            idx, url, target = future_to_index[fut]
+            try:
+                res = fut.result()
+            except Exception as e:
+                res = {"ok": False, "error": f"worker exception: {e}"}
+            entry = {"index": idx, "url": url, **res}
+            for key in ("method", "data", "param"):
+                if target.get(key):
+                    entry[key] = target[key]
+            results.append(entry)
+            if not res.get("ok", False):
+                all_ok = False
+
+    return sorted(results, key=lambda x: x["index"]), all_ok
@@ -0,0 +1,125 @@
+# app/utils/wordlists.py
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+
+# wordlist สำหรับ path discovery: เลือกตามชื่อไฟล์ใน wordlists/ (เช่น "common" → wordlists/common.txt)
+#
+# ไฟล์ต้นฉบับถูก compile ครั้งเดียวเป็นรายการ path ที่ตัดซ้ำแล้ว (tuple) เก็บไว้ในหน่วยความจำ
+# และเขียนเป็นไฟล์ cache (1 path ต่อบรรทัด + header บอก mtime/size ของต้นฉบับ) ให้ worker/process อื่น
+# โหลดได้ด้วย read + split อย่างเดียว เมื่อ mtime หรือขนาดไฟล์ต้นฉบับเปลี่ยนจะ compile ใหม่เอง ไม่ต้อง restart
+
+DEFAULT_WORDLIST = os.getenv("NETWORK_SCAN_WORDLIST", "common")
+
+FALLBACK_PATHS = (
+    "admin", "login", "dashboard", "test", "phpinfo.php", "e-learning",
+    "backup", "dev", "staging", "api", "phpmyadmin", "wordpress", "wp-admin"
+)
+
+CACHE_VERSION = 1
+_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+# name → (mtime_ns, size, paths)
+_LOADED: Dict[str, Tuple[int, int, Tuple[str, ...]]] = {}
+_LOCK = threading.Lock()
+
+
+def get_wordlist_dir() -> str:
+    return os.getenv("NETWORK_SCAN_WORDLIST_DIR") or os.path.join(current_app.root_path, "wordlists")
+
+
+def get_cache_dir() -> str:
+    cache_dir = os.path.join(current_app.instance_path, "wordlist_cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def _source_path(name: str) -> str:
+    if not _NAME_RE.match(name) or name.endswith(".txt"):
+        raise ValueError(f"Invalid wordlist name: {name!r}")
+    return os.path.join(get_wordlist_dir(), f"{name}.txt")
+
+
+def list_wordlists() -> List[str]:
+    wordlist_dir = get_wordlist_dir()
+    if not os.path.isdir(wordlist_dir):
+        return []
+    return sorted(
+        fn[:-4] for fn in os.listdir(wordlist_dir)
+        if fn.endswith(".txt") and _NAME_RE.match(fn[:-4])
+    )
+
+
+def compile_wordlist(text: str) -> Tuple[str, ...]:
+    """ตัด comment/บรรทัดว่าง/บรรทัดที่มี whitespace, ตัด / นำหน้า แล้วตัดซ้ำโดยคงลำดับเดิม"""
+    paths = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or len(line.split()) != 1:
+            continue
+        line = line.lstrip("/")
+        if line:
+            paths[line] = None
+    return tuple(paths)
+
+
+def _cache_header(mtime_ns: int, size: int) -> str:
+    return f"#wordlist-cache v{CACHE_VERSION} {mtime_ns} {size}"
+
+
+def _read_cache(cache_path: str, mtime_ns: int, size: int) -> Optional[Tuple[str, ...]]:
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            header, _, body = f.read().partition("\n")
+    except OSError:
+        return None
+    if header != _cache_header(mtime_ns, size):
+        return None
+    return tuple(body.split("\n")) if body else ()
+
+
+def _write_cache(cache_path: str, mtime_ns: int, size: int, paths: Tuple[str, ...]) -> None:
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(_cache_header(mtime_ns, size) + "\n" + "\n".join(paths))
+    os.replace(tmp_path, cache_path)
+
+
+def load_wordlist(name: str = DEFAULT_WORDLIST) -> Tuple[str, ...]:
+    """
+    คืนค่า path ทั้งหมดของ wordlist ตามชื่อ (tuple, ตัดซ้ำแล้ว)
+    ใช้ของในหน่วยความจำถ้าไฟล์ต้นฉบับไม่เปลี่ยน → ไฟล์ cache → compile จากต้นฉบับ ตามลำดับ
+    ถ้าไม่มีไฟล์ของ wordlist ตั้งต้นจะใช้ FALLBACK_PATHS, ชื่ออื่นที่ไม่มีไฟล์จะ raise FileNotFoundError
+    """
+    source_path = _source_path(name)
+    try:
+        st = os.stat(source_path)
+    except FileNotFoundError:
+        if name == DEFAULT_WORDLIST:
+            current_app.logger.warning(f"wordlists/{name}.txt not found. Using internal fallback wordlist.")
+            return FALLBACK_PATHS
+        raise FileNotFoundError(f"Wordlist not found: {name}")
+
+    with _LOCK:
+        loaded = _LOADED.get(name)
+        if loaded and loaded[0] == st.st_mtime_ns and loaded[1] == st.st_size:
+            return loaded[2]
+
+        cache_path = os.path.join(get_cache_dir(), f"{name}.cache")
+        paths = _read_cache(cache_path, st.st_mtime_ns, st.st_size)
+        if paths is None:
+            with open(source_path, "r", encoding="utf-8", errors="replace") as f:
+                paths = compile_wordlist(f.read())
+            try:
+                _write_cache(cache_path, st.st_mtime_ns, st.st_size, paths)
+            except OSError as e:
+                current_app.logger.warning(f"Cannot write wordlist cache for {name}: {e}")
+            current_app.logger.info(f"Compiled wordlist '{name}': {len(paths)} unique paths")
+
+        if not paths and name == DEFAULT_WORDLIST:
+            paths = FALLBACK_PATHS
+        _LOADED[name] = (st.st_mtime_ns, st.st_size, paths)
+        return paths
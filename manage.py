@@ -1,6 +1,8 @@
 # manage.py
 import asyncio
+import os
 import sys
+import click
 from app import create_app
 from app.extensions import db, mail
 from flask_migrate import Migrate
@@ -14,6 +16,36 @@ if sys.platform == "win32":
 
 app = create_app()
 migrate = Migrate(app, db)
+
+
+@app.cli.command("recover-scans")
+@click.option("--mode", type=click.Choice(["resume", "fail"]), default="fail", show_default=True,
+              help="resume = สแกนต่อจาก checkpoint (คำสั่งจะรอจน scan จบ), fail = ปิด scan ที่ค้างเป็น Error")
+def recover_scans(mode):
+    """จัดการ network scan ที่ค้างจาก process ที่ตายไปแล้ว (สำหรับ server ที่ไม่ได้เริ่มด้วย `python manage.py`)"""
+    from app.routes.network_scanner import recover_stale_scans
+    jobs = recover_stale_scans(app, mode)
+    for job in jobs:
+        click.echo(f"Waiting for {job.name} ...")
+        job.join()
+    click.echo(f"Recovered {len(jobs)} scan(s)" if mode == "resume" else "Stale scans marked as Error")
+
+
+@app.cli.command("prune-pdf-cache")
+@click.option("--max-age", type=int, default=None, help="วินาที (ค่าเริ่มต้น PDF_CACHE_MAX_AGE)")
+@click.option("--max-bytes", type=int, default=None, help="ขนาดรวมสูงสุด (ค่าเริ่มต้น PDF_CACHE_MAX_BYTES)")
+def prune_pdf_cache(max_age, max_bytes):
+    """ลบ PDF ใน reports/pdf_cache ที่ไม่มีใครใช้/เก่าเกิน และ marker ที่ค้าง"""
+    from app.utils.pdf_jobs import prune_pdf_cache as prune
+    click.echo(prune(max_age=max_age, max_bytes=max_bytes))
+
+
 # print("manage.py imported - creating app and migrate")
 if __name__ == "__main__":
+    # network scan ที่ค้างจาก process ก่อนหน้า → resume/mark failed (NETWORK_SCAN_RECOVERY)
+    # ทำเฉพาะตอนเริ่ม server (ไม่ทำตอน import เช่น `flask db upgrade`) และเฉพาะใน process ลูกของ reloader
+    # (debug=True: process แม่ไม่ได้รัน server)
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        from app.routes.network_scanner import recover_stale_scans
+        recover_stale_scans(app)
     app.run(host="0.0.0.0", port=5000, debug=True)
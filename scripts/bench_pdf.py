@@ -0,0 +1,63 @@
+# scripts/bench_pdf.py
+"""
+วัดเวลา render PDF report จากผล sqlmap จำลอง
+
+    python scripts/bench_pdf.py            # 10, 100, 1000 รายการ
+    python scripts/bench_pdf.py 50 500     # กำหนดจำนวนเอง
+
+วัดทั้ง layout full และ compact (จำนวนหน้าอ่านจาก /Type /Page ในไฟล์)
+"""
+import os
+import re
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils.pdf_generator import generate_sqlmap_pdf_report  # noqa: E402
+
+
+def fake_results(count, vulnerable_every=10):
+    results = []
+    for i in range(count):
+        vulnerable = i % vulnerable_every == 0
+        results.append({
+            "index": i,
+            "url": f"http://target.local/item.php?id={i}",
+            "ok": True,
+            "listDb": {"names": ["information_schema", "shop"] if vulnerable else [], "count": 2 if vulnerable else 0},
+            "parametersRaw": [{
+                "parameter": "id",
+                "location": "GET",
+                "findings": [
+                    {"type": "boolean-based blind", "title": "AND boolean-based blind - WHERE or HAVING clause",
+                     "payload": f"id={i} AND 4821=4821"},
+                    {"type": "time-based blind", "title": "MySQL >= 5.0.12 AND time-based blind (query SLEEP)",
+                     "payload": f"id={i} AND (SELECT 1 FROM (SELECT(SLEEP(5)))a)"},
+                ],
+            }] if vulnerable else [],
+        })
+    return results
+
+
+def count_pages(path):
+    with open(path, "rb") as f:
+        return len(re.findall(rb"/Type\s*/Page\b", f.read()))
+
+
+def main(sizes, layouts=("full", "compact")):
+    with tempfile.TemporaryDirectory() as out_dir:
+        for size in sizes:
+            results = fake_results(size)
+            for layout in layouts:
+                start = time.perf_counter()
+                path = generate_sqlmap_pdf_report(results, output_dir=out_dir,
+                                                  output_filename=f"bench_{size}_{layout}.pdf", layout=layout)
+                elapsed = time.perf_counter() - start
+                print(f"{size:>6} results {layout:>8}: {elapsed:7.2f} s  {os.path.getsize(path) / 1024:8.0f} KB"
+                      f"  {count_pages(path):5d} pages")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10, 100, 1000])
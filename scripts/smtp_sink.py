@@ -0,0 +1,95 @@
+# scripts/smtp_sink.py
+"""
+SMTP จำลองสำหรับทดสอบการส่งอีเมลในเครื่อง (ไม่ส่งต่อจริง แค่พิมพ์สรุปแต่ละฉบับ)
+
+    python scripts/smtp_sink.py                 # ฟังที่ 127.0.0.1:1025
+    python scripts/smtp_sink.py 2525 --fail 2   # ตอบ 451 กับ DATA 2 ครั้งแรก (ทดสอบ retry)
+
+แล้วรันแอปด้วย MAIL_SERVER=127.0.0.1 MAIL_PORT=1025 MAIL_USE_TLS=false
+"""
+import sys
+import threading
+import socketserver
+
+_lock = threading.Lock()
+_stats = {"connections": 0, "messages": 0, "fail": 0}
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        with _lock:
+            _stats["connections"] += 1
+            conn_no = _stats["connections"]
+        self.reply("220 smtp-sink ready")
+        mail_from, rcpt_to = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd = line.decode(errors="replace").strip()
+            verb = cmd.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self.reply("250-smtp-sink")
+                self.reply("250 SIZE 52428800")
+            elif verb == "HELO":
+                self.reply("250 smtp-sink")
+            elif verb == "MAIL":
+                mail_from, rcpt_to = cmd[10:].split()[0], []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                rcpt_to.append(cmd[8:].split()[0])
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                for data_line in self.rfile:
+                    if data_line in (b".\r\n", b".\n"):
+                        break
+                    size += len(data_line)
+                with _lock:
+                    fail = _stats["fail"] > 0
+                    if fail:
+                        _stats["fail"] -= 1
+                    else:
+                        _stats["messages"] += 1
+                        msg_no = _stats["messages"]
+                if fail:
+                    self.reply("451 Temporary failure (smtp-sink --fail)")
+                    print(f"[conn {conn_no}] rejected message to {', '.join(rcpt_to)} with 451", flush=True)
+                else:
+                    self.reply("250 OK queued")
+                    print(f"[conn {conn_no}] message {msg_no}: {mail_from} -> {', '.join(rcpt_to)} ({size} bytes)", flush=True)
+            elif verb == "RSET":
+                mail_from, rcpt_to = None, []
+                self.reply("250 OK")
+            elif verb == "NOOP":
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def main(argv):
+    port = int(argv[0]) if argv and argv[0].isdigit() else 1025
+    if "--fail" in argv:
+        _stats["fail"] = int(argv[argv.index("--fail") + 1])
+    with SMTPSink(("127.0.0.1", port), SMTPHandler) as server:
+        print(f"smtp-sink listening on 127.0.0.1:{port}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
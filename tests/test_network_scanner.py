@@ -0,0 +1,65 @@
+import asyncio
+
+from aiohttp import web
+
+from app.routes import network_scanner as ns
+
+
+async def _serve(handler):
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, site._server.sockets[0].getsockname()[1]
+
+
+def test_soft_404_host_is_marked_catch_all_early():
+    """host ที่ตอบ 200 body เดียวกันทุก path ต้องถูกจัดเป็น catch-all ก่อนยิงครบ wordlist"""
+    wordlist = [f"path-{i}" for i in range(200)]
+    requests = []
+
+    async def soft_404(request):
+        requests.append((request.method, request.path))
+        return web.Response(text="<html>Welcome to our site</html>")
+
+    async def main():
+        runner, port = await _serve(soft_404)
+        try:
+            return await ns.run_scan_pipeline(
+                ns.parse_ip_ranges("127.0.0.1"), wordlist, path_concurrency=8, ports=[(port, "http")])
+        finally:
+            await runner.cleanup()
+
+    results = asyncio.run(main())
+
+    assert len(results) == 1
+    assert results[0]["found_paths"] == []
+    assert [c["status"] for c in results[0]["catch_all"]] == [200]
+    probed = {path for _, path in requests if path.startswith("/path-")}
+    assert len(probed) < len(wordlist) // 2
+    assert len(requests) < len(wordlist)
+
+
+def test_real_paths_differ_from_baseline():
+    """host ปกติ (404 สำหรับ path ที่ไม่มี) ยังคืน path ที่มีอยู่จริง และไม่ถูกจัดเป็น catch-all"""
+    wordlist = ["admin", "login"] + [f"path-{i}" for i in range(30)]
+
+    async def normal(request):
+        if request.path in ("/admin", "/login"):
+            return web.Response(text=f"page {request.path}")
+        return web.Response(status=404, text="not found")
+
+    async def main():
+        runner, port = await _serve(normal)
+        try:
+            return await ns.run_scan_pipeline(
+                ns.parse_ip_ranges("127.0.0.1"), wordlist, path_concurrency=4, ports=[(port, "http")])
+        finally:
+            await runner.cleanup()
+
+    results = asyncio.run(main())
+
+    assert sorted(u.rsplit("/", 1)[1] for u in results[0]["found_paths"]) == ["admin", "login"]
+    assert "catch_all" not in results[0]